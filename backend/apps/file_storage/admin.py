@@ -8,7 +8,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import StoredFile
+from .models import StoredFile, UploadSession, StorageUsage
 
 
 @admin.register(StoredFile)
@@ -19,6 +19,7 @@ class StoredFileAdmin(admin.ModelAdmin):
     
     list_display = [
         'file_id',
+        'thumbnail',
         'file_name',
         'storage_location',
         'mime_type',
@@ -26,11 +27,13 @@ class StoredFileAdmin(admin.ModelAdmin):
         'uploaded_by',
         'uploaded_at',
         'is_public',
+        'status',
         'file_url_link',
     ]
     
     list_filter = [
         'storage_location',
+        'status',
         'mime_type',
         'is_public',
         'uploaded_at',
@@ -48,6 +51,8 @@ class StoredFileAdmin(admin.ModelAdmin):
     readonly_fields = [
         'file_id',
         'file_reference',
+        'content_hash',
+        'blob',
         'uploaded_at',
         'file_url_link',
         'file_preview',
@@ -69,6 +74,8 @@ class StoredFileAdmin(admin.ModelAdmin):
                 'file_url',
                 'file_url_link',
                 'file_preview',
+                'content_hash',
+                'blob',
             )
         }),
         ('Access Control', {
@@ -100,10 +107,11 @@ class StoredFileAdmin(admin.ModelAdmin):
     def file_url_link(self, obj):
         """Display file URL as a clickable link."""
         if obj.file_url:
-            if obj.storage_location == 'cloudinary':
+            if obj.storage_location != 'local':
                 return format_html(
-                    '<a href="{}" target="_blank">View on Cloudinary</a>',
-                    obj.file_url
+                    '<a href="{}" target="_blank">View on {}</a>',
+                    obj.file_url,
+                    obj.get_storage_location_display()
                 )
             else:
                 return format_html(
@@ -114,11 +122,11 @@ class StoredFileAdmin(admin.ModelAdmin):
     file_url_link.short_description = "File URL"
     
     def file_preview(self, obj):
-        """Show file preview for images."""
+        """Show file preview for images, using a thumbnail when available."""
         if obj.is_image and obj.file_url:
             return format_html(
                 '<img src="{}" style="max-width: 200px; max-height: 200px;" />',
-                obj.file_url
+                obj.get_preview_url(200)
             )
         elif obj.is_video and obj.file_url:
             return format_html(
@@ -132,9 +140,21 @@ class StoredFileAdmin(admin.ModelAdmin):
         return "No preview available"
     file_preview.short_description = "Preview"
     
+    def thumbnail(self, obj):
+        """Show a small thumbnail of images in the change list."""
+        if obj.is_image and obj.file_url:
+            return format_html(
+                '<img src="{}" style="max-width: 60px; max-height: 60px;" />',
+                obj.get_preview_url(60)
+            )
+        return ""
+    thumbnail.short_description = "Thumbnail"
+    
     def get_queryset(self, request):
         """Optimize queryset with select_related."""
-        return super().get_queryset(request).select_related('uploaded_by')
+        return super().get_queryset(request).select_related(
+            'uploaded_by'
+        ).prefetch_related('blob__renditions')
     
     def has_delete_permission(self, request, obj=None):
         """Allow deletion only for superusers or file owners."""
@@ -150,3 +170,67 @@ class StoredFileAdmin(admin.ModelAdmin):
         if not change and not obj.uploaded_by and request.user.is_authenticated:
             obj.uploaded_by = request.user
         super().save_model(request, obj, form, change)
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for UploadSession model.
+    """
+    
+    list_display = [
+        'session_id',
+        'file_name',
+        'status',
+        'total_size',
+        'created_by',
+        'created_at',
+        'expires_at',
+    ]
+    
+    list_filter = [
+        'status',
+        'created_at',
+    ]
+    
+    search_fields = [
+        'file_name',
+        'session_id',
+        'created_by__email',
+    ]
+    
+    readonly_fields = [
+        'session_id',
+        'created_at',
+        'stored_file',
+    ]
+
+
+@admin.register(StorageUsage)
+class StorageUsageAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for StorageUsage model.
+    
+    Quotas can be raised or lowered per user; the counters are
+    maintained automatically.
+    """
+    
+    list_display = [
+        'user',
+        'bytes_used',
+        'file_count',
+        'quota_bytes',
+        'updated_at',
+    ]
+    
+    search_fields = [
+        'user__email',
+    ]
+    
+    readonly_fields = [
+        'bytes_used',
+        'file_count',
+        'updated_at',
+    ]
+    
+    ordering = ['-bytes_used']
@@ -5,3 +5,6 @@ class FileStorageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.file_storage'
     verbose_name = 'File Storage'
+    
+    def ready(self):
+        import apps.file_storage.signals
@@ -0,0 +1,192 @@
+"""
+File Storage Backends
+
+This module contains the adapters used to talk to Cloudinary. The real
+backend wraps the Cloudinary SDK; the local stand-in writes "remote"
+assets to a local directory so the Cloudinary code paths (including
+background uploads) can be exercised offline.
+"""
+
+import os
+import uuid
+from functools import lru_cache
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.module_loading import import_string
+
+from .utils import (
+    upload_to_cloudinary,
+    open_cloudinary_file,
+    delete_cloudinary_file,
+    delete_cloudinary_files,
+    list_cloudinary_files,
+    cloudinary_signed_download_url,
+    cloudinary_transformation_url,
+)
+
+
+class CloudinaryBackend:
+    """Backend that stores assets on Cloudinary."""
+
+    def upload(self, file, public_id=None):
+        """
+        Upload a file.
+
+        Args:
+            file: File-like object to upload
+            public_id (str, optional): Custom public ID for the asset
+
+        Returns:
+            dict: Upload result with at least secure_url, public_id and bytes
+        """
+        return upload_to_cloudinary(file, public_id=public_id)
+
+    def open(self, public_id):
+        """
+        Open an asset for reading.
+
+        Returns:
+            File-like object streaming the asset content
+        """
+        return open_cloudinary_file(public_id)
+
+    def destroy(self, public_id):
+        """
+        Delete an asset.
+
+        Returns:
+            bool: True if deletion was successful
+        """
+        return delete_cloudinary_file(public_id)
+
+    def delete_many(self, public_ids):
+        """
+        Delete many assets with as few API calls as possible.
+
+        Returns:
+            set: Public IDs that were deleted
+        """
+        return delete_cloudinary_files(public_ids)
+
+    def list(self, prefix):
+        """
+        List assets whose public ID starts with a prefix.
+
+        Yields:
+            tuple: (public ID, creation datetime) of every asset
+        """
+        return list_cloudinary_files(prefix)
+
+    def signed_url(self, public_id, mime_type, file_url, expires_at):
+        """
+        Build a signed download URL for an asset that expires at a Unix time.
+
+        Returns:
+            str: Signed URL
+        """
+        return cloudinary_signed_download_url(public_id, mime_type, file_url, expires_at)
+
+    def transformation_url(self, public_id, width, image_format):
+        """
+        Build the URL of a downscaled copy of an image asset in another format.
+
+        Returns:
+            str: URL, or None if the backend can't transform images
+        """
+        return cloudinary_transformation_url(public_id, width, image_format)
+
+
+class LocalCloudinaryBackend:
+    """
+    Offline stand-in for Cloudinary.
+
+    Assets are written to FILE_STORAGE_STANDIN_ROOT and served from
+    FILE_STORAGE_STANDIN_URL, and results mimic the Cloudinary upload API.
+    """
+
+    def __init__(self):
+        self.storage = FileSystemStorage(
+            location=getattr(
+                settings, 'FILE_STORAGE_STANDIN_ROOT',
+                os.path.join(settings.BASE_DIR, 'cloudinary_standin')
+            ),
+            base_url=getattr(settings, 'FILE_STORAGE_STANDIN_URL', '/cloudinary-standin/'),
+        )
+
+    def upload(self, file, public_id=None):
+        if not public_id:
+            public_id = f"dol_uploads/{uuid.uuid4()}"
+        extension = os.path.splitext(file.name)[1]
+        saved_path = self.storage.save(f"{public_id}{extension}", file)
+        return {
+            'public_id': os.path.splitext(saved_path)[0],
+            'secure_url': self.storage.url(saved_path),
+            'bytes': self.storage.size(saved_path),
+        }
+
+    def _find(self, public_id):
+        """Get the storage path of an asset, or None if it doesn't exist."""
+        directory, prefix = os.path.split(public_id)
+        try:
+            _, names = self.storage.listdir(directory)
+        except FileNotFoundError:
+            return None
+        for name in names:
+            if os.path.splitext(name)[0] == prefix:
+                return os.path.join(directory, name)
+        return None
+
+    def open(self, public_id):
+        path = self._find(public_id)
+        if path is None:
+            raise FileNotFoundError(public_id)
+        return self.storage.open(path, 'rb')
+
+    def destroy(self, public_id):
+        path = self._find(public_id)
+        if path is None:
+            return False
+        self.storage.delete(path)
+        return True
+
+    def delete_many(self, public_ids):
+        return {public_id for public_id in public_ids if self.destroy(public_id)}
+
+    def list(self, prefix):
+        for path in walk_storage(self.storage, prefix.rstrip('/')):
+            yield os.path.splitext(path)[0], self.storage.get_modified_time(path)
+
+    def signed_url(self, public_id, mime_type, file_url, expires_at):
+        # The stand-in directory is served as-is
+        return file_url
+
+    def transformation_url(self, public_id, width, image_format):
+        # Renditions are derived and stored like on any other storage
+        return None
+
+
+def walk_storage(storage, directory):
+    """
+    Recursively list the files of a Django storage below a directory.
+
+    Yields:
+        str: Path of every file
+    """
+    try:
+        directories, names = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        yield os.path.join(directory, name)
+    for name in directories:
+        yield from walk_storage(storage, os.path.join(directory, name))
+
+
+@lru_cache(maxsize=None)
+def get_cloudinary_backend():
+    """Get the configured Cloudinary backend instance."""
+    backend_path = getattr(
+        settings, 'FILE_STORAGE_CLOUDINARY_BACKEND',
+        'apps.file_storage.backends.CloudinaryBackend'
+    )
+    return import_string(backend_path)()
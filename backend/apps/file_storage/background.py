@@ -0,0 +1,128 @@
+"""
+File Storage Background Uploads
+
+This module contains the worker pool that pushes staged uploads to
+remote storage (Cloudinary, S3) outside the request cycle. The upload
+view stores the file on local disk, records it as pending and returns
+right away; a worker thread then transfers the file and marks it ready.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import File
+from django.db import close_old_connections, transaction
+
+from .drivers import get_driver
+from .models import StoredBlob, StoredFile
+from .renditions import create_renditions, needs_renditions
+from .utils import staging_storage
+
+logger = logging.getLogger(__name__)
+
+# 'sync' uploads to remote storage in the request, 'background' hands it
+# to the pool (the setting predates drivers other than Cloudinary)
+CLOUDINARY_UPLOAD_MODE = getattr(settings, 'FILE_STORAGE_CLOUDINARY_UPLOAD_MODE', 'sync')
+
+UPLOAD_WORKERS = getattr(settings, 'FILE_STORAGE_UPLOAD_WORKERS', 4)
+
+_executor = None
+
+
+def get_executor():
+    """Get the shared upload worker pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=UPLOAD_WORKERS,
+            thread_name_prefix='file-storage-upload',
+        )
+    return _executor
+
+
+def enqueue_blob_upload(blob_id):
+    """Schedule a pending blob for upload once the current transaction commits."""
+    transaction.on_commit(lambda: get_executor().submit(run_blob_upload, blob_id))
+
+
+def retry_blob_upload(blob_id):
+    """
+    Queue a failed blob's staged copy for another upload attempt.
+
+    Returns:
+        bool: True if the blob had failed and was queued again
+    """
+    with transaction.atomic():
+        retried = StoredBlob.objects.filter(pk=blob_id, status='failed').update(status='pending')
+        if retried:
+            StoredFile.objects.filter(blob_id=blob_id).update(status='pending')
+            enqueue_blob_upload(blob_id)
+    return bool(retried)
+
+
+def run_blob_upload(blob_id):
+    """Worker entry point: upload a blob with its own database connection."""
+    close_old_connections()
+    try:
+        upload_pending_blob(blob_id)
+    except Exception:
+        logger.exception("Background upload of blob %s failed", blob_id)
+    finally:
+        close_old_connections()
+
+
+def upload_pending_blob(blob_id):
+    """
+    Push a staged blob to its storage and mark it and its files ready.
+
+    Args:
+        blob_id (int): Primary key of a pending StoredBlob
+
+    Returns:
+        bool: True if the blob was uploaded
+    """
+    blob = StoredBlob.objects.filter(pk=blob_id, status='pending').first()
+    if blob is None:
+        return False
+
+    staged_path = blob.storage_key
+    driver = get_driver(blob.storage_location)
+
+    try:
+        with staging_storage.open(staged_path, 'rb') as staged:
+            stored = driver.write(File(staged, name=staged_path))
+    except Exception as e:
+        with transaction.atomic():
+            StoredBlob.objects.filter(pk=blob_id, status='pending').update(status='failed')
+            StoredFile.objects.filter(blob_id=blob_id).update(status='failed')
+        logger.error("Upload of blob %s to %s failed: %s", blob_id, blob.storage_location, e)
+        return False
+
+    # Flip the blob before its files: a file created concurrently either
+    # sees the ready blob or is picked up by the file update below
+    with transaction.atomic():
+        updated = StoredBlob.objects.filter(pk=blob_id, status='pending').update(
+            status='ready',
+            storage_key=stored['storage_key'],
+            file_url=stored['file_url'],
+        )
+    if not updated:
+        # The blob was deleted while it was uploading
+        driver.delete(stored['storage_key'])
+        return False
+
+    StoredFile.objects.filter(blob_id=blob_id).update(
+        status='ready',
+        file_url=stored['file_url'],
+    )
+
+    # Derive renditions from the staged copy rather than downloading it again
+    mime_types = StoredFile.objects.filter(blob_id=blob_id).values_list('mime_type', flat=True)
+    if any(needs_renditions(mime_type) for mime_type in mime_types):
+        try:
+            create_renditions(blob_id, source=staging_storage.path(staged_path))
+        except Exception:
+            logger.exception("Deriving renditions of blob %s failed", blob_id)
+
+    staging_storage.delete(staged_path)
+    return True
@@ -0,0 +1,335 @@
+"""
+File Storage Blobs
+
+This module contains the content-addressed storage layer. Uploads are
+identified by the SHA-256 of their bytes; identical content is written
+to storage once and shared between StoredFile rows through a reference
+counted StoredBlob.
+"""
+
+import os
+from collections import Counter, defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .background import CLOUDINARY_UPLOAD_MODE, enqueue_blob_upload
+from .drivers import get_driver
+from .models import StoredBlob, StoredFile
+from .quotas import releasing_quotas
+from .renditions import enqueue_renditions, needs_renditions
+from .utils import (
+    FileTypeMismatchError,
+    store_file,
+    delete_stored_object,
+    delete_stored_objects,
+    get_storage_key,
+    mime_types_agree,
+    staging_storage,
+)
+
+
+def store_upload(upload, mime_type, storage_location):
+    """
+    Store an upload, reusing existing content with the same hash.
+
+    Uploads to remote drivers (Cloudinary, S3) are hashed in a local pass
+    over the spooled upload first, so a duplicate never costs a remote
+    round trip. Other uploads are hashed while they are written and the
+    new copy is dropped if the content turns out to exist already.
+
+    In background upload mode new remote content is only staged on local
+    disk; the returned blob is 'pending' until a worker has pushed it to
+    its storage.
+
+    Args:
+        upload: StreamingUpload wrapping the uploaded bytes
+        mime_type (str): Declared MIME type of the upload
+        storage_location (str): Name of the storage driver
+
+    Returns:
+        StoredBlob: Blob holding the content, with a reference taken for
+                    the caller
+
+    Raises:
+        FileTooLargeError: If the upload exceeds its size limit
+        FileTypeMismatchError: If the content doesn't match mime_type
+    """
+    if get_driver(storage_location).remote:
+        for _ in upload.chunks():
+            pass
+        check_content_type(mime_type, upload)
+
+        blob = StoredBlob.objects.acquire(upload.sha256)
+        if blob is not None:
+            return blob
+
+        # The hashing pass left the file at its end
+        upload.file.seek(0)
+
+        if CLOUDINARY_UPLOAD_MODE == 'background':
+            return stage_blob(upload, storage_location)
+
+        # Hashing is done, so send the raw file without re-hashing it
+        stored = store_file(upload.file, storage_location)
+    else:
+        stored = store_file(upload, storage_location)
+        try:
+            check_content_type(mime_type, upload)
+        except FileTypeMismatchError:
+            delete_stored_object(storage_location, stored['storage_key'])
+            raise
+
+        blob = StoredBlob.objects.acquire(upload.sha256)
+        if blob is not None:
+            delete_stored_object(storage_location, stored['storage_key'])
+            return blob
+
+    blob, created = create_blob(
+        upload.sha256,
+        storage_location=storage_location,
+        storage_key=stored['storage_key'],
+        file_url=stored['file_url'],
+        file_size=stored['bytes'] or upload.bytes_read,
+        status='ready',
+    )
+    if not created:
+        # Someone stored the same content concurrently; share theirs
+        delete_stored_object(storage_location, stored['storage_key'])
+    return blob
+
+
+def stage_blob(upload, storage_location):
+    """
+    Stage an already hashed upload on local disk and queue its transfer.
+
+    Returns:
+        StoredBlob: Pending blob for the staged content
+    """
+    extension = os.path.splitext(upload.name)[1]
+    staged_path = staging_storage.save(
+        f"pending/{upload.sha256}{extension}", upload.file
+    )
+
+    blob, created = create_blob(
+        upload.sha256,
+        storage_location=storage_location,
+        storage_key=staged_path,
+        file_url='',
+        file_size=upload.bytes_read,
+        status='pending',
+    )
+    if not created:
+        staging_storage.delete(staged_path)
+        return blob
+
+    enqueue_blob_upload(blob.pk)
+    return blob
+
+
+def create_blob(content_hash, **fields):
+    """
+    Record newly stored content as a blob, with a reference for the caller.
+
+    A blob of the same content whose background upload failed is taken
+    over by the new copy, so its files become pending or ready again.
+
+    Args:
+        content_hash (str): SHA-256 of the content
+        **fields: Remaining StoredBlob fields of the new copy
+
+    Returns:
+        tuple: (blob, created) where created is False if live content
+               with this hash was stored concurrently and the new copy
+               isn't used
+    """
+    try:
+        with transaction.atomic():
+            return StoredBlob.objects.create(content_hash=content_hash, **fields), True
+    except IntegrityError:
+        pass
+
+    blob, failed_key = StoredBlob.objects.reclaim(content_hash, **fields)
+    if blob is not None:
+        # Only background uploads fail, so the failed copy is a staged one
+        if failed_key and failed_key != fields['storage_key']:
+            staging_storage.delete(failed_key)
+        return blob, True
+    return StoredBlob.objects.acquire(content_hash), False
+
+
+def create_stored_file(blob, **fields):
+    """
+    Create a StoredFile pointing at a blob.
+
+    The file mirrors the blob's location, URL, size and upload status. If
+    the blob finishes a background upload while the file is being created
+    the file is brought up to date afterwards. Renditions of ready images
+    are derived in the background.
+
+    Args:
+        blob: StoredBlob returned by store_upload
+        **fields: Remaining StoredFile fields (file_name, uploaded_by, ...)
+
+    Returns:
+        StoredFile: The new file
+    """
+    stored_file = StoredFile.objects.create(
+        storage_location=blob.storage_location,
+        file_url=blob.file_url,
+        file_size=blob.file_size,
+        content_hash=blob.content_hash,
+        blob=blob,
+        status=blob.status,
+        **fields
+    )
+
+    if stored_file.status == 'pending':
+        blob.refresh_from_db(fields=['status', 'file_url'])
+        if blob.status != 'pending':
+            stored_file.status = blob.status
+            stored_file.file_url = blob.file_url
+            stored_file.save(update_fields=['status', 'file_url'])
+
+    if stored_file.status == 'ready' and needs_renditions(stored_file.mime_type):
+        enqueue_renditions(blob.pk)
+
+    return stored_file
+
+
+def check_content_type(mime_type, upload):
+    """Raise FileTypeMismatchError if the sniffed type contradicts mime_type."""
+    if not mime_types_agree(mime_type, upload.sniffed_mime_type):
+        raise FileTypeMismatchError('File content does not match its type')
+
+
+def release_blob(blob_id):
+    """
+    Drop one reference to a blob, deleting it once unreferenced.
+
+    Must be called inside a transaction. The renditions of a deleted
+    blob are kept on the returned instance (orphaned_renditions) so their
+    content can be cleaned up too.
+
+    Returns:
+        StoredBlob: The deleted blob if it is no longer referenced, or
+                    None if the content is still in use
+    """
+    blob = StoredBlob.objects.select_for_update().get(pk=blob_id)
+    if blob.ref_count > 1:
+        blob.ref_count -= 1
+        blob.save(update_fields=['ref_count'])
+        return None
+
+    blob.orphaned_renditions = list(blob.renditions.all())
+    blob.delete()
+    return blob
+
+
+def delete_blob_content(blob):
+    """Remove the physical content (and renditions) of a deleted blob."""
+    for rendition in getattr(blob, 'orphaned_renditions', []):
+        if rendition.storage_key:
+            delete_stored_object(rendition.storage_location, rendition.storage_key)
+    if blob.status == 'ready':
+        delete_stored_object(blob.storage_location, blob.storage_key)
+    else:
+        # Pending and failed content still lives in the staging area
+        staging_storage.delete(blob.storage_key)
+
+
+def delete_stored_file(stored_file):
+    """
+    Delete a StoredFile row and release its content.
+
+    The physical object is only removed from storage when no other
+    StoredFile points at the same content.
+
+    Args:
+        stored_file: StoredFile to delete
+    """
+    with transaction.atomic():
+        stored_file.delete()
+        orphan = release_blob(stored_file.blob_id) if stored_file.blob_id else None
+
+    if orphan is not None:
+        delete_blob_content(orphan)
+    elif stored_file.blob_id is None:
+        # Files uploaded before deduplication own their content
+        storage_key = get_storage_key(stored_file.storage_location, stored_file.file_url)
+        if storage_key:
+            delete_stored_object(stored_file.storage_location, storage_key)
+
+
+def release_blobs(blob_ids):
+    """
+    Drop one reference per entry in blob_ids, deleting unreferenced blobs.
+
+    Blobs whose count drops by the same amount are updated together and
+    orphans are removed with a single DELETE. Must be called inside a
+    transaction.
+
+    Args:
+        blob_ids (list): Blob IDs, repeated once per released reference
+
+    Returns:
+        list: Deleted blobs whose content is no longer referenced
+    """
+    released = Counter(blob_ids)
+    blobs = StoredBlob.objects.select_for_update().filter(
+        pk__in=released
+    ).prefetch_related('renditions')
+
+    orphans = []
+    decrements = defaultdict(list)
+    for blob in blobs:
+        if blob.ref_count > released[blob.pk]:
+            decrements[released[blob.pk]].append(blob.pk)
+        else:
+            blob.orphaned_renditions = list(blob.renditions.all())
+            orphans.append(blob)
+
+    for amount, ids in decrements.items():
+        StoredBlob.objects.filter(pk__in=ids).update(ref_count=F('ref_count') - amount)
+    if orphans:
+        StoredBlob.objects.filter(pk__in=[blob.pk for blob in orphans]).delete()
+    return orphans
+
+
+def delete_stored_files(stored_files):
+    """
+    Delete many StoredFile rows and release their content.
+
+    Rows are removed in one transaction, which also gives each owner's
+    quota back with a single UPDATE; afterwards the unreferenced content
+    is deleted in bulk per storage location.
+
+    Args:
+        stored_files (list): StoredFile instances to delete
+    """
+    if not stored_files:
+        return
+
+    with transaction.atomic():
+        with releasing_quotas(stored_files):
+            StoredFile.objects.filter(pk__in=[f.pk for f in stored_files]).delete()
+        orphans = release_blobs([f.blob_id for f in stored_files if f.blob_id])
+
+    storage_keys = defaultdict(list)
+    for blob in orphans:
+        for rendition in blob.orphaned_renditions:
+            if rendition.storage_key:
+                storage_keys[rendition.storage_location].append(rendition.storage_key)
+        if blob.status == 'ready':
+            storage_keys[blob.storage_location].append(blob.storage_key)
+        else:
+            staging_storage.delete(blob.storage_key)
+
+    # Files uploaded before deduplication own their content
+    for stored_file in stored_files:
+        if stored_file.blob_id is None:
+            storage_key = get_storage_key(stored_file.storage_location, stored_file.file_url)
+            if storage_key:
+                storage_keys[stored_file.storage_location].append(storage_key)
+
+    for storage_location, keys in storage_keys.items():
+        delete_stored_objects(storage_location, keys)
@@ -0,0 +1,318 @@
+"""
+File Storage Drivers
+
+This module contains the storage driver registry. Every place a file can
+be stored (local filesystem, Cloudinary, S3-compatible object storage and
+an in-memory fake) is wrapped in a driver with the same streaming
+write/open/delete interface, and StoredFile.storage_location names the
+driver that holds the content.
+
+Drivers are configured through FILE_STORAGE_DRIVERS:
+
+    FILE_STORAGE_DRIVERS = {
+        'local': {'BACKEND': 'apps.file_storage.drivers.LocalDriver'},
+        's3': {
+            'BACKEND': 'apps.file_storage.drivers.S3Driver',
+            'OPTIONS': {'bucket_name': 'media', 'endpoint_url': '...'},
+        },
+    }
+
+Which driver receives an upload is decided by FILE_STORAGE_ROUTES (see
+utils.determine_storage_location).
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage, InMemoryStorage
+from django.utils.module_loading import import_string
+
+from .backends import get_cloudinary_backend, walk_storage
+from .utils import (
+    FileTooLargeError,
+    generate_local_file_path,
+    get_cloudinary_public_id_from_url,
+    DELETE_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DRIVERS = {
+    'local': {'BACKEND': 'apps.file_storage.drivers.LocalDriver'},
+    'cloudinary': {'BACKEND': 'apps.file_storage.drivers.CloudinaryDriver'},
+}
+
+STORAGE_DRIVERS = getattr(settings, 'FILE_STORAGE_DRIVERS', DEFAULT_DRIVERS)
+
+
+class StorageDriver:
+    """
+    Base class for storage drivers.
+
+    Subclasses implement write, open and delete. Remote drivers (where a
+    write leaves the machine) get uploads hashed before they are sent, so
+    duplicate content never costs a transfer, and can be uploaded in the
+    background. Drivers that serve through a redirect hand clients the
+    stored URL; the others are streamed by serve_file.
+    """
+
+    remote = False
+    serves_redirect = False
+
+    # Prefix of every key the driver writes; only keys below it are
+    # listed when reconciling storage with the database
+    key_prefix = ''
+
+    def __init__(self, name):
+        self.name = name
+
+    def write(self, file):
+        """
+        Stream a file into storage.
+
+        Args:
+            file: Django File-like object (usually a StreamingUpload)
+
+        Returns:
+            dict: file_url, storage_key and the size reported by the
+                  storage, if any
+        """
+        raise NotImplementedError
+
+    def open(self, storage_key):
+        """
+        Open stored content for streaming reads.
+
+        Returns:
+            File-like object positioned at the start of the content
+        """
+        raise NotImplementedError
+
+    def delete(self, storage_key):
+        """
+        Delete stored content.
+
+        Returns:
+            bool: True if deletion was successful
+        """
+        raise NotImplementedError
+
+    def delete_many(self, storage_keys):
+        """
+        Delete many objects, in parallel unless the driver has a bulk API.
+
+        Returns:
+            set: Keys that were deleted
+        """
+        storage_keys = list(storage_keys)
+        with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+            results = executor.map(self.delete, storage_keys)
+            return {key for key, deleted in zip(storage_keys, results) if deleted}
+
+    def list_objects(self):
+        """
+        List the stored objects below key_prefix.
+
+        Modification times are included when the listing provides them
+        for free; otherwise they are None (see get_modified_time).
+
+        Yields:
+            tuple: (storage key, modification datetime or None)
+        """
+        raise NotImplementedError
+
+    def get_modified_time(self, storage_key):
+        """Get when stored content was last modified, or None if unknown."""
+        return None
+
+    def signed_url(self, storage_key, stored_file, expires_at):
+        """
+        Build a signed URL the storage serves directly until expires_at.
+
+        Returns:
+            str: Signed URL, or None if the storage can't sign URLs (the
+                 content is then served by Django through a signed token)
+        """
+        return None
+
+    def rendition_url(self, storage_key, width, image_format):
+        """
+        Build the URL of a rendition the storage derives from stored content.
+
+        Returns:
+            str: URL of the image downscaled to `width` and encoded as
+                 image_format ('webp' or 'jpeg'), or None if the storage
+                 can't transform images (renditions are then derived with
+                 Pillow and stored)
+        """
+        return None
+
+    def get_storage_key(self, file_url):
+        """Derive the storage key of a file from its URL, or None if unknown."""
+        return None
+
+
+class DjangoStorageDriver(StorageDriver):
+    """Driver backed by a Django Storage (filesystem, S3, memory, ...)."""
+
+    # generate_local_file_path puts every upload below uploads/YYYY/MM/
+    key_prefix = 'uploads'
+
+    def __init__(self, name, storage=None):
+        super().__init__(name)
+        self.storage = storage or default_storage
+
+    def write(self, file):
+        file_path = generate_local_file_path(file.name)
+        try:
+            saved_path = self.storage.save(file_path, file)
+        except Exception as e:
+            # Don't leave a partially written file behind
+            self.delete(file_path)
+            if isinstance(e, FileTooLargeError):
+                raise
+            raise Exception(f"{self.name} storage upload failed: {str(e)}")
+
+        return {
+            'file_url': self.storage.url(saved_path),
+            'storage_key': saved_path,
+            'bytes': None,
+        }
+
+    def open(self, storage_key):
+        return self.storage.open(storage_key, 'rb')
+
+    def delete(self, storage_key):
+        try:
+            if self.storage.exists(storage_key):
+                self.storage.delete(storage_key)
+                return True
+            return False
+        except Exception:
+            logger.exception("Error deleting %s file %s", self.name, storage_key)
+            return False
+
+    def list_objects(self):
+        # Modification times cost a request per object on remote storages,
+        # so they are only looked up for the keys that need them
+        for path in walk_storage(self.storage, self.key_prefix):
+            yield path, None
+
+    def get_modified_time(self, storage_key):
+        return self.storage.get_modified_time(storage_key)
+
+    def get_storage_key(self, file_url):
+        base_url = self.storage.base_url or ''
+        if base_url and file_url.startswith(base_url):
+            return file_url[len(base_url):]
+        return file_url.replace(settings.MEDIA_URL, '')
+
+
+class LocalDriver(DjangoStorageDriver):
+    """Driver for the project's default storage (MEDIA_ROOT)."""
+
+    def __init__(self, name):
+        super().__init__(name, default_storage)
+
+
+class MemoryDriver(DjangoStorageDriver):
+    """
+    In-memory fake for tests and benchmarks.
+
+    Content is kept in process memory and lost on restart.
+    """
+
+    def __init__(self, name, base_url='/memory-storage/'):
+        super().__init__(name, InMemoryStorage(base_url=base_url))
+
+
+class S3Driver(DjangoStorageDriver):
+    """
+    Driver for S3-compatible object storage (AWS S3, MinIO, R2, ...).
+
+    Requires django-storages and boto3; OPTIONS are passed to
+    storages.backends.s3.S3Storage (bucket_name, endpoint_url,
+    custom_domain, ...). Files are served by redirecting to their URL.
+    """
+
+    remote = True
+    serves_redirect = True
+
+    def __init__(self, name, **options):
+        try:
+            from storages.backends.s3 import S3Storage
+        except ImportError:
+            raise ImproperlyConfigured(
+                "The S3 storage driver requires django-storages and boto3"
+            )
+        super().__init__(name, S3Storage(**options))
+
+    def signed_url(self, storage_key, stored_file, expires_at):
+        # Presigned explicitly: storage.url() leaves the URL unsigned when
+        # querystring_auth is off or a custom_domain is configured
+        return self.storage.bucket.meta.client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': self.storage.bucket_name,
+                'Key': self.storage._normalize_name(storage_key),
+            },
+            ExpiresIn=max(int(expires_at - time.time()), 1),
+        )
+
+
+class CloudinaryDriver(StorageDriver):
+    """Driver for Cloudinary, through the configured Cloudinary backend."""
+
+    remote = True
+    serves_redirect = True
+    key_prefix = 'dol_uploads/'
+
+    def write(self, file):
+        upload_result = get_cloudinary_backend().upload(file)
+        return {
+            'file_url': upload_result['secure_url'],
+            'storage_key': upload_result['public_id'],
+            'bytes': upload_result.get('bytes'),
+        }
+
+    def open(self, storage_key):
+        return get_cloudinary_backend().open(storage_key)
+
+    def delete(self, storage_key):
+        return get_cloudinary_backend().destroy(storage_key)
+
+    def delete_many(self, storage_keys):
+        # Cloudinary has a bulk delete API
+        return get_cloudinary_backend().delete_many(list(storage_keys))
+
+    def list_objects(self):
+        return get_cloudinary_backend().list(self.key_prefix)
+
+    def signed_url(self, storage_key, stored_file, expires_at):
+        return get_cloudinary_backend().signed_url(
+            storage_key, stored_file.mime_type, stored_file.file_url, expires_at
+        )
+
+    def rendition_url(self, storage_key, width, image_format):
+        return get_cloudinary_backend().transformation_url(storage_key, width, image_format)
+
+    def get_storage_key(self, file_url):
+        return get_cloudinary_public_id_from_url(file_url)
+
+
+@lru_cache(maxsize=None)
+def get_driver(name):
+    """
+    Get the storage driver registered under a name.
+
+    Raises:
+        ImproperlyConfigured: If no driver is registered under the name
+    """
+    try:
+        config = STORAGE_DRIVERS[name]
+    except KeyError:
+        raise ImproperlyConfigured(f"No file storage driver named '{name}'")
+    return import_string(config['BACKEND'])(name, **config.get('OPTIONS', {}))
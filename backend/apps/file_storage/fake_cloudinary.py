@@ -0,0 +1,211 @@
+"""
+File Storage Fake Cloudinary Server
+
+This module contains a small in-process HTTP server that speaks enough
+of the Cloudinary upload and admin APIs for the gateway and the
+Cloudinary driver to be exercised without network access: chunked
+uploads, destroy, bulk delete and resource listing. Failures such as
+rate limiting can be injected to exercise retries.
+
+Point the SDK at it with FILE_STORAGE_CLOUDINARY_UPLOAD_PREFIX (or
+cloudinary.config(upload_prefix=server.url)):
+
+    with FakeCloudinaryServer() as server:
+        cloudinary.config(upload_prefix=server.url, cloud_name='demo',
+                          api_key='key', api_secret='secret')
+        server.fail_next(2, status=420)
+        upload_to_cloudinary(file)
+"""
+
+import json
+import re
+import threading
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+API_PATH = re.compile(r'^/v1_1/(?P<cloud>[^/]+)/(?P<rest>.+)$')
+
+
+class FakeCloudinaryServer:
+    """
+    Fake Cloudinary API listening on localhost.
+
+    Stored assets are kept in `assets` (public ID -> dict with content,
+    resource_type and created_at), and every request is appended to
+    `requests` as (method, path).
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.assets = {}
+        self.requests = []
+        self._failures = []
+        self._partial = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL to use as the SDK's upload_prefix."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail_next(self, count=1, status=420, message='Rate Limit Exceeded'):
+        """Answer the next `count` requests with an error response."""
+        with self._lock:
+            self._failures.extend([(status, message)] * count)
+
+    def _take_failure(self):
+        with self._lock:
+            return self._failures.pop(0) if self._failures else None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _respond(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self):
+                parsed = urlparse(self.path)
+                with server._lock:
+                    server.requests.append((self.command, parsed.path))
+
+                failure = server._take_failure()
+                if failure is not None:
+                    status, message = failure
+                    return self._respond(status, {'error': {'message': message}})
+
+                match = API_PATH.match(parsed.path)
+                if not match:
+                    return self._respond(404, {'error': {'message': 'Not found'}})
+
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                params = {key: values for key, values in parse_qs(parsed.query).items()}
+                files = {}
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('multipart/form-data'):
+                    message = BytesParser(policy=HTTP).parsebytes(
+                        f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+                    )
+                    for part in message.iter_parts():
+                        name = part.get_param('name', header='content-disposition')
+                        if part.get_filename() is not None:
+                            files[name] = part.get_payload(decode=True)
+                        else:
+                            params.setdefault(name, []).append(part.get_content())
+                elif content_type.startswith('application/x-www-form-urlencoded'):
+                    params.update(parse_qs(body.decode()))
+                elif content_type.startswith('application/json') and body:
+                    for key, value in json.loads(body).items():
+                        params[key] = value if isinstance(value, list) else [value]
+
+                cloud = match.group('cloud')
+                status, payload = server.dispatch(self.command, match.group('rest'), params, files, self.headers, cloud)
+                return self._respond(status, payload)
+
+            do_GET = do_POST = do_DELETE = _handle
+
+        return Handler
+
+    def dispatch(self, method, rest, params, files, headers, cloud):
+        """Route an API request and return (status, JSON payload)."""
+        first = lambda key, default=None: (params.get(key) or params.get(f'{key}[]') or [default])[0]
+        parts = rest.split('/')
+
+        if method == 'POST' and parts[-1] == 'upload':
+            return self._upload(parts[0], first('public_id'), files.get('file', b''), headers, cloud)
+
+        if method == 'POST' and parts[-1] == 'destroy':
+            with self._lock:
+                found = self.assets.pop(first('public_id'), None) is not None
+            return 200, {'result': 'ok' if found else 'not found'}
+
+        if method == 'DELETE' and parts[0] == 'resources':
+            public_ids = params.get('public_ids[]') or params.get('public_ids') or []
+            deleted = {}
+            with self._lock:
+                for public_id in public_ids:
+                    deleted[public_id] = 'deleted' if self.assets.pop(public_id, None) else 'not_found'
+            return 200, {'deleted': deleted}
+
+        if method == 'GET' and parts[0] == 'resources':
+            return 200, self._list(parts[1], first('prefix', ''), int(first('max_results', 10)), first('next_cursor'))
+
+        return 404, {'error': {'message': f'Unsupported request {method} {rest}'}}
+
+    def _upload(self, resource_type, public_id, data, headers, cloud):
+        # Chunked uploads send Content-Range and a shared X-Unique-Upload-Id
+        content_range = headers.get('Content-Range')
+        upload_id = headers.get('X-Unique-Upload-Id')
+        if content_range and upload_id:
+            start, end, total = map(int, re.match(r'bytes (\d+)-(\d+)/(-?\d+)', content_range).groups())
+            with self._lock:
+                buffer = self._partial.setdefault(upload_id, bytearray())
+                buffer[start:end + 1] = data
+                if total != -1 and end + 1 < total:
+                    return 200, {'done': False}
+                data = bytes(self._partial.pop(upload_id))
+
+        if resource_type == 'auto':
+            resource_type = 'image' if data[:3] in (b'\xff\xd8\xff', b'\x89PN', b'GIF') else 'raw'
+
+        created_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        with self._lock:
+            self.assets[public_id] = {
+                'content': data,
+                'resource_type': resource_type,
+                'created_at': created_at,
+            }
+        return 200, {
+            'public_id': public_id,
+            'resource_type': resource_type,
+            'bytes': len(data),
+            'created_at': created_at,
+            'secure_url': f'{self.url}/{cloud}/{resource_type}/upload/{public_id}',
+        }
+
+    def _list(self, resource_type, prefix, max_results, next_cursor):
+        with self._lock:
+            public_ids = sorted(
+                public_id for public_id, asset in self.assets.items()
+                if asset['resource_type'] == resource_type and public_id.startswith(prefix)
+            )
+            start = int(next_cursor or 0)
+            page = public_ids[start:start + max_results]
+            resources = [
+                {'public_id': public_id, 'created_at': self.assets[public_id]['created_at']}
+                for public_id in page
+            ]
+        payload = {'resources': resources}
+        if start + max_results < len(public_ids):
+            payload['next_cursor'] = str(start + max_results)
+        return payload
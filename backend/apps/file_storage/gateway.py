@@ -0,0 +1,236 @@
+"""
+File Storage Cloudinary Gateway
+
+This module contains the single entry point for Cloudinary requests.
+The gateway keeps a pooled HTTP connection manager sized to the allowed
+concurrency (shared with the Cloudinary SDK), caps the number of
+requests in flight with a semaphore, retries rate-limited and transient
+failures with jittered exponential backoff, and records per-operation
+latency and error metrics.
+"""
+
+import logging
+import random
+import socket
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+import cloudinary
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+import cloudinary.utils
+import urllib3
+
+logger = logging.getLogger(__name__)
+
+# Cloudinary requests allowed in flight at once (per process)
+MAX_CONCURRENCY = getattr(settings, 'FILE_STORAGE_CLOUDINARY_MAX_CONCURRENCY', 8)
+
+# Attempts per request, including the first one
+MAX_ATTEMPTS = getattr(settings, 'FILE_STORAGE_CLOUDINARY_MAX_ATTEMPTS', 4)
+
+# Backoff before retry n is a random delay up to min(cap, base * 2**n) seconds
+BACKOFF_BASE = getattr(settings, 'FILE_STORAGE_CLOUDINARY_BACKOFF_BASE', 0.5)
+BACKOFF_CAP = getattr(settings, 'FILE_STORAGE_CLOUDINARY_BACKOFF_CAP', 10)
+
+# Base URL of the Cloudinary API (e.g. a FakeCloudinaryServer in development)
+UPLOAD_PREFIX = getattr(settings, 'FILE_STORAGE_CLOUDINARY_UPLOAD_PREFIX', '')
+
+# Delivery (CDN) statuses worth retrying
+RETRY_STATUSES = {420, 429, 500, 502, 503, 504}
+
+# Messages of generic SDK errors raised for network failures
+TRANSIENT_ERROR_PREFIXES = ('Unexpected error', 'Socket error', 'Socket Error')
+
+
+class RetryableStatus(Exception):
+    """Raised inside a gateway call for a response that should be retried."""
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+def is_retryable(error):
+    """Check whether a failed Cloudinary request is worth retrying."""
+    if isinstance(error, (
+        cloudinary.exceptions.RateLimited,
+        cloudinary.exceptions.GeneralError,
+        RetryableStatus,
+        urllib3.exceptions.HTTPError,
+        socket.error,
+    )):
+        return True
+    if isinstance(error, cloudinary.exceptions.Error):
+        return str(error).startswith(TRANSIENT_ERROR_PREFIXES)
+    return False
+
+
+class CloudinaryGateway:
+    """
+    Run Cloudinary requests with pooling, a concurrency cap, retries and
+    metrics.
+
+    All Cloudinary traffic of the app goes through call() (SDK requests)
+    or open_url() (delivery URLs).
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, max_attempts=MAX_ATTEMPTS,
+                 backoff_base=BACKOFF_BASE, backoff_cap=BACKOFF_CAP):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(lambda: {
+            'calls': 0,
+            'errors': 0,
+            'retries': 0,
+            'rate_limited': 0,
+            'total_seconds': 0.0,
+            'max_seconds': 0.0,
+        })
+
+        if UPLOAD_PREFIX:
+            cloudinary.config(upload_prefix=UPLOAD_PREFIX)
+
+        # One pool for every request, keeping as many connections alive
+        # per host as requests may run at once
+        self.http = cloudinary.utils.get_http_connector(
+            cloudinary.config(),
+            dict(cloudinary.CERT_KWARGS, maxsize=max_concurrency),
+        )
+        self._share_pool()
+
+    def _share_pool(self):
+        """Make the SDK's upload and admin API clients use the gateway pool."""
+        # The SDK keeps module-level connection managers with a single
+        # connection per host; under concurrency they open and discard
+        # a connection per request
+        from cloudinary.api_client import call_api
+        for module in (cloudinary.uploader, call_api):
+            if hasattr(module, '_http'):
+                module._http = self.http
+
+    def backoff(self, attempt):
+        """Get the delay before retry number `attempt` (full jitter)."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def call(self, operation, func, *args, rewind=None, **kwargs):
+        """
+        Run a Cloudinary request.
+
+        Args:
+            operation (str): Name the metrics are recorded under
+            func: Callable performing the request
+            rewind (optional): Callable run before every retry, e.g. to
+                seek an upload back to its start
+            *args, **kwargs: Passed to func
+
+        Returns:
+            The result of func
+        """
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                with self._semaphore:
+                    result = func(*args, **kwargs)
+            except Exception as e:
+                self._record(operation, time.monotonic() - started, error=e)
+                attempt += 1
+                if attempt >= self.max_attempts or not is_retryable(e):
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(
+                    "Cloudinary %s failed (%s), retry %d in %.2fs",
+                    operation, e, attempt, delay
+                )
+                time.sleep(delay)
+                if rewind is not None:
+                    rewind()
+                with self._lock:
+                    self._metrics[operation]['retries'] += 1
+                continue
+
+            self._record(operation, time.monotonic() - started)
+            return result
+
+    def open_url(self, url, operation='open'):
+        """
+        Open a delivery URL for streaming reads.
+
+        Returns:
+            urllib3.HTTPResponse: Response streaming the content, or None
+                                  if the URL answers 404
+        """
+        def request():
+            response = self.http.request('GET', url, preload_content=False)
+            if response.status in RETRY_STATUSES:
+                response.release_conn()
+                raise RetryableStatus(response.status)
+            return response
+
+        response = self.call(operation, request)
+        if response.status == 404:
+            response.release_conn()
+            return None
+        if response.status >= 400:
+            response.release_conn()
+            raise cloudinary.exceptions.Error(f"HTTP {response.status} for {url}")
+        return response
+
+    def _record(self, operation, seconds, error=None):
+        with self._lock:
+            metrics = self._metrics[operation]
+            metrics['calls'] += 1
+            metrics['total_seconds'] += seconds
+            metrics['max_seconds'] = max(metrics['max_seconds'], seconds)
+            if error is not None:
+                metrics['errors'] += 1
+                if isinstance(error, cloudinary.exceptions.RateLimited) or (
+                    isinstance(error, RetryableStatus) and error.status in (420, 429)
+                ):
+                    metrics['rate_limited'] += 1
+
+    def metrics(self):
+        """
+        Get a snapshot of the per-operation metrics.
+
+        Returns:
+            dict: calls, errors, retries, rate_limited, mean and max
+                  latency (seconds) per operation
+        """
+        with self._lock:
+            return {
+                operation: {
+                    'calls': values['calls'],
+                    'errors': values['errors'],
+                    'retries': values['retries'],
+                    'rate_limited': values['rate_limited'],
+                    'mean_seconds': values['total_seconds'] / values['calls'] if values['calls'] else 0.0,
+                    'max_seconds': values['max_seconds'],
+                }
+                for operation, values in self._metrics.items()
+            }
+
+    def reset_metrics(self):
+        """Clear the recorded metrics."""
+        with self._lock:
+            self._metrics.clear()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Get the process-wide Cloudinary gateway, creating it on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = CloudinaryGateway()
+    return _gateway
@@ -0,0 +1,68 @@
+import os
+import time
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from apps.file_storage.drivers import STORAGE_DRIVERS, get_driver
+from apps.file_storage.streaming import StreamingUpload, UPLOAD_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Measures write, read and delete throughput of the storage drivers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'drivers',
+            nargs='*',
+            help='Drivers to benchmark (default: memory)',
+        )
+        parser.add_argument(
+            '--files',
+            type=int,
+            default=10,
+            help='Number of files to write',
+        )
+        parser.add_argument(
+            '--size-mb',
+            type=float,
+            default=5,
+            help='Size of each file in MB',
+        )
+
+    def handle(self, *args, **options):
+        drivers = options['drivers'] or ['memory']
+        unknown = [name for name in drivers if name not in STORAGE_DRIVERS]
+        if unknown:
+            raise CommandError(f"Unknown storage drivers: {', '.join(unknown)}")
+
+        size = int(options['size_mb'] * 1024 * 1024)
+        payload = os.urandom(size)
+        total_mb = options['files'] * size / (1024 * 1024)
+
+        for name in drivers:
+            driver = get_driver(name)
+            self.stdout.write(self.style.SUCCESS(
+                f"Benchmarking '{name}' with {options['files']} x {options['size_mb']}MB..."
+            ))
+
+            started = time.perf_counter()
+            keys = []
+            for number in range(options['files']):
+                upload = StreamingUpload(ContentFile(payload, name=f'benchmark-{number}.bin'))
+                keys.append(driver.write(upload)['storage_key'])
+            self._report('write', total_mb, started)
+
+            started = time.perf_counter()
+            for key in keys:
+                with driver.open(key) as stored:
+                    while stored.read(UPLOAD_CHUNK_SIZE):
+                        pass
+            self._report('read', total_mb, started)
+
+            started = time.perf_counter()
+            deleted = driver.delete_many(keys)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  delete: {len(deleted)} files in {elapsed:.3f}s")
+
+    def _report(self, phase, total_mb, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"  {phase}: {total_mb:.1f}MB in {elapsed:.3f}s ({total_mb / elapsed:.1f} MB/s)")
@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.file_storage.fake_cloudinary import FakeCloudinaryServer
+
+
+class Command(BaseCommand):
+    help = 'Runs a fake Cloudinary API server for offline development and tests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+
+    def handle(self, *args, **options):
+        with FakeCloudinaryServer(port=options['port']) as server:
+            self.stdout.write(self.style.SUCCESS(f'Fake Cloudinary listening on {server.url}'))
+            self.stdout.write(f'Set FILE_STORAGE_CLOUDINARY_UPLOAD_PREFIX={server.url} to use it.')
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
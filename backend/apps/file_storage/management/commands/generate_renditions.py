@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from apps.file_storage.models import StoredBlob
+from apps.file_storage.renditions import create_renditions
+
+
+class Command(BaseCommand):
+    help = 'Derives missing thumbnails and previews for stored images.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Starting rendition generation...'))
+
+        blob_ids = StoredBlob.objects.filter(
+            status='ready',
+            files__mime_type__startswith='image/',
+        ).exclude(
+            files__mime_type='image/svg+xml',
+        ).distinct().values_list('pk', flat=True)
+
+        created_count = 0
+        failed_count = 0
+
+        for blob_id in blob_ids:
+            try:
+                created = create_renditions(blob_id)
+            except Exception as e:
+                failed_count += 1
+                self.stdout.write(self.style.WARNING(f"Could not derive renditions of blob {blob_id}: {e}"))
+                continue
+            if created:
+                created_count += created
+                self.stdout.write(f"Created {created} renditions for blob {blob_id}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished rendition generation. {created_count} created, {failed_count} failed.'
+        ))
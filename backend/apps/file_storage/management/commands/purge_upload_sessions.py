@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from apps.file_storage.upload_sessions import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired upload sessions that were never completed, with their staged parts.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Purging expired upload sessions...'))
+        purged_count = purge_expired_sessions()
+        self.stdout.write(self.style.SUCCESS(f'Finished purging {purged_count} expired upload sessions.'))
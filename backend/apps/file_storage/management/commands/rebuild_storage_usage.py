@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.file_storage.quotas import rebuild_usage
+
+
+class Command(BaseCommand):
+    help = 'Recomputes per-user storage usage counters from the stored files.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Rebuilding storage usage...'))
+        user_count = rebuild_usage()
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished rebuilding storage usage for {user_count} users with files.'
+        ))
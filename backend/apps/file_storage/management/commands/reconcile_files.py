@@ -0,0 +1,198 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from apps.file_storage.drivers import STORAGE_DRIVERS, get_driver
+from apps.file_storage.models import FileRendition, StoredBlob, StoredFile
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconciles storage with the database: deletes stored objects no row '
+        'points at and reports (or marks) rows whose content is missing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--driver',
+            action='append',
+            dest='drivers',
+            help='Storage driver to reconcile (repeatable, default: all registered drivers)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be done without deleting or updating anything',
+        )
+        parser.add_argument(
+            '--min-age-hours',
+            type=float,
+            default=24,
+            help='Only delete orphans older than this, so in-flight uploads are kept (default: 24)',
+        )
+        parser.add_argument(
+            '--mark-missing',
+            action='store_true',
+            help='Mark files whose content is missing as failed and drop missing renditions',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Keys per database batch and per delete call (default: 1000)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Delete batches running in parallel (default: 4)',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.cutoff = timezone.now() - timedelta(hours=options['min_age_hours'])
+
+        names = options['drivers'] or list(STORAGE_DRIVERS)
+        try:
+            drivers = [get_driver(name) for name in names]
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Starting file reconciliation{' (dry run)' if self.dry_run else ''}..."
+        ))
+
+        for driver in drivers:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                self.reconcile(driver, executor, options['mark_missing'])
+
+        self.stdout.write(self.style.SUCCESS('Finished file reconciliation.'))
+
+    def referenced_keys(self, driver):
+        """Collect the storage keys the database points at for a driver."""
+        keys = set()
+        querysets = [
+            StoredBlob.objects.filter(storage_location=driver.name, status='ready'),
+            # Renditions the storage derives itself have no object of their own
+            FileRendition.objects.filter(storage_location=driver.name).exclude(storage_key=''),
+        ]
+        for queryset in querysets:
+            keys.update(
+                queryset.values_list('storage_key', flat=True).iterator(chunk_size=self.batch_size)
+            )
+
+        # Files stored before deduplication only know their URL
+        legacy_urls = StoredFile.objects.filter(
+            storage_location=driver.name, blob__isnull=True, status='ready'
+        ).values_list('file_url', flat=True).iterator(chunk_size=self.batch_size)
+        for file_url in legacy_urls:
+            storage_key = driver.get_storage_key(file_url)
+            if storage_key:
+                keys.add(storage_key)
+        return keys
+
+    def is_old_enough(self, driver, storage_key, modified_at):
+        """Check that an orphan predates the cutoff (in-flight uploads don't)."""
+        if modified_at is None:
+            try:
+                modified_at = driver.get_modified_time(storage_key)
+            except (OSError, NotImplementedError):
+                return False
+        if modified_at is None:
+            return False
+        if timezone.is_naive(modified_at):
+            modified_at = timezone.make_aware(modified_at)
+        return modified_at < self.cutoff
+
+    def reconcile(self, driver, executor, mark_missing):
+        """Diff one driver's storage against the database."""
+        self.stdout.write(f"Reconciling {driver.name} storage...")
+        referenced = self.referenced_keys(driver)
+        self.stdout.write(f"  {len(referenced)} objects referenced by the database")
+
+        found = set()
+        scanned = 0
+        orphans = []
+        orphan_count = 0
+        deletions = []
+
+        try:
+            for storage_key, modified_at in driver.list_objects():
+                scanned += 1
+                if storage_key in referenced:
+                    found.add(storage_key)
+                elif self.is_old_enough(driver, storage_key, modified_at):
+                    orphans.append(storage_key)
+                    orphan_count += 1
+                    if self.verbosity > 1:
+                        self.stdout.write(f"  orphan: {storage_key}")
+
+                if len(orphans) >= self.batch_size:
+                    deletions.append(self.delete_orphans(driver, executor, orphans))
+                    orphans = []
+                if scanned % self.batch_size == 0:
+                    self.stdout.write(f"  scanned {scanned} objects, {orphan_count} orphaned")
+        except NotImplementedError:
+            self.stdout.write(self.style.WARNING(
+                f"  {driver.name} storage can't be listed, skipping"
+            ))
+            return
+
+        if orphans:
+            deletions.append(self.delete_orphans(driver, executor, orphans))
+        deleted_count = sum(len(deletion.result()) for deletion in deletions if deletion)
+
+        missing = referenced - found
+        self.stdout.write(
+            f"  scanned {scanned} objects: {orphan_count} orphaned, "
+            f"{deleted_count} deleted, {len(missing)} missing"
+        )
+        if self.verbosity > 1:
+            for storage_key in sorted(missing):
+                self.stdout.write(f"  missing: {storage_key}")
+
+        if missing and mark_missing and not self.dry_run:
+            self.mark_missing(driver, missing)
+
+    def delete_orphans(self, driver, executor, storage_keys):
+        """Schedule a batch of orphans for deletion (nothing in dry-run mode)."""
+        if self.dry_run:
+            return None
+        return executor.submit(driver.delete_many, list(storage_keys))
+
+    def mark_missing(self, driver, missing):
+        """Flag rows whose content is gone so they are no longer served."""
+        missing = list(missing)
+        failed_files = 0
+        dropped_renditions = 0
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            blob_ids = list(StoredBlob.objects.filter(
+                storage_location=driver.name, storage_key__in=batch, status='ready'
+            ).values_list('pk', flat=True))
+            StoredBlob.objects.filter(pk__in=blob_ids).update(status='failed')
+            failed_files += StoredFile.objects.filter(blob_id__in=blob_ids).update(status='failed')
+
+            # Renditions can be derived again with generate_renditions
+            dropped, _ = FileRendition.objects.filter(
+                storage_location=driver.name, storage_key__in=batch
+            ).delete()
+            dropped_renditions += dropped
+
+        legacy_files = StoredFile.objects.filter(
+            storage_location=driver.name, blob__isnull=True, status='ready'
+        ).only('file_id', 'file_url').iterator(chunk_size=self.batch_size)
+        missing = set(missing)
+        legacy_ids = [
+            stored_file.file_id for stored_file in legacy_files
+            if driver.get_storage_key(stored_file.file_url) in missing
+        ]
+        failed_files += StoredFile.objects.filter(file_id__in=legacy_ids).update(status='failed')
+
+        self.stdout.write(self.style.WARNING(
+            f"  marked {failed_files} files as failed, dropped {dropped_renditions} renditions"
+        ))
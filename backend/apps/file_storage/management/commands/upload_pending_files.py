@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from apps.file_storage.background import upload_pending_blob
+from apps.file_storage.models import StoredBlob, StoredFile
+
+
+class Command(BaseCommand):
+    help = 'Pushes staged uploads that are still pending (or failed) to remote storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also retry uploads that previously failed',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Starting pending upload processing...'))
+
+        if options['retry_failed']:
+            failed_ids = list(
+                StoredBlob.objects.filter(status='failed').values_list('pk', flat=True)
+            )
+            StoredBlob.objects.filter(pk__in=failed_ids).update(status='pending')
+            StoredFile.objects.filter(blob_id__in=failed_ids).update(status='pending')
+
+        uploaded_count = 0
+        failed_count = 0
+
+        for blob_id in StoredBlob.objects.filter(status='pending').values_list('pk', flat=True):
+            if upload_pending_blob(blob_id):
+                uploaded_count += 1
+                self.stdout.write(f"Uploaded blob {blob_id}")
+            else:
+                failed_count += 1
+                self.stdout.write(self.style.WARNING(f"Could not upload blob {blob_id}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished pending upload processing. {uploaded_count} uploaded, {failed_count} failed.'
+        ))
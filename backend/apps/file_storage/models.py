@@ -7,24 +7,226 @@ with support for both local storage and Cloudinary.
 
 import uuid
 import os
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 
+class StoredBlobManager(models.Manager):
+    """Manager handling reference counts of shared blobs."""
+    
+    def acquire(self, content_hash):
+        """
+        Add a reference to the live blob with the given content hash.
+        
+        Blobs whose background upload failed are not shared; new copies of
+        their content take them over through reclaim().
+        
+        Returns:
+            StoredBlob: The referenced blob, or None if no pending or ready
+                        blob has this hash
+        """
+        with transaction.atomic():
+            blob = self.select_for_update().filter(
+                content_hash=content_hash, status__in=('pending', 'ready')
+            ).first()
+            if blob is not None:
+                blob.ref_count = models.F('ref_count') + 1
+                blob.save(update_fields=['ref_count'])
+                blob.refresh_from_db(fields=['ref_count'])
+        return blob
+    
+    def reclaim(self, content_hash, **fields):
+        """
+        Point a failed blob at a new copy of its content and add a reference.
+        
+        The blob's files follow its new location, URL and status.
+        
+        Args:
+            content_hash (str): SHA-256 of the content
+            **fields: storage_location, storage_key, file_url, file_size
+                      and status of the new copy
+        
+        Returns:
+            tuple: (blob, storage key of the failed copy), or (None, None)
+                   if no failed blob has this hash
+        """
+        with transaction.atomic():
+            blob = self.select_for_update().filter(content_hash=content_hash, status='failed').first()
+            if blob is None:
+                return None, None
+            previous_key = blob.storage_key
+            for field, value in fields.items():
+                setattr(blob, field, value)
+            blob.ref_count = models.F('ref_count') + 1
+            blob.save(update_fields=[*fields, 'ref_count'])
+            blob.refresh_from_db(fields=['ref_count'])
+            StoredFile.objects.filter(blob=blob).update(
+                storage_location=blob.storage_location,
+                file_url=blob.file_url,
+                status=blob.status,
+            )
+        return blob, previous_key
+
+
+UPLOAD_STATUS_CHOICES = [
+    ('pending', 'Pending'),
+    ('ready', 'Ready'),
+    ('failed', 'Failed'),
+]
+
+
+class StoredBlob(models.Model):
+    """
+    Physical file content shared by one or more StoredFile rows.
+    
+    Blobs are addressed by the SHA-256 of their bytes, so uploading the
+    same content twice reuses the existing Cloudinary asset or local file.
+    The physical object is removed when the last reference goes away.
+    
+    Blobs waiting for a background Cloudinary upload are 'pending' and
+    their storage_key points at the staged copy on local disk.
+    """
+    
+    content_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="SHA-256 hex digest of the file content"
+    )
+    
+    storage_location = models.CharField(
+        max_length=20,
+        help_text="Storage driver holding the content (local, cloudinary, ...)"
+    )
+    
+    storage_key = models.CharField(
+        max_length=500,
+        help_text="Cloudinary public ID or storage path"
+    )
+    
+    file_url = models.URLField(
+        max_length=500,
+        help_text="Full URL or file path to access the content"
+    )
+    
+    file_size = models.PositiveBigIntegerField(
+        help_text="Size of the content in bytes"
+    )
+    
+    ref_count = models.PositiveIntegerField(
+        default=1,
+        help_text="Number of stored files pointing at this content"
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=UPLOAD_STATUS_CHOICES,
+        default='ready',
+        help_text="Whether the content has reached its storage location"
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = StoredBlobManager()
+    
+    class Meta:
+        db_table = 'stored_blobs'
+    
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.ref_count} refs)"
+
+
+class FileRendition(models.Model):
+    """
+    Downscaled copy of an image blob (thumbnail or preview).
+    
+    Renditions are derived from the content, so every StoredFile sharing
+    a blob shares its renditions. They are stored through the same driver
+    as the original and removed together with the blob. Storages that
+    resize images themselves (Cloudinary) serve renditions from a
+    transformation URL of the original; those have no storage key or size.
+    """
+    
+    FORMAT_CHOICES = [
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    ]
+    
+    blob = models.ForeignKey(
+        StoredBlob,
+        on_delete=models.CASCADE,
+        related_name='renditions',
+        help_text="Original content the rendition was derived from"
+    )
+    
+    width = models.PositiveIntegerField(
+        help_text="Width of the rendition in pixels"
+    )
+    
+    height = models.PositiveIntegerField(
+        help_text="Height of the rendition in pixels"
+    )
+    
+    format = models.CharField(
+        max_length=10,
+        choices=FORMAT_CHOICES,
+        help_text="Image format of the rendition"
+    )
+    
+    storage_location = models.CharField(
+        max_length=20,
+        help_text="Storage driver holding the rendition"
+    )
+    
+    storage_key = models.CharField(
+        max_length=500,
+        blank=True,
+        help_text="Cloudinary public ID or storage path (empty when the storage derives the rendition)"
+    )
+    
+    file_url = models.URLField(
+        max_length=500,
+        help_text="Full URL or file path to access the rendition"
+    )
+    
+    file_size = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Size of the rendition in bytes (unknown when the storage derives the rendition)"
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'file_renditions'
+        ordering = ['width', 'format']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['blob', 'width', 'format'],
+                name='unique_rendition_per_blob'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.blob} {self.width}w {self.format}"
+
+
 class StoredFile(models.Model):
     """
     Model for storing file metadata and references.
     
-    Supports both local storage and Cloudinary storage based on file type.
-    Images and videos are stored on Cloudinary, while documents are stored locally.
+    Files are stored through the storage driver chosen by the routing
+    rules (see utils.determine_storage_location). By default images and
+    videos are stored on Cloudinary, while documents are stored locally.
     """
     
     STORAGE_CHOICES = [
         ('local', 'Local Storage'),
         ('cloudinary', 'Cloudinary'),
+        ('s3', 'S3-compatible Storage'),
+        ('memory', 'In-memory Storage'),
     ]
     
     # Primary key
@@ -51,7 +253,7 @@ class StoredFile(models.Model):
     storage_location = models.CharField(
         max_length=20,
         choices=STORAGE_CHOICES,
-        help_text="Where the file is stored (local or cloudinary)"
+        help_text="Storage driver holding the file (local, cloudinary, ...)"
     )
     
     file_url = models.URLField(
@@ -65,6 +267,28 @@ class StoredFile(models.Model):
         help_text="Size of the file in bytes"
     )
     
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="SHA-256 hex digest of the file content"
+    )
+    
+    blob = models.ForeignKey(
+        StoredBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='files',
+        help_text="Shared content this file points at"
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=UPLOAD_STATUS_CHOICES,
+        default='ready',
+        help_text="Upload status (pending while a background upload runs)"
+    )
+    
     # Timestamps and user tracking
     uploaded_at = models.DateTimeField(
         auto_now_add=True,
@@ -98,6 +322,12 @@ class StoredFile(models.Model):
             models.Index(fields=['uploaded_by']),
             models.Index(fields=['storage_location']),
             models.Index(fields=['mime_type']),
+            models.Index(fields=['content_hash']),
+            # Keyset pagination of a user's files, newest first
+            models.Index(
+                fields=['uploaded_by', '-uploaded_at', '-file_id'],
+                name='stored_files_user_recent_idx'
+            ),
         ]
     
     def __str__(self):
@@ -131,6 +361,27 @@ class StoredFile(models.Model):
         ]
         return self.mime_type in document_types
     
+    def get_renditions(self):
+        """Get the renditions derived from this file's content."""
+        if self.blob_id is None:
+            return []
+        return list(self.blob.renditions.all())
+    
+    def get_preview_url(self, width=200, format='webp'):
+        """
+        Get the URL of the smallest rendition at least `width` pixels wide.
+        
+        Falls back to the widest rendition if none is wide enough, and to
+        the original file if no renditions exist (yet).
+        """
+        renditions = [r for r in self.get_renditions() if r.format == format]
+        if not renditions:
+            return self.file_url
+        wide_enough = [r for r in renditions if r.width >= width]
+        if wide_enough:
+            return min(wide_enough, key=lambda r: r.width).file_url
+        return max(renditions, key=lambda r: r.width).file_url
+    
     def get_absolute_url(self):
         """Get the absolute URL for accessing this file."""
         return f"/api/files/{self.file_reference}/"
@@ -138,3 +389,183 @@ class StoredFile(models.Model):
     def get_download_url(self):
         """Get the download URL for this file."""
         return f"/api/files/{self.file_reference}/download/"
+
+
+class UploadSession(models.Model):
+    """
+    Resumable, multi-part upload of a single large file.
+    
+    Clients open a session, PUT numbered chunks (in any order and in
+    parallel) and then complete the session, which assembles the parts
+    into a StoredFile.
+    """
+    
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('completing', 'Completing'),
+        ('completed', 'Completed'),
+        ('aborted', 'Aborted'),
+    ]
+    
+    session_id = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        help_text="Unique reference for the upload session"
+    )
+    
+    file_name = models.CharField(
+        max_length=255,
+        help_text="Original name of the file being uploaded"
+    )
+    
+    mime_type = models.CharField(
+        max_length=100,
+        help_text="Declared MIME type of the file"
+    )
+    
+    total_size = models.PositiveBigIntegerField(
+        help_text="Size of the complete file in bytes"
+    )
+    
+    chunk_size = models.PositiveIntegerField(
+        help_text="Size of every part except the last, in bytes"
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='open',
+        help_text="Current state of the upload session"
+    )
+    
+    is_public = models.BooleanField(
+        default=True,
+        help_text="Whether the resulting file is publicly accessible"
+    )
+    
+    description = models.TextField(
+        blank=True,
+        help_text="Optional description of the file"
+    )
+    
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        help_text="User who opened the session"
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    expires_at = models.DateTimeField(
+        help_text="When unfinished parts may be discarded"
+    )
+    
+    stored_file = models.OneToOneField(
+        StoredFile,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload_session',
+        help_text="File created when the session was completed"
+    )
+    
+    class Meta:
+        db_table = 'upload_sessions'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+    
+    @property
+    def total_parts(self):
+        """Number of parts the file is split into."""
+        return max(1, -(-self.total_size // self.chunk_size))
+    
+    def expected_part_size(self, part_number):
+        """Size in bytes the given (1-based) part must have."""
+        if part_number < self.total_parts:
+            return self.chunk_size
+        return self.total_size - self.chunk_size * (self.total_parts - 1)
+    
+    def part_path(self, part_number):
+        """Staging path of the given part."""
+        return f"upload_sessions/{self.session_id}/{part_number:05d}.part"
+
+
+class UploadSessionPart(models.Model):
+    """A single received chunk of an UploadSession."""
+    
+    session = models.ForeignKey(
+        UploadSession,
+        on_delete=models.CASCADE,
+        related_name='parts'
+    )
+    
+    part_number = models.PositiveIntegerField(
+        help_text="1-based position of the part in the file"
+    )
+    
+    size = models.PositiveIntegerField(
+        help_text="Size of the part in bytes"
+    )
+    
+    checksum = models.CharField(
+        max_length=64,
+        help_text="SHA-256 hex digest of the part"
+    )
+    
+    uploaded_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'upload_session_parts'
+        ordering = ['part_number']
+        unique_together = [('session', 'part_number')]
+    
+    def __str__(self):
+        return f"Part {self.part_number} of {self.session_id}"
+
+
+class StorageUsage(models.Model):
+    """
+    Running storage totals of a user, used to enforce upload quotas.
+    
+    The counters are maintained incrementally (see quotas.py) so checking
+    a quota never has to sum the user's files. rebuild_storage_usage
+    recomputes them from StoredFile if they ever drift.
+    """
+    
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='storage_usage'
+    )
+    
+    bytes_used = models.PositiveBigIntegerField(
+        default=0,
+        help_text="Total size of the user's files in bytes"
+    )
+    
+    file_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of files the user has uploaded"
+    )
+    
+    quota_bytes = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Storage quota in bytes (empty for the default quota)"
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'storage_usage'
+    
+    def __str__(self):
+        return f"{self.user} ({self.bytes_used} bytes, {self.file_count} files)"
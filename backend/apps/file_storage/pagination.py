@@ -0,0 +1,81 @@
+"""
+File Storage Pagination
+
+This module contains keyset (cursor) pagination helpers for file lists.
+Files are walked in (uploaded_at, file_id) order, newest first, so every
+page is an index range scan no matter how deep the client has paged and
+no COUNT query is needed.
+"""
+
+import base64
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+DEFAULT_PAGE_SIZE = getattr(settings, 'FILE_STORAGE_LIST_PAGE_SIZE', 100)
+MAX_PAGE_SIZE = 1000
+
+# Rows fetched per round trip when streaming from a server-side cursor
+STREAM_CHUNK_SIZE = 2000
+
+ORDERING = ('-uploaded_at', '-file_id')
+
+
+class InvalidCursorError(Exception):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(stored_file):
+    """Build the opaque cursor pointing just after the given file."""
+    raw = f"{stored_file.uploaded_at.isoformat()}|{stored_file.file_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor into its (uploaded_at, file_id) position.
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        uploaded_at, file_id = raw.rsplit('|', 1)
+        position = (parse_datetime(uploaded_at), int(file_id))
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursorError('Invalid cursor')
+    if position[0] is None:
+        raise InvalidCursorError('Invalid cursor')
+    return position
+
+
+def after_cursor(queryset, cursor):
+    """
+    Order a queryset for keyset pagination and skip past the cursor.
+
+    Args:
+        queryset: StoredFile queryset
+        cursor (str): Cursor from a previous page, or None for the first page
+
+    Returns:
+        QuerySet: Ordered queryset starting after the cursor
+    """
+    queryset = queryset.order_by(*ORDERING)
+    if not cursor:
+        return queryset
+
+    uploaded_at, file_id = decode_cursor(cursor)
+    return queryset.filter(
+        Q(uploaded_at__lt=uploaded_at) |
+        Q(uploaded_at=uploaded_at, file_id__lt=file_id)
+    )
+
+
+def get_page_size(value):
+    """Parse the requested page size, clamped to MAX_PAGE_SIZE."""
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
@@ -0,0 +1,179 @@
+"""
+File Storage Quotas
+
+This module keeps per-user storage totals (bytes and file count) in the
+StorageUsage side table and enforces upload quotas against them. Uploads
+reserve their size with a single conditional UPDATE before any bytes
+are transferred, so an over-quota upload is rejected in O(1) and
+concurrent uploads can't overshoot the quota. Deleting a file gives its
+size back; bulk deletions give it back with one UPDATE per user.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Greatest
+from django.template.defaultfilters import filesizeformat
+
+from .models import StorageUsage, StoredFile
+
+
+# Bytes a user may store unless their StorageUsage row overrides it
+# (None means unlimited)
+DEFAULT_USER_QUOTA = getattr(settings, 'FILE_STORAGE_USER_QUOTA', 1024 * 1024 * 1024)
+
+
+# Primary keys of the files whose quota a bulk deletion releases itself,
+# so the post_delete handler skips them
+_bulk_released = ContextVar('file_storage_bulk_released', default=frozenset())
+
+
+class QuotaExceededError(Exception):
+    """Raised when an upload would take a user past their storage quota."""
+
+
+def fits_quota(size):
+    """Condition matching usage rows with room for `size` more bytes."""
+    fits = Q(quota_bytes__isnull=False, bytes_used__lte=F('quota_bytes') - size)
+    if DEFAULT_USER_QUOTA is None:
+        return fits | Q(quota_bytes__isnull=True)
+    return fits | Q(quota_bytes__isnull=True, bytes_used__lte=DEFAULT_USER_QUOTA - size)
+
+
+def reserve_quota(user, size):
+    """
+    Add an upload to a user's totals if it fits in their quota.
+
+    Call release_quota if the upload then fails.
+
+    Args:
+        user: User uploading the file
+        size (int): Size of the upload in bytes
+
+    Raises:
+        QuotaExceededError: If the upload doesn't fit
+    """
+    for _ in range(2):
+        reserved = StorageUsage.objects.filter(fits_quota(size), user=user).update(
+            bytes_used=F('bytes_used') + size,
+            file_count=F('file_count') + 1,
+        )
+        if reserved:
+            return
+        # First upload of the user: create the row and try again
+        _, created = StorageUsage.objects.get_or_create(user=user)
+        if not created:
+            break
+
+    raise QuotaExceededError(
+        f"Storage quota exceeded ({filesizeformat(get_usage(user)['quota_bytes'])})"
+    )
+
+
+def release_quota(user_id, size, files=1):
+    """
+    Remove files from a user's totals.
+
+    Args:
+        user_id (int): ID of the user the files belong to
+        size (int): Total size of the files in bytes
+        files (int): Number of files
+    """
+    StorageUsage.objects.filter(user_id=user_id).update(
+        bytes_used=Greatest(F('bytes_used') - size, Value(0)),
+        file_count=Greatest(F('file_count') - files, Value(0)),
+    )
+
+
+def release_quotas(stored_files):
+    """
+    Remove many files from their owners' totals, one UPDATE per owner.
+
+    Args:
+        stored_files (list): Deleted StoredFile instances
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for stored_file in stored_files:
+        if stored_file.uploaded_by_id:
+            total = totals[stored_file.uploaded_by_id]
+            total[0] += stored_file.file_size or 0
+            total[1] += 1
+    for user_id, (size, files) in totals.items():
+        release_quota(user_id, size, files)
+
+
+@contextmanager
+def releasing_quotas(stored_files):
+    """
+    Release the quota of files deleted in bulk inside the block.
+
+    The per-row post_delete handler skips these files and their totals
+    are released together once the block succeeds. Must be used inside
+    the transaction that deletes the rows.
+    """
+    token = _bulk_released.set(
+        _bulk_released.get() | {stored_file.pk for stored_file in stored_files}
+    )
+    try:
+        yield
+    finally:
+        _bulk_released.reset(token)
+    release_quotas(stored_files)
+
+
+def is_released_in_bulk(stored_file):
+    """Check whether a bulk deletion releases a file's quota itself."""
+    return stored_file.pk in _bulk_released.get()
+
+
+def get_usage(user):
+    """
+    Get a user's storage usage and quota.
+
+    Returns:
+        dict: bytes_used, file_count and quota_bytes (None if unlimited)
+    """
+    usage = StorageUsage.objects.filter(user=user).first() or StorageUsage(user=user)
+    quota = usage.quota_bytes if usage.quota_bytes is not None else DEFAULT_USER_QUOTA
+    return {
+        'bytes_used': usage.bytes_used,
+        'file_count': usage.file_count,
+        'quota_bytes': quota,
+    }
+
+
+def rebuild_usage():
+    """
+    Recompute every user's totals from their StoredFile rows.
+
+    Uploads and deletions running at the same time may be missed, so run
+    it in a quiet period.
+
+    Returns:
+        int: Number of users with files
+    """
+    totals = StoredFile.objects.filter(uploaded_by__isnull=False).values(
+        'uploaded_by'
+    ).annotate(bytes_used=Sum('file_size'), file_count=Count('pk'))
+
+    with transaction.atomic():
+        StorageUsage.objects.update(bytes_used=0, file_count=0)
+        rows = [
+            StorageUsage(
+                user_id=total['uploaded_by'],
+                bytes_used=total['bytes_used'] or 0,
+                file_count=total['file_count'],
+            )
+            for total in totals
+        ]
+        StorageUsage.objects.bulk_create(
+            rows,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['bytes_used', 'file_count'],
+        )
+    return len(rows)
@@ -0,0 +1,265 @@
+"""
+File Storage Renditions
+
+This module derives downscaled WebP/JPEG renditions (thumbnails and
+previews) of uploaded images with Pillow. Derivation runs in a worker
+pool once the original has been stored, so uploads never wait for image
+decoding, and admin pages and carousels can load a small rendition
+instead of the full-resolution original.
+
+Storages that resize images themselves (Cloudinary) are not sent any
+derived bytes: renditions there are transformation URLs of the original,
+and only the image header is read to record their dimensions.
+"""
+
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .drivers import get_driver
+from .models import FileRendition, StoredBlob
+
+logger = logging.getLogger(__name__)
+
+# Widths (in pixels) of the renditions derived from every image
+RENDITION_WIDTHS = getattr(settings, 'FILE_STORAGE_RENDITION_WIDTHS', [200, 800])
+
+# Formats every width is encoded in
+RENDITION_FORMATS = getattr(settings, 'FILE_STORAGE_RENDITION_FORMATS', ['webp', 'jpeg'])
+
+RENDITION_WORKERS = getattr(settings, 'FILE_STORAGE_RENDITION_WORKERS', 2)
+
+RENDITION_QUALITY = 80
+
+# Bytes read from the start of an image to learn its dimensions
+HEADER_READ_SIZE = 256 * 1024
+
+# EXIF orientations that rotate the image by 90 degrees
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+PIL_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+_executor = None
+
+
+def get_executor():
+    """Get the shared rendition worker pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=RENDITION_WORKERS,
+            thread_name_prefix='file-storage-rendition',
+        )
+    return _executor
+
+
+def needs_renditions(mime_type):
+    """Check whether renditions are derived for a MIME type."""
+    # Vector images scale on their own
+    return mime_type.startswith('image/') and mime_type != 'image/svg+xml'
+
+
+def enqueue_renditions(blob_id):
+    """Schedule rendition derivation once the current transaction commits."""
+    transaction.on_commit(lambda: get_executor().submit(run_renditions, blob_id))
+
+
+def run_renditions(blob_id):
+    """Worker entry point: derive renditions with its own database connection."""
+    close_old_connections()
+    try:
+        create_renditions(blob_id)
+    except Exception:
+        logger.exception("Deriving renditions of blob %s failed", blob_id)
+    finally:
+        close_old_connections()
+
+
+def create_renditions(blob_id, source=None):
+    """
+    Derive the missing renditions of an image blob.
+
+    The image is decoded once (at reduced scale for JPEGs when possible)
+    and downscaled from the largest width to the smallest.
+
+    Args:
+        blob_id (int): Primary key of a ready StoredBlob
+        source (optional): Path or file object to read the original from
+            instead of its storage (e.g. the staged copy of a background
+            upload)
+
+    Returns:
+        int: Number of renditions created
+    """
+    blob = StoredBlob.objects.filter(pk=blob_id, status='ready').first()
+    if blob is None:
+        return 0
+
+    existing = set(blob.renditions.values_list('width', 'format'))
+    missing = [
+        (width, rendition_format)
+        for width in sorted(RENDITION_WIDTHS, reverse=True)
+        for rendition_format in RENDITION_FORMATS
+        if (width, rendition_format) not in existing
+    ]
+    if not missing:
+        return 0
+
+    driver = get_driver(blob.storage_location)
+    if driver.rendition_url(blob.storage_key, *missing[0]) is not None:
+        return create_rendition_urls(blob, driver, missing, source)
+
+    if source is None:
+        source = driver.open(blob.storage_key)
+
+    try:
+        with Image.open(source) as original:
+            # Widths are compared with the displayed (EXIF-oriented) size
+            source_width, source_height = original.size
+            transposed = original.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS
+            if transposed:
+                source_width, source_height = source_height, source_width
+            largest = missing[0][0]
+            draft_size = (largest, largest * source_height // source_width)
+            original.draft('RGB', draft_size[::-1] if transposed else draft_size)
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    except UnidentifiedImageError:
+        return 0
+    finally:
+        if hasattr(source, 'close'):
+            source.close()
+
+    created = 0
+    for width, rendition_format in missing:
+        # Never upscale
+        if width >= source_width:
+            continue
+        if image.width != width:
+            image = image.resize(
+                (width, max(1, round(image.height * width / image.width))),
+                Image.LANCZOS
+            )
+
+        data = encode_rendition(image, rendition_format)
+        stored = driver.write(ContentFile(
+            data, name=f"{blob.content_hash[:16]}-{width}.{rendition_format}"
+        ))
+        try:
+            with transaction.atomic():
+                FileRendition.objects.create(
+                    blob=blob,
+                    width=image.width,
+                    height=image.height,
+                    format=rendition_format,
+                    storage_location=blob.storage_location,
+                    storage_key=stored['storage_key'],
+                    file_url=stored['file_url'],
+                    file_size=len(data),
+                )
+        except IntegrityError:
+            # The blob was deleted meanwhile, or another worker got there first
+            driver.delete(stored['storage_key'])
+            continue
+        created += 1
+
+    return created
+
+
+def create_rendition_urls(blob, driver, missing, source=None):
+    """
+    Record renditions the storage derives on request from the original.
+
+    Only the image header is read, to learn the displayed dimensions of
+    the original; nothing is decoded, encoded or uploaded.
+
+    Returns:
+        int: Number of renditions created
+    """
+    size = read_image_size(source if source is not None else driver.open(blob.storage_key))
+    if size is None:
+        return 0
+    source_width, source_height = size
+
+    created = 0
+    for width, rendition_format in missing:
+        # Never upscale
+        if width >= source_width:
+            continue
+        try:
+            with transaction.atomic():
+                FileRendition.objects.create(
+                    blob=blob,
+                    width=width,
+                    height=max(1, round(source_height * width / source_width)),
+                    format=rendition_format,
+                    storage_location=blob.storage_location,
+                    storage_key='',
+                    file_url=driver.rendition_url(blob.storage_key, width, rendition_format),
+                    file_size=None,
+                )
+        except IntegrityError:
+            # The blob was deleted meanwhile, or another worker got there first
+            continue
+        created += 1
+
+    return created
+
+
+def read_image_size(source):
+    """
+    Read the displayed (EXIF-oriented) size of an image from its header.
+
+    Args:
+        source: Path or file object; file objects are closed
+
+    Returns:
+        tuple: (width, height), or None if the image can't be identified
+    """
+    try:
+        if isinstance(source, str):
+            with open(source, 'rb') as source_file:
+                header = source_file.read(HEADER_READ_SIZE)
+        else:
+            header = source.read(HEADER_READ_SIZE)
+    finally:
+        if hasattr(source, 'close'):
+            source.close()
+
+    try:
+        with Image.open(io.BytesIO(header)) as image:
+            width, height = image.size
+            orientation = image.getexif().get(0x0112)
+    except (UnidentifiedImageError, OSError):
+        return None
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return width, height
+
+
+def encode_rendition(image, rendition_format):
+    """Encode an image as WebP or JPEG and return the bytes."""
+    if rendition_format == 'jpeg' and image.mode != 'RGB':
+        # JPEG has no alpha channel; flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        converted = image.convert('RGBA')
+        background.paste(converted, mask=converted.split()[-1])
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    output = io.BytesIO()
+    image.save(
+        output,
+        PIL_FORMATS[rendition_format],
+        quality=RENDITION_QUALITY,
+        optimize=rendition_format == 'jpeg',
+    )
+    return output.getvalue()
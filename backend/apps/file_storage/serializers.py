@@ -4,8 +4,58 @@ File Storage Serializers
 This module contains serializers for the file storage API endpoints.
 """
 
+from django.conf import settings
 from rest_framework import serializers
-from .models import StoredFile
+from .models import StoredFile, UploadSession, FileRendition
+from .signing import get_signed_url
+from .utils import MAX_UPLOAD_SIZE
+
+
+# Most files a single bulk request may reference
+BULK_MAX_FILES = getattr(settings, 'FILE_STORAGE_BULK_MAX_FILES', 500)
+
+
+# File extensions accepted by the upload endpoints
+ALLOWED_EXTENSIONS = {
+    # Images
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg',
+    # Videos
+    '.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv',
+    # Audio
+    '.mp3', '.m4a', '.wav', '.ogg',
+    # Documents
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.txt',
+    # Archives
+    '.zip', '.rar', '.7z', '.tar', '.gz',
+}
+
+
+def validate_file_extension(file_name):
+    """Raise a ValidationError if the file extension is not allowed."""
+    file_extension = file_name.lower().split('.')[-1] if '.' in file_name else ''
+    if f'.{file_extension}' not in ALLOWED_EXTENSIONS:
+        raise serializers.ValidationError(
+            f"File type '.{file_extension}' is not allowed. "
+            f"Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+
+
+class FileRenditionSerializer(serializers.ModelSerializer):
+    """
+    Serializer for FileRendition model.
+    
+    Describes one downscaled copy of an image.
+    """
+    
+    class Meta:
+        model = FileRendition
+        fields = [
+            'width',
+            'height',
+            'format',
+            'file_url',
+            'file_size',
+        ]
 
 
 class StoredFileSerializer(serializers.ModelSerializer):
@@ -22,6 +72,7 @@ class StoredFileSerializer(serializers.ModelSerializer):
     absolute_url = serializers.SerializerMethodField()
     download_url = serializers.SerializerMethodField()
     uploaded_by_username = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
     
     class Meta:
         model = StoredFile
@@ -33,6 +84,9 @@ class StoredFileSerializer(serializers.ModelSerializer):
             'storage_location',
             'file_url',
             'file_size',
+            'content_hash',
+            'status',
+            'renditions',
             'uploaded_at',
             'uploaded_by',
             'uploaded_by_username',
@@ -48,6 +102,8 @@ class StoredFileSerializer(serializers.ModelSerializer):
         read_only_fields = [
             'file_id',
             'file_reference',
+            'content_hash',
+            'status',
             'uploaded_at',
             'uploaded_by',
         ]
@@ -60,9 +116,13 @@ class StoredFileSerializer(serializers.ModelSerializer):
         """Get the download URL for the file."""
         return obj.get_download_url()
     
+    def get_renditions(self, obj):
+        """Get the thumbnails and previews derived from the file."""
+        return FileRenditionSerializer(obj.get_renditions(), many=True).data
+    
     def get_uploaded_by_username(self, obj):
         """Get the username of the user who uploaded the file."""
-        return obj.uploaded_by.username if obj.uploaded_by else None
+        return obj.uploaded_by.get_username() if obj.uploaded_by else None
 
 
 class FileUploadSerializer(serializers.Serializer):
@@ -92,36 +152,93 @@ class FileUploadSerializer(serializers.Serializer):
         
         Checks file size, type, and other constraints.
         """
-        # Maximum file size: 50MB
-        max_size = 50 * 1024 * 1024  # 50MB in bytes
-        
-        if value.size > max_size:
+        if value.size > MAX_UPLOAD_SIZE:
             raise serializers.ValidationError(
-                f"File size cannot exceed {max_size // (1024*1024)}MB"
+                f"File size cannot exceed {MAX_UPLOAD_SIZE // (1024*1024)}MB"
             )
         
-        # Check file extension
-        allowed_extensions = {
-            # Images
-            '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg',
-            # Videos
-            '.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv',
-            # Documents
-            '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.txt',
-            # Archives
-            '.zip', '.rar', '.7z', '.tar', '.gz',
-        }
-        
-        file_extension = value.name.lower().split('.')[-1] if '.' in value.name else ''
-        if f'.{file_extension}' not in allowed_extensions:
-            raise serializers.ValidationError(
-                f"File type '.{file_extension}' is not allowed. "
-                f"Allowed types: {', '.join(allowed_extensions)}"
-            )
+        validate_file_extension(value.name)
         
         return value
 
 
+class UploadSessionCreateSerializer(serializers.Serializer):
+    """
+    Serializer for opening a resumable upload session.
+    
+    Applies the same extension rules as FileUploadSerializer, but to the
+    declared file name and size since no bytes have been sent yet.
+    """
+    
+    file_name = serializers.CharField(
+        max_length=255,
+        help_text="Name of the file that will be uploaded"
+    )
+    total_size = serializers.IntegerField(
+        min_value=1,
+        help_text="Size of the complete file in bytes"
+    )
+    mime_type = serializers.CharField(
+        required=False,
+        max_length=100,
+        help_text="MIME type of the file (guessed from the name if omitted)"
+    )
+    description = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        max_length=1000,
+        help_text="Optional description of the file"
+    )
+    is_public = serializers.BooleanField(
+        default=True,
+        help_text="Whether the file should be publicly accessible"
+    )
+    
+    def validate_file_name(self, value):
+        """Check the declared file name against the extension whitelist."""
+        validate_file_extension(value)
+        return value
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """
+    Serializer for upload session state.
+    
+    Lists the received parts so clients can resume an interrupted upload.
+    """
+    
+    total_parts = serializers.ReadOnlyField()
+    received_parts = serializers.SerializerMethodField()
+    file_reference = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'session_id',
+            'file_name',
+            'mime_type',
+            'total_size',
+            'chunk_size',
+            'total_parts',
+            'received_parts',
+            'status',
+            'is_public',
+            'description',
+            'created_at',
+            'expires_at',
+            'file_reference',
+        ]
+        read_only_fields = fields
+    
+    def get_received_parts(self, obj):
+        """Get the numbers of the parts received so far."""
+        return [part.part_number for part in obj.parts.all()]
+    
+    def get_file_reference(self, obj):
+        """Get the reference of the file created by the session, if any."""
+        return str(obj.stored_file.file_reference) if obj.stored_file else None
+
+
 class FileResponseSerializer(serializers.Serializer):
     """
     Serializer for file upload response.
@@ -148,6 +265,8 @@ class FileListSerializer(serializers.ModelSerializer):
     """
     
     uploaded_by_username = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    signed_url = serializers.SerializerMethodField()
     
     class Meta:
         model = StoredFile
@@ -158,11 +277,74 @@ class FileListSerializer(serializers.ModelSerializer):
             'mime_type',
             'storage_location',
             'file_size',
+            'status',
             'uploaded_at',
             'uploaded_by_username',
             'is_public',
+            'thumbnail_url',
+            'signed_url',
         ]
     
     def get_uploaded_by_username(self, obj):
         """Get the username of the user who uploaded the file."""
-        return obj.uploaded_by.username if obj.uploaded_by else None
+        return obj.uploaded_by.get_username() if obj.uploaded_by else None
+    
+    def get_thumbnail_url(self, obj):
+        """Get the URL of a small preview for images."""
+        if not obj.is_image:
+            return None
+        return obj.get_preview_url()
+    
+    def get_signed_url(self, obj):
+        """
+        Get a signed, expiring download URL for private files.
+        
+        Lists only contain files the requester may access, so the URLs
+        can be signed up front instead of checking access per download.
+        """
+        if obj.is_public or obj.status != 'ready':
+            return None
+        url, _ = get_signed_url(obj)
+        return url
+
+
+class BulkFileSerializer(serializers.Serializer):
+    """
+    Serializer for bulk file requests.
+    
+    Carries the references of the files the request applies to.
+    """
+    
+    file_references = serializers.ListField(
+        child=serializers.UUIDField(),
+        min_length=1,
+        max_length=BULK_MAX_FILES,
+        help_text=f"References of the files (at most {BULK_MAX_FILES})"
+    )
+
+
+class BulkFileUpdateSerializer(BulkFileSerializer):
+    """
+    Serializer for bulk metadata updates.
+    
+    Only the metadata fields that are present are changed.
+    """
+    
+    is_public = serializers.BooleanField(
+        required=False,
+        help_text="Whether the files should be publicly accessible"
+    )
+    description = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        max_length=1000,
+        help_text="New description for the files"
+    )
+    
+    def validate(self, attrs):
+        """Require at least one field to update."""
+        if 'is_public' not in attrs and 'description' not in attrs:
+            raise serializers.ValidationError(
+                "Provide is_public and/or description to update"
+            )
+        return attrs
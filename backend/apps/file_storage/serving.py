@@ -0,0 +1,290 @@
+"""
+File Storage Serving
+
+This module contains helpers for serving local file content: strong
+ETags and conditional GET handling, byte-range (206) responses including
+multipart/byteranges, and accelerated serving. When an accelerated
+serving mode is configured, Django only performs the access checks and
+hands the byte transfer to the front proxy (nginx X-Accel-Redirect or an
+X-Sendfile header), so Python workers are not tied up streaming files to
+slow clients.
+"""
+
+import hashlib
+import json
+import uuid
+from urllib.parse import quote
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, StreamingHttpResponse, FileResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_etags
+
+
+# '' (serve from Python), 'nginx' (X-Accel-Redirect) or 'sendfile' (X-Sendfile)
+ACCEL_MODE = getattr(settings, 'FILE_STORAGE_ACCEL_MODE', '')
+
+# Internal nginx location that maps onto MEDIA_ROOT
+ACCEL_REDIRECT_PREFIX = getattr(settings, 'FILE_STORAGE_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+# Requests asking for more ranges than this get the whole file instead
+MAX_RANGES = 16
+
+# Block size used when streaming file ranges
+RANGE_BLOCK_SIZE = 64 * 1024
+
+
+def file_etag(stored_file, modified_time=None):
+    """
+    Build a strong ETag for the content of a stored file.
+
+    Uses the content hash when it is known, otherwise the size and
+    modification time of the file.
+
+    Args:
+        stored_file: StoredFile being served
+        modified_time (datetime, optional): Modification time of the
+            stored object (defaults to the upload time)
+
+    Returns:
+        str: Quoted ETag
+    """
+    if stored_file.content_hash:
+        return f'"{stored_file.content_hash}"'
+    modified_time = modified_time or stored_file.uploaded_at
+    return f'"{stored_file.file_size or 0:x}-{int(modified_time.timestamp()):x}"'
+
+
+def data_etag(data):
+    """Build a strong ETag for a serialized API payload."""
+    payload = json.dumps(data, sort_keys=True, default=str).encode()
+    return f'"{hashlib.sha256(payload).hexdigest()[:40]}"'
+
+
+def conditional_response(request, etag, last_modified=None):
+    """
+    Evaluate If-None-Match / If-Modified-Since (and their If-Match
+    counterparts) against the current validators.
+
+    Returns:
+        HttpResponse: 304 or 412 response, or None if the full response
+                      should be sent
+    """
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def parse_range_header(header, size):
+    """
+    Parse an HTTP Range header into byte ranges.
+
+    Overlapping and adjacent ranges are merged.
+
+    Args:
+        header (str): Value of the Range header
+        size (int): Size of the file in bytes
+
+    Returns:
+        list: Sorted (start, end) tuples with inclusive ends; an empty list
+              if no range can be satisfied, or None if the header is
+              malformed or should be ignored
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(','):
+        start, sep, end = part.strip().partition('-')
+        if not sep:
+            return None
+        try:
+            if not start:
+                # Suffix range: the last N bytes
+                length = int(end)
+                if length == 0:
+                    continue
+                ranges.append((max(size - length, 0), size - 1))
+                continue
+            start = int(start)
+            end = int(end) if end else None
+        except ValueError:
+            return None
+        if end is not None and start > end:
+            return None
+        if start < size:
+            ranges.append((start, size - 1 if end is None else min(end, size - 1)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _read_range(file_obj, start, end):
+    """Yield the bytes from start to end (inclusive) in blocks."""
+    file_obj.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = file_obj.read(min(RANGE_BLOCK_SIZE, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+def _single_range(file_obj, start, end):
+    try:
+        yield from _read_range(file_obj, start, end)
+    finally:
+        file_obj.close()
+
+
+def _multiple_ranges(file_obj, ranges, size, content_type, boundary):
+    try:
+        for start, end in ranges:
+            yield (
+                f"--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode()
+            yield from _read_range(file_obj, start, end)
+            yield b"\r\n"
+        yield f"--{boundary}--\r\n".encode()
+    finally:
+        file_obj.close()
+
+
+def local_file_response(request, stored_file, file_path, storage=None):
+    """
+    Serve a local file with validators, conditional GET and byte ranges.
+
+    Args:
+        request: Incoming request
+        stored_file: StoredFile being served
+        file_path (str): Path of the file in local storage
+        storage (Storage, optional): Storage holding the file; defaults
+            to default_storage, the only storage the front proxy can see
+
+    Returns:
+        HttpResponse: 200, 206, 304, 412 or 416 response
+    """
+    if storage is None:
+        storage = default_storage
+
+    try:
+        modified_time = storage.get_modified_time(file_path)
+    except (NotImplementedError, OSError):
+        modified_time = stored_file.uploaded_at
+    etag = file_etag(stored_file, modified_time)
+
+    not_modified = conditional_response(request, etag, modified_time)
+    if not_modified is not None:
+        return not_modified
+
+    # Let the front proxy send the bytes (and handle ranges) when configured to
+    if storage is default_storage:
+        response = accel_file_response(stored_file, file_path)
+        if response is not None:
+            return with_file_headers(response, stored_file, etag, modified_time)
+
+    size = stored_file.file_size
+    if size is None:
+        size = storage.size(file_path)
+
+    ranges = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and if_range_matches(request, etag, modified_time):
+        ranges = parse_range_header(range_header, size)
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return with_file_headers(response, stored_file, etag, modified_time)
+
+    file_obj = storage.open(file_path)
+
+    if not ranges:
+        response = FileResponse(file_obj, content_type=stored_file.mime_type)
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            _single_range(file_obj, start, end),
+            status=206,
+            content_type=stored_file.mime_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        boundary = uuid.uuid4().hex
+        response = StreamingHttpResponse(
+            _multiple_ranges(file_obj, ranges, size, stored_file.mime_type, boundary),
+            status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}',
+        )
+
+    return with_file_headers(response, stored_file, etag, modified_time)
+
+
+def if_range_matches(request, etag, modified_time):
+    """Check whether an If-Range precondition allows a partial response."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        # Only strong validators may be used with If-Range
+        return etag in parse_etags(if_range) and not if_range.startswith('W/')
+    return if_range == http_date(modified_time.timestamp())
+
+
+def with_file_headers(response, stored_file, etag, modified_time):
+    """Attach validators and caching headers to a file response."""
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified_time.timestamp())
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = content_disposition_header(False, stored_file.file_name)
+    if not stored_file.is_public:
+        patch_cache_control(response, private=True)
+    return response
+
+
+def accel_file_response(stored_file, file_path):
+    """
+    Build a response that lets the front proxy send a local file.
+
+    Args:
+        stored_file: StoredFile being served
+        file_path (str): Path of the file in local storage
+
+    Returns:
+        HttpResponse: Empty response carrying the proxy header, or None
+                      if accelerated serving is disabled or unavailable
+                      for the configured storage
+    """
+    if ACCEL_MODE not in ('nginx', 'sendfile'):
+        return None
+
+    try:
+        path = default_storage.path(file_path)
+    except NotImplementedError:
+        # Remote storages have no filesystem path the proxy could read
+        return None
+
+    if ACCEL_MODE == 'nginx':
+        header, value = 'X-Accel-Redirect', ACCEL_REDIRECT_PREFIX + quote(file_path)
+    else:
+        header, value = 'X-Sendfile', path
+
+    response = HttpResponse(content_type=stored_file.mime_type)
+    response[header] = value
+    response['Content-Disposition'] = content_disposition_header(False, stored_file.file_name)
+    return response
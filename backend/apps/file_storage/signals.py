@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import StoredFile
+from .quotas import is_released_in_bulk, release_quota
+from .stats import invalidate_file_stats
+
+
+@receiver(post_save, sender=StoredFile)
+def stored_file_saved(sender, instance, created, **kwargs):
+    """Invalidate cached statistics when a file is added or changed"""
+    invalidate_file_stats()
+
+
+@receiver(post_delete, sender=StoredFile)
+def stored_file_deleted(sender, instance, **kwargs):
+    """Invalidate cached statistics and give quota back when a file is removed"""
+    invalidate_file_stats()
+    if instance.uploaded_by_id and not is_released_in_bulk(instance):
+        release_quota(instance.uploaded_by_id, instance.file_size or 0)
@@ -0,0 +1,152 @@
+"""
+File Storage Signed URLs
+
+This module issues signed, expiring download URLs for stored files so
+private content can be fetched without a database lookup or permission
+check per request. Access is checked once, when the URL is issued.
+
+Cloudinary and S3 files get the storage's own signed URL (a Cloudinary
+private download URL or a presigned S3 URL). Files in local storage get
+a URL carrying a signed token that describes the file; SignedFileMiddleware
+verifies it statelessly and serves the file before sessions,
+authentication or the ORM are involved (and, with FILE_STORAGE_ACCEL_MODE,
+hands the transfer to the front proxy).
+"""
+
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+
+from .drivers import get_driver
+from .models import StoredFile
+from .serving import local_file_response
+
+
+# How long issued URLs stay valid
+SIGNED_URL_TTL = getattr(settings, 'FILE_STORAGE_SIGNED_URL_TTL', 60 * 60)
+
+# Path under which signed local files are served
+SIGNED_URL_PREFIX = getattr(settings, 'FILE_STORAGE_SIGNED_URL_PREFIX', '/api/files/files/signed/')
+
+SIGNING_SALT = 'apps.file_storage.signed-url'
+
+
+class ExpiredSignedURL(Exception):
+    """Raised when a signed file token is past its expiry time."""
+
+
+def get_signed_url(stored_file, ttl=None):
+    """
+    Build a signed download URL for a stored file.
+
+    The caller is responsible for checking that the requester may access
+    the file; whoever holds the URL can download it until it expires.
+
+    Args:
+        stored_file: StoredFile to sign a URL for (must be ready)
+        ttl (int, optional): Validity in seconds (defaults to
+            FILE_STORAGE_SIGNED_URL_TTL)
+
+    Returns:
+        tuple: (signed URL, expiry Unix timestamp)
+    """
+    expires_at = int(time.time()) + (ttl or SIGNED_URL_TTL)
+    driver = get_driver(stored_file.storage_location)
+    storage_key = driver.get_storage_key(stored_file.file_url)
+
+    url = driver.signed_url(storage_key, stored_file, expires_at)
+    if url is None:
+        url = SIGNED_URL_PREFIX + make_file_token(stored_file, storage_key, expires_at) + '/'
+    return url, expires_at
+
+
+def make_file_token(stored_file, storage_key, expires_at):
+    """
+    Sign everything needed to serve a local file into a URL-safe token.
+
+    Returns:
+        str: Signed token
+    """
+    payload = {
+        'l': stored_file.storage_location,
+        'k': storage_key,
+        'n': stored_file.file_name,
+        'm': stored_file.mime_type,
+        's': stored_file.file_size,
+        'h': stored_file.content_hash,
+        'u': int(stored_file.uploaded_at.timestamp()),
+        'e': expires_at,
+    }
+    return signing.dumps(payload, salt=SIGNING_SALT, compress=True)
+
+
+def load_file_token(token):
+    """
+    Verify a signed file token.
+
+    Returns:
+        dict: Token payload
+
+    Raises:
+        signing.BadSignature: If the token was tampered with
+        ExpiredSignedURL: If the token has expired
+    """
+    payload = signing.loads(token, salt=SIGNING_SALT)
+    if payload['e'] < time.time():
+        raise ExpiredSignedURL()
+    return payload
+
+
+def serve_signed_file(request, token):
+    """
+    Serve a local file described by a signed token.
+
+    No database query is made: the file's metadata comes from the token.
+
+    Returns:
+        HttpResponse: The file response, or 403/404/410
+    """
+    try:
+        payload = load_file_token(token)
+    except ExpiredSignedURL:
+        return HttpResponse('Signed URL has expired', status=410)
+    except signing.BadSignature:
+        return HttpResponseForbidden('Invalid signature')
+
+    driver = get_driver(payload['l'])
+    storage = getattr(driver, 'storage', None)
+    if storage is None or not storage.exists(payload['k']):
+        return HttpResponseNotFound('File not found on storage')
+
+    # Unsaved instance carrying what the serving helpers need
+    stored_file = StoredFile(
+        file_name=payload['n'],
+        mime_type=payload['m'],
+        storage_location=payload['l'],
+        file_size=payload['s'],
+        content_hash=payload['h'],
+        uploaded_at=datetime.fromtimestamp(payload['u'], tz=timezone.utc),
+        is_public=False,
+    )
+    return local_file_response(request, stored_file, payload['k'], storage=storage)
+
+
+class SignedFileMiddleware:
+    """
+    Serve signed local file URLs before the rest of the stack runs.
+
+    Place it above SessionMiddleware so signed downloads skip session and
+    user loading as well as URL resolution and DRF.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(SIGNED_URL_PREFIX):
+            token = request.path[len(SIGNED_URL_PREFIX):].strip('/')
+            if token and '/' not in token:
+                return serve_signed_file(request, token)
+        return self.get_response(request)
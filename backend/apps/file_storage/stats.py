@@ -0,0 +1,76 @@
+"""
+File Storage Statistics
+
+This module computes the storage statistics served by the stats
+endpoint. All counters come from a single conditional-aggregation query
+and the result is cached for a short time; uploads and deletions
+invalidate the cached snapshot.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from .drivers import STORAGE_DRIVERS
+from .models import StoredFile
+
+
+STATS_CACHE_KEY = 'file_storage:stats'
+
+# Seconds a stats snapshot is served from the cache
+STATS_CACHE_TTL = getattr(settings, 'FILE_STORAGE_STATS_CACHE_TTL', 60)
+
+DOCUMENT_MIME_TYPES = [
+    'application/pdf',
+    'application/msword',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'text/plain',
+]
+
+
+def compute_file_stats():
+    """
+    Compute file storage statistics with one aggregate query.
+
+    Returns:
+        dict: Counts by storage driver and file type, and total size
+    """
+    locations = list(dict.fromkeys(['local', 'cloudinary', *STORAGE_DRIVERS]))
+    totals = StoredFile.objects.aggregate(
+        total_files=Count('pk'),
+        **{
+            f'storage_{location}': Count('pk', filter=Q(storage_location=location))
+            for location in locations
+        },
+        images=Count('pk', filter=Q(mime_type__startswith='image/')),
+        videos=Count('pk', filter=Q(mime_type__startswith='video/')),
+        documents=Count('pk', filter=Q(mime_type__in=DOCUMENT_MIME_TYPES)),
+        total_size=Sum('file_size'),
+    )
+
+    return {
+        'total_files': totals['total_files'],
+        'by_storage': {
+            location: totals[f'storage_{location}'] for location in locations
+        },
+        'by_type': {
+            'images': totals['images'],
+            'videos': totals['videos'],
+            'documents': totals['documents'],
+        },
+        'total_size': totals['total_size'] or 0,
+    }
+
+
+def get_file_stats():
+    """Get file storage statistics, served from the cache when possible."""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_file_stats()
+        cache.set(STATS_CACHE_KEY, stats, STATS_CACHE_TTL)
+    return stats
+
+
+def invalidate_file_stats():
+    """Drop the cached statistics snapshot."""
+    cache.delete(STATS_CACHE_KEY)
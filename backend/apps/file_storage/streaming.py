@@ -0,0 +1,86 @@
+"""
+File Storage Streaming
+
+This module contains the streaming upload wrapper used to move uploaded
+files to storage chunk by chunk. Hashing, size checks and MIME sniffing
+all happen while the bytes are being written, so an upload is only ever
+read once and never fully buffered in memory.
+"""
+
+import hashlib
+from django.conf import settings
+from django.core.files.base import File
+
+from .utils import SNIFF_HEADER_SIZE, FileTooLargeError, sniff_mime_type
+
+
+# Size of the chunks read from the upload and handed to the storage backend
+UPLOAD_CHUNK_SIZE = getattr(settings, 'FILE_STORAGE_UPLOAD_CHUNK_SIZE', 64 * 1024)
+
+
+class StreamingUpload(File):
+    """
+    Wrap a Django UploadedFile so every byte read from it is hashed,
+    counted and checked against the size limit exactly once.
+
+    Storage backends consume the upload either through ``chunks()``
+    (FileSystemStorage) or ``read()`` (Cloudinary chunked uploads); both
+    paths feed the same digest. Seeking back to the start resets the
+    digest so a backend that rewinds the stream still ends up with the
+    right hash.
+    """
+
+    def __init__(self, file, max_size=None, chunk_size=None):
+        super().__init__(file, name=file.name)
+        self.max_size = max_size
+        self.chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+        self._reset()
+
+    def _reset(self):
+        self._hasher = hashlib.sha256()
+        self._header = b''
+        self.bytes_read = 0
+
+    def _consume(self, data):
+        """Account for a block of data read from the underlying file."""
+        if len(self._header) < SNIFF_HEADER_SIZE:
+            self._header += data[:SNIFF_HEADER_SIZE - len(self._header)]
+
+        self._hasher.update(data)
+        self.bytes_read += len(data)
+
+        if self.max_size is not None and self.bytes_read > self.max_size:
+            raise FileTooLargeError(
+                f"File size cannot exceed {self.max_size // (1024 * 1024)}MB"
+            )
+        return data
+
+    def read(self, size=-1):
+        return self._consume(self.file.read(size))
+
+    def seek(self, offset, whence=0):
+        if offset == 0 and whence == 0:
+            self._reset()
+        return self.file.seek(offset, whence)
+
+    def chunks(self, chunk_size=None):
+        self.seek(0)
+        while True:
+            data = self.file.read(chunk_size or self.chunk_size)
+            if not data:
+                break
+            yield self._consume(data)
+
+    def __iter__(self):
+        # Line iteration is never what a storage backend wants here
+        return self.chunks()
+
+    @property
+    def sha256(self):
+        """Hex digest of every byte read so far."""
+        return self._hasher.hexdigest()
+
+    @property
+    def sniffed_mime_type(self):
+        """MIME type detected from the file header, or None if unknown."""
+        return sniff_mime_type(self._header)
@@ -0,0 +1,80 @@
+"""
+Shared helpers for the file storage tests.
+"""
+
+import tempfile
+from contextlib import contextmanager
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+import cloudinary
+
+from apps.file_storage.backends import CloudinaryBackend
+from apps.file_storage.blobs import create_stored_file
+from apps.file_storage.fake_cloudinary import FakeCloudinaryServer
+from apps.file_storage.gateway import CloudinaryGateway
+from apps.file_storage.models import StoredBlob, StoredFile
+from apps.file_storage.streaming import StreamingUpload
+
+CLOUDINARY_OPTIONS = ('upload_prefix', 'cloud_name', 'api_key', 'api_secret')
+
+
+def create_user(email='user@example.com', **fields):
+    return get_user_model().objects.create_user(email=email, password='password', **fields)
+
+
+def make_upload(data, name='file.pdf', content_type='application/pdf', max_size=None):
+    """Wrap bytes the way the upload views do."""
+    return StreamingUpload(
+        SimpleUploadedFile(name, data, content_type=content_type),
+        max_size=max_size,
+    )
+
+
+@contextmanager
+def fake_cloudinary(gateway=None):
+    """
+    Point the Cloudinary SDK at a FakeCloudinaryServer.
+
+    The 'cloudinary' driver goes through the real CloudinaryBackend (SDK,
+    gateway) whatever FILE_STORAGE_CLOUDINARY_BACKEND is set to. Unless a
+    gateway is passed, requests are not retried, so a failure can't be
+    hidden by a retry.
+    """
+    gateway = gateway or CloudinaryGateway(max_attempts=1)
+    config = cloudinary.config()
+    saved = {option: getattr(config, option, None) for option in CLOUDINARY_OPTIONS}
+    with FakeCloudinaryServer() as server, mock.patch(
+        'apps.file_storage.drivers.get_cloudinary_backend', return_value=CloudinaryBackend()
+    ), mock.patch('apps.file_storage.utils.get_gateway', return_value=gateway):
+        cloudinary.config(upload_prefix=server.url, cloud_name='test', api_key='key', api_secret='secret')
+        try:
+            yield server
+        finally:
+            cloudinary.config(**saved)
+
+
+@contextmanager
+def temporary_staging():
+    """Keep upload session parts and staged uploads in a temporary directory."""
+    with tempfile.TemporaryDirectory() as directory:
+        storage = FileSystemStorage(location=directory)
+        with mock.patch('apps.file_storage.upload_sessions.staging_storage', storage), \
+                mock.patch('apps.file_storage.blobs.staging_storage', storage), \
+                mock.patch('apps.file_storage.background.staging_storage', storage):
+            yield storage
+
+
+@contextmanager
+def failing_transfer():
+    """Fail the transfer of an upload's blob right after the view creates its file."""
+    def create_failed_file(blob, **fields):
+        stored_file = create_stored_file(blob, **fields)
+        StoredBlob.objects.filter(pk=blob.pk).update(status='failed')
+        StoredFile.objects.filter(pk=stored_file.pk).update(status='failed')
+        stored_file.status = 'failed'
+        return stored_file
+
+    with mock.patch('apps.file_storage.views.create_stored_file', create_failed_file):
+        yield
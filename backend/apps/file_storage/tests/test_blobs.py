@@ -0,0 +1,217 @@
+"""
+Tests for content-addressed storage (blobs.py).
+"""
+
+import hashlib
+from unittest import mock
+from django.test import TestCase
+
+from apps.file_storage.background import upload_pending_blob
+from apps.file_storage.blobs import create_stored_file, delete_stored_file, store_upload
+from apps.file_storage.drivers import get_driver
+from apps.file_storage.models import StoredBlob
+from apps.file_storage.streaming import StreamingUpload
+from apps.file_storage.utils import FileTypeMismatchError
+
+from .helpers import create_user, fake_cloudinary, make_upload, temporary_staging
+
+PDF = b'%PDF-1.4\n' + b'x' * 200_000
+
+
+class StoreUploadTests(TestCase):
+    """Identical content is stored once and shared by reference."""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def store(self, data, storage_location='memory', **kwargs):
+        upload = make_upload(data, **kwargs)
+        blob = store_upload(upload, 'application/pdf', storage_location)
+        return create_stored_file(
+            blob, file_name='file.pdf', mime_type='application/pdf', uploaded_by=self.user
+        )
+
+    def test_duplicate_content_shares_blob(self):
+        first = self.store(PDF)
+        second = self.store(PDF)
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+        self.assertEqual(first.content_hash, hashlib.sha256(PDF).hexdigest())
+        self.assertEqual(first.file_size, len(PDF))
+
+    def test_last_reference_deletes_content(self):
+        first = self.store(PDF)
+        second = self.store(PDF)
+        storage = get_driver('memory').storage
+        storage_key = first.blob.storage_key
+
+        delete_stored_file(first)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertTrue(storage.exists(storage_key))
+
+        delete_stored_file(second)
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(storage.exists(storage_key))
+
+    def test_mismatched_content_is_rejected(self):
+        upload = make_upload(b'\x89PNG\r\n\x1a\n' + b'x' * 100)
+        with self.assertRaises(FileTypeMismatchError):
+            store_upload(upload, 'application/pdf', 'memory')
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_mp4_audio_is_accepted(self):
+        # M4A files often carry a generic ISO brand that sniffs as video/mp4
+        data = b'\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isommp41' + b'x' * 100
+        blob = store_upload(make_upload(data, 'song.m4a', 'audio/mp4'), 'audio/mp4', 'memory')
+        self.assertEqual(blob.file_size, len(data))
+
+    def test_remote_upload_sends_content(self):
+        with fake_cloudinary() as server:
+            stored_file = self.store(PDF, storage_location='cloudinary')
+
+            self.assertEqual(stored_file.status, 'ready')
+            asset = server.assets[stored_file.blob.storage_key]
+            self.assertEqual(asset['content'], PDF)
+            self.assertEqual(stored_file.file_size, len(PDF))
+
+    def test_remote_duplicate_skips_transfer(self):
+        with fake_cloudinary() as server:
+            first = self.store(PDF, storage_location='cloudinary')
+            requests = len(server.requests)
+            second = self.store(PDF, storage_location='cloudinary')
+
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(len(server.requests), requests)
+
+    def test_remote_upload_of_start_or_end_seekable_file(self):
+        # Upload sessions hand store_upload a PartsReader, which can only
+        # seek to its start or end
+        upload = StreamingUpload(_BytesReader(PDF), max_size=len(PDF))
+        with fake_cloudinary() as server:
+            blob = store_upload(upload, 'application/pdf', 'cloudinary')
+            self.assertEqual(server.assets[blob.storage_key]['content'], PDF)
+
+
+@mock.patch('apps.file_storage.blobs.CLOUDINARY_UPLOAD_MODE', 'background')
+@mock.patch('apps.file_storage.blobs.enqueue_blob_upload')
+class BackgroundUploadTests(TestCase):
+    """In background mode remote content is staged and uploaded by a worker."""
+
+    def setUp(self):
+        self.staging = self.enterContext(temporary_staging())
+        self.server = self.enterContext(fake_cloudinary())
+        self.user = create_user()
+
+    def store(self, data=PDF):
+        blob = store_upload(make_upload(data), 'application/pdf', 'cloudinary')
+        return create_stored_file(
+            blob, file_name='file.pdf', mime_type='application/pdf', uploaded_by=self.user
+        )
+
+    def test_upload_is_staged(self, enqueue_blob_upload):
+        stored_file = self.store()
+        self.assertEqual(stored_file.status, 'pending')
+        self.assertEqual(self.server.assets, {})
+        with self.staging.open(stored_file.blob.storage_key) as staged:
+            self.assertEqual(staged.read(), PDF)
+        enqueue_blob_upload.assert_called_once_with(stored_file.blob_id)
+
+    def test_worker_uploads_blob(self, enqueue_blob_upload):
+        stored_file = self.store()
+        staged_path = stored_file.blob.storage_key
+        self.assertTrue(upload_pending_blob(stored_file.blob_id))
+
+        stored_file.refresh_from_db()
+        blob = stored_file.blob
+        self.assertEqual((blob.status, stored_file.status), ('ready', 'ready'))
+        self.assertEqual(stored_file.file_url, blob.file_url)
+        self.assertEqual(self.server.assets[blob.storage_key]['content'], PDF)
+        self.assertFalse(self.staging.exists(staged_path))
+
+    def test_failed_upload_marks_files_failed(self, enqueue_blob_upload):
+        stored_file = self.store()
+        self.server.fail_next(1, status=400, message='Invalid file')
+        self.assertFalse(upload_pending_blob(stored_file.blob_id))
+
+        stored_file.refresh_from_db()
+        self.assertEqual((stored_file.blob.status, stored_file.status), ('failed', 'failed'))
+
+    def test_reupload_after_failure_takes_over_blob(self, enqueue_blob_upload):
+        first = self.store()
+        failed_path = first.blob.storage_key
+        self.server.fail_next(1, status=400, message='Invalid file')
+        upload_pending_blob(first.blob_id)
+
+        second = self.store()
+        self.assertEqual(second.blob_id, first.blob_id)
+        self.assertEqual(second.status, 'pending')
+        blob = second.blob
+        self.assertEqual((blob.status, blob.ref_count), ('pending', 2))
+        self.assertNotEqual(blob.storage_key, failed_path)
+        self.assertFalse(self.staging.exists(failed_path))
+        self.assertEqual(enqueue_blob_upload.call_count, 2)
+
+        # The earlier file comes back with it
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'pending')
+        self.assertTrue(upload_pending_blob(blob.pk))
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'ready')
+
+    def test_sync_reupload_after_failure(self, enqueue_blob_upload):
+        first = self.store()
+        self.server.fail_next(1, status=400, message='Invalid file')
+        upload_pending_blob(first.blob_id)
+
+        with mock.patch('apps.file_storage.blobs.CLOUDINARY_UPLOAD_MODE', 'sync'):
+            second = self.store()
+        self.assertEqual(second.blob_id, first.blob_id)
+        self.assertEqual(second.status, 'ready')
+        self.assertEqual(self.server.assets[second.blob.storage_key]['content'], PDF)
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.file_url), ('ready', second.file_url))
+
+    def test_pending_duplicate_shares_blob(self, enqueue_blob_upload):
+        first = self.store()
+        second = self.store()
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(second.status, 'pending')
+        enqueue_blob_upload.assert_called_once()
+
+
+class _BytesReader:
+    """File object that, like PartsReader, only seeks to its start or end."""
+
+    def __init__(self, data, name='file.pdf'):
+        self.name = name
+        self.size = len(data)
+        self.closed = False
+        self._data = data
+        self._position = 0
+
+    def read(self, size=-1):
+        end = len(self._data) if size is None or size < 0 else self._position + size
+        data = self._data[self._position:end]
+        self._position += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        if (offset, whence) == (0, 0):
+            self._position = 0
+        elif (offset, whence) == (0, 2):
+            self._position = len(self._data)
+        else:
+            raise OSError("Only seeking to the start or end is supported")
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
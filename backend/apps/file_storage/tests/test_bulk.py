@@ -0,0 +1,93 @@
+"""
+Tests for the bulk delete and update endpoints.
+"""
+
+import uuid
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.file_storage.blobs import create_stored_file, store_upload
+from apps.file_storage.drivers import get_driver
+from apps.file_storage.models import StoredBlob, StoredFile
+
+from .helpers import create_user, make_upload
+
+
+class BulkFileTests(TestCase):
+    """Many files are deleted or updated in one request."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.other = create_user('other@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def store(self, data, user=None):
+        blob = store_upload(make_upload(b'%PDF-' + data), 'application/pdf', 'memory')
+        return create_stored_file(
+            blob, file_name='file.pdf', mime_type='application/pdf',
+            uploaded_by=user or self.user,
+        )
+
+    def references(self, files):
+        return [str(stored_file.file_reference) for stored_file in files]
+
+    def test_bulk_delete(self):
+        files = [self.store(b'a'), self.store(b'b'), self.store(b'a')]
+        keep = self.store(b'c')
+        missing = str(uuid.uuid4())
+        storage = get_driver('memory').storage
+        storage_keys = {stored_file.blob.storage_key for stored_file in files}
+
+        response = self.client.post('/api/files/files/bulk/delete/', {
+            'file_references': self.references(files) + [missing],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(sorted(response.json()['deleted']), sorted(self.references(files)))
+        self.assertEqual(response.json()['not_found'], [missing])
+        self.assertEqual(list(StoredFile.objects.all()), [keep])
+        self.assertEqual(list(StoredBlob.objects.all()), [keep.blob])
+        for storage_key in storage_keys:
+            self.assertFalse(storage.exists(storage_key))
+
+    def test_bulk_delete_keeps_shared_content(self):
+        mine = self.store(b'a')
+        theirs = self.store(b'a', user=self.other)
+        self.client.post('/api/files/files/bulk/delete/', {
+            'file_references': self.references([mine]),
+        }, format='json')
+        theirs.blob.refresh_from_db()
+        self.assertEqual(theirs.blob.ref_count, 1)
+        self.assertTrue(get_driver('memory').storage.exists(theirs.blob.storage_key))
+
+    def test_bulk_delete_of_others_files_is_refused(self):
+        files = [self.store(b'a'), self.store(b'b', user=self.other)]
+        response = self.client.post('/api/files/files/bulk/delete/', {
+            'file_references': self.references(files),
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['errors'], self.references(files[1:]))
+        self.assertEqual(StoredFile.objects.count(), 2)
+
+    def test_bulk_update(self):
+        files = [self.store(b'a'), self.store(b'b')]
+        response = self.client.patch('/api/files/files/bulk/update/', {
+            'file_references': self.references(files),
+            'is_public': False,
+            'description': 'Private',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            set(StoredFile.objects.values_list('is_public', 'description')),
+            {(False, 'Private')},
+        )
+
+    def test_bulk_update_of_others_files_is_refused(self):
+        files = [self.store(b'a'), self.store(b'b', user=self.other)]
+        response = self.client.patch('/api/files/files/bulk/update/', {
+            'file_references': self.references(files),
+            'is_public': False,
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(StoredFile.objects.filter(is_public=False).exists())
@@ -0,0 +1,128 @@
+"""
+Tests for the storage driver registry and routing (drivers.py).
+"""
+
+import time
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlsplit
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from apps.file_storage.drivers import CloudinaryDriver, MemoryDriver, S3Driver, get_driver
+from apps.file_storage.utils import determine_storage_location
+
+from .helpers import fake_cloudinary
+
+ROUTES = [
+    {'mime_types': ['video/'], 'min_size': 1000, 'driver': 's3'},
+    {'mime_types': ['image/', 'video/'], 'driver': 'cloudinary'},
+    {'mime_types': ['application/pdf'], 'max_size': 100, 'driver': 'memory'},
+    {'driver': 'local'},
+]
+
+
+class DriverRegistryTests(SimpleTestCase):
+    """Drivers are looked up by name from FILE_STORAGE_DRIVERS."""
+
+    def test_lookup(self):
+        driver = get_driver('memory')
+        self.assertIsInstance(driver, MemoryDriver)
+        self.assertIs(get_driver('memory'), driver)
+        self.assertIsInstance(get_driver('cloudinary'), CloudinaryDriver)
+
+    def test_unknown_driver(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_driver('missing')
+
+    def test_flags(self):
+        self.assertFalse(get_driver('memory').remote)
+        self.assertFalse(get_driver('memory').serves_redirect)
+        self.assertTrue(get_driver('cloudinary').remote)
+        self.assertTrue(get_driver('cloudinary').serves_redirect)
+
+    @mock.patch('apps.file_storage.utils.STORAGE_ROUTES', ROUTES)
+    def test_routing(self):
+        for mime_type, size, expected in [
+            ('video/mp4', 5000, 's3'),
+            ('video/mp4', 500, 'cloudinary'),
+            # Size rules don't match while the size is unknown
+            ('video/mp4', None, 'cloudinary'),
+            ('image/png', 5000, 'cloudinary'),
+            ('application/pdf', 100, 'memory'),
+            ('application/pdf', 101, 'local'),
+            ('text/plain', 10, 'local'),
+        ]:
+            with self.subTest(mime_type=mime_type, size=size):
+                self.assertEqual(determine_storage_location(mime_type, size), expected)
+
+
+class DjangoStorageDriverTests(SimpleTestCase):
+    """Drivers backed by a Django storage write, open and delete content."""
+
+    def setUp(self):
+        self.driver = MemoryDriver('memory')
+
+    def test_round_trip(self):
+        stored = self.driver.write(ContentFile(b'content', name='file.txt'))
+        self.assertTrue(stored['storage_key'].startswith('uploads/'))
+        self.assertEqual(self.driver.get_storage_key(stored['file_url']), stored['storage_key'])
+        with self.driver.open(stored['storage_key']) as stored_file:
+            self.assertEqual(stored_file.read(), b'content')
+        self.assertIn(stored['storage_key'], dict(self.driver.list_objects()))
+
+        self.assertTrue(self.driver.delete(stored['storage_key']))
+        self.assertFalse(self.driver.delete(stored['storage_key']))
+
+    def test_delete_many(self):
+        keys = [self.driver.write(ContentFile(b'x', name='f.txt'))['storage_key'] for _ in range(3)]
+        self.assertEqual(self.driver.delete_many(keys + ['uploads/missing.txt']), set(keys))
+
+    def test_delete_failure_is_logged(self):
+        stored = self.driver.write(ContentFile(b'content', name='file.txt'))
+        with mock.patch.object(self.driver.storage, 'delete', side_effect=OSError('disk error')), \
+                self.assertLogs('apps.file_storage.drivers', 'ERROR') as logs:
+            self.assertFalse(self.driver.delete(stored['storage_key']))
+        self.assertIn(stored['storage_key'], logs.output[0])
+        self.assertIn('disk error', logs.output[0])
+
+
+@skipUnless(find_spec('storages') and find_spec('boto3'), 'requires django-storages and boto3')
+class S3DriverTests(SimpleTestCase):
+    """Signed URLs are presigned whatever the storage's URL settings."""
+
+    def test_signed_url(self):
+        driver = S3Driver(
+            's3', bucket_name='media', region_name='us-east-1',
+            access_key='key', secret_key='secret',
+            querystring_auth=False, custom_domain='media.example.com',
+        )
+        url = driver.signed_url('videos/sermon.mp4', None, time.time() + 600)
+
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        self.assertTrue(parts.path.endswith('/videos/sermon.mp4'))
+        self.assertTrue({'X-Amz-Signature', 'Signature'} & query.keys(), url)
+        if 'X-Amz-Expires' in query:
+            self.assertAlmostEqual(int(query['X-Amz-Expires'][0]), 600, delta=1)
+        else:
+            self.assertAlmostEqual(int(query['Expires'][0]), time.time() + 600, delta=5)
+
+
+class CloudinaryDriverTests(SimpleTestCase):
+    """The Cloudinary driver goes through the SDK and the gateway."""
+
+    def test_round_trip(self):
+        driver = CloudinaryDriver('cloudinary')
+        with fake_cloudinary() as server:
+            keys = [
+                driver.write(ContentFile(b'content %d' % number, name='file.txt'))['storage_key']
+                for number in range(3)
+            ]
+            self.assertEqual(server.assets[keys[0]]['content'], b'content 0')
+            self.assertEqual(sorted(key for key, _ in driver.list_objects()), sorted(keys))
+
+            self.assertEqual(driver.delete_many(keys[:2]), set(keys[:2]))
+            self.assertTrue(driver.delete(keys[2]))
+            self.assertEqual(server.assets, {})
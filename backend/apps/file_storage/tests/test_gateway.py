@@ -0,0 +1,130 @@
+"""
+Tests for the Cloudinary gateway (gateway.py).
+"""
+
+import threading
+import time
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+import cloudinary.exceptions
+
+from apps.file_storage.gateway import CloudinaryGateway, RetryableStatus
+from apps.file_storage.utils import upload_to_cloudinary
+
+from .helpers import fake_cloudinary
+
+DATA = b'%PDF-1.4\n' + b'x' * 100_000
+
+
+class GatewayRetryTests(SimpleTestCase):
+    """Rate-limited and transient failures are retried with backoff."""
+
+    def setUp(self):
+        self.gateway = CloudinaryGateway(max_attempts=3, backoff_base=0)
+
+    def upload(self):
+        return upload_to_cloudinary(SimpleUploadedFile('file.pdf', DATA))
+
+    def test_rate_limited_upload_is_retried(self):
+        with fake_cloudinary(self.gateway) as server:
+            server.fail_next(2, status=420)
+            result = self.upload()
+            self.assertEqual(server.assets[result['public_id']]['content'], DATA)
+
+        metrics = self.gateway.metrics()['upload']
+        self.assertEqual(metrics['calls'], 3)
+        self.assertEqual(metrics['retries'], 2)
+        self.assertEqual(metrics['rate_limited'], 2)
+
+    def test_server_error_is_retried(self):
+        with fake_cloudinary(self.gateway) as server:
+            server.fail_next(1, status=500, message='Internal error')
+            result = self.upload()
+            self.assertEqual(server.assets[result['public_id']]['content'], DATA)
+        self.assertEqual(self.gateway.metrics()['upload']['retries'], 1)
+
+    def test_gives_up_after_max_attempts(self):
+        with fake_cloudinary(self.gateway) as server:
+            server.fail_next(3, status=420)
+            with self.assertRaises(Exception):
+                self.upload()
+            self.assertEqual(server.assets, {})
+
+        metrics = self.gateway.metrics()['upload']
+        self.assertEqual(metrics['calls'], 3)
+        self.assertEqual(metrics['errors'], 3)
+
+    def test_client_error_is_not_retried(self):
+        with fake_cloudinary(self.gateway) as server:
+            server.fail_next(1, status=400, message='Invalid file')
+            with self.assertRaises(Exception):
+                self.upload()
+
+        metrics = self.gateway.metrics()['upload']
+        self.assertEqual(metrics['calls'], 1)
+        self.assertEqual(metrics['retries'], 0)
+
+    def test_rewinds_before_retry(self):
+        calls = []
+
+        def func():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                raise RetryableStatus(503)
+            return 'done'
+
+        rewind = mock.Mock()
+        self.assertEqual(self.gateway.call('op', func, rewind=rewind), 'done')
+        rewind.assert_called_once_with()
+
+
+class GatewayBackoffTests(SimpleTestCase):
+    """Retries wait a random delay below an exponentially growing cap."""
+
+    def test_full_jitter_bounds(self):
+        gateway = CloudinaryGateway(backoff_base=0.5, backoff_cap=10)
+        with mock.patch('apps.file_storage.gateway.random.uniform', side_effect=lambda low, high: (low, high)):
+            self.assertEqual(gateway.backoff(1), (0, 1.0))
+            self.assertEqual(gateway.backoff(3), (0, 4.0))
+            self.assertEqual(gateway.backoff(10), (0, 10))
+
+    def test_sleeps_between_attempts(self):
+        gateway = CloudinaryGateway(max_attempts=4, backoff_base=0.5, backoff_cap=10)
+        func = mock.Mock(side_effect=[
+            cloudinary.exceptions.RateLimited('Rate Limit Exceeded'),
+            cloudinary.exceptions.RateLimited('Rate Limit Exceeded'),
+            'done',
+        ])
+        with mock.patch('apps.file_storage.gateway.random.uniform', side_effect=lambda low, high: high), \
+                mock.patch('apps.file_storage.gateway.time.sleep') as sleep:
+            self.assertEqual(gateway.call('op', func), 'done')
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1.0, 2.0])
+
+
+class GatewayConcurrencyTests(SimpleTestCase):
+    """No more than max_concurrency requests run at once."""
+
+    def test_concurrency_cap(self):
+        gateway = CloudinaryGateway(max_concurrency=2)
+        lock = threading.Lock()
+        running = 0
+        peak = 0
+
+        def request():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+
+        threads = [threading.Thread(target=gateway.call, args=('op', request)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(gateway.metrics()['op']['calls'], 6)
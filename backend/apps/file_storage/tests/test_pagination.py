@@ -0,0 +1,89 @@
+"""
+Tests for keyset pagination of file lists (pagination.py).
+"""
+
+import json
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.file_storage.models import StoredFile
+from apps.file_storage.pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+from .helpers import create_user
+
+
+class FileListPaginationTests(TestCase):
+    """Users page through their files newest first with opaque cursors."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        now = timezone.now()
+        for number in range(7):
+            stored_file = self.create_file(self.user, number)
+            # Files 2-4 share a timestamp, so file_id breaks the tie
+            uploaded_at = now - timedelta(minutes=min(number, 2) if number <= 4 else number)
+            StoredFile.objects.filter(pk=stored_file.pk).update(uploaded_at=uploaded_at)
+        self.create_file(create_user('other@example.com'), 99)
+
+        self.expected = [
+            str(reference) for reference in StoredFile.objects.filter(
+                uploaded_by=self.user
+            ).order_by('-uploaded_at', '-file_id').values_list('file_reference', flat=True)
+        ]
+
+    def create_file(self, user, number):
+        return StoredFile.objects.create(
+            file_name=f'file-{number}.pdf', mime_type='application/pdf',
+            storage_location='local', file_url=f'/media/file-{number}.pdf',
+            file_size=10, uploaded_by=user,
+        )
+
+    def list(self, **params):
+        response = self.client.get('/api/files/files/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_pages_cover_every_file_once(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'page_size': 3}
+            if cursor:
+                params['cursor'] = cursor
+            page = self.list(**params)
+            seen.extend(item['file_reference'] for item in page['files'])
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                self.assertIsNone(cursor)
+                break
+        self.assertEqual(seen, self.expected)
+
+    def test_page_queries_are_constant(self):
+        first = self.list(page_size=2)
+        # A single keyset query, however deep the page (no COUNT, no OFFSET)
+        with self.assertNumQueries(1):
+            self.client.get('/api/files/files/', {'page_size': 2, 'cursor': first['next_cursor']})
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/files/files/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream(self):
+        response = self.client.get('/api/files/files/', {'stream': 'true'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['file_reference'] for line in lines], self.expected)
+
+    def test_cursor_round_trip(self):
+        stored_file = StoredFile.objects.first()
+        self.assertEqual(
+            decode_cursor(encode_cursor(stored_file)),
+            (stored_file.uploaded_at, stored_file.file_id),
+        )
+        with self.assertRaises(InvalidCursorError):
+            decode_cursor('bm90IGEgY3Vyc29y')
@@ -0,0 +1,95 @@
+"""
+Tests for per-user storage quotas (quotas.py).
+"""
+
+from unittest import mock
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.file_storage.blobs import delete_stored_files
+from apps.file_storage.models import StorageUsage, StoredFile
+from apps.file_storage.quotas import (
+    QuotaExceededError,
+    get_usage,
+    rebuild_usage,
+    release_quota,
+    reserve_quota,
+)
+
+from .helpers import create_user
+
+
+@mock.patch('apps.file_storage.quotas.DEFAULT_USER_QUOTA', 1000)
+class QuotaTests(TestCase):
+    """Uploads reserve their size up front and deletions give it back."""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def usage(self, user=None):
+        usage = get_usage(user or self.user)
+        return usage['bytes_used'], usage['file_count']
+
+    def test_reserve(self):
+        reserve_quota(self.user, 600)
+        reserve_quota(self.user, 400)
+        self.assertEqual(self.usage(), (1000, 2))
+        with self.assertRaises(QuotaExceededError):
+            reserve_quota(self.user, 1)
+        self.assertEqual(self.usage(), (1000, 2))
+
+    def test_per_user_quota(self):
+        StorageUsage.objects.create(user=self.user, quota_bytes=5000)
+        reserve_quota(self.user, 3000)
+        self.assertEqual(get_usage(self.user)['quota_bytes'], 5000)
+        with self.assertRaises(QuotaExceededError):
+            reserve_quota(self.user, 2001)
+
+    def test_release_never_goes_negative(self):
+        reserve_quota(self.user, 100)
+        release_quota(self.user.pk, 500, files=3)
+        self.assertEqual(self.usage(), (0, 0))
+
+    def create_files(self, user, sizes):
+        files = []
+        for size in sizes:
+            reserve_quota(user, size)
+            files.append(StoredFile.objects.create(
+                file_name='file.pdf', mime_type='application/pdf', storage_location='memory',
+                file_url='/media/uploads/missing.pdf', file_size=size, uploaded_by=user,
+            ))
+        return files
+
+    def test_delete_releases_quota(self):
+        stored_file, kept = self.create_files(self.user, [300, 200])
+        stored_file.delete()
+        self.assertEqual(self.usage(), (200, 1))
+
+    def test_bulk_delete_releases_once_per_user(self):
+        other = create_user('other@example.com')
+        files = self.create_files(self.user, [100, 200, 300]) + self.create_files(other, [50, 70])
+        kept = self.create_files(self.user, [10])
+
+        with mock.patch('apps.file_storage.blobs.delete_stored_objects'), \
+                CaptureQueriesContext(connection) as queries:
+            delete_stored_files(files)
+
+        updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "storage_usage"')
+        ]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.usage(), (10, 1))
+        self.assertEqual(self.usage(other), (0, 0))
+        self.assertEqual(list(StoredFile.objects.all()), kept)
+
+        # Later single deletions release their own quota again
+        kept[0].delete()
+        self.assertEqual(self.usage(), (0, 0))
+
+    def test_rebuild_usage(self):
+        self.create_files(self.user, [100, 200])
+        StorageUsage.objects.filter(user=self.user).update(bytes_used=999, file_count=9)
+        self.assertEqual(rebuild_usage(), 1)
+        self.assertEqual(self.usage(), (300, 2))
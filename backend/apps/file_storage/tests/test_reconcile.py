@@ -0,0 +1,80 @@
+"""
+Tests for the reconcile_files management command.
+"""
+
+import io
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from apps.file_storage.blobs import create_stored_file, store_upload
+from apps.file_storage.drivers import get_driver
+from apps.file_storage.models import FileRendition, StoredBlob, StoredFile
+
+from .helpers import make_upload
+
+
+class ReconcileFilesTests(TestCase):
+    """Storage objects without rows are deleted, rows without objects reported."""
+
+    def setUp(self):
+        self.driver = get_driver('memory')
+        self.storage = self.driver.storage
+        blob = store_upload(make_upload(b'%PDF-kept'), 'application/pdf', 'memory')
+        self.stored_file = create_stored_file(blob, file_name='kept.pdf', mime_type='application/pdf')
+        self.orphan = self.driver.write(ContentFile(b'orphan', name='orphan.txt'))['storage_key']
+
+    def reconcile(self, *args):
+        output = io.StringIO()
+        call_command('reconcile_files', '--driver', 'memory', *args, stdout=output)
+        return output.getvalue()
+
+    def test_orphans_are_deleted(self):
+        self.reconcile('--min-age-hours', '0')
+        self.assertFalse(self.storage.exists(self.orphan))
+        self.assertTrue(self.storage.exists(self.stored_file.blob.storage_key))
+
+    def test_recent_orphans_are_kept(self):
+        # An upload may still be creating its row
+        self.reconcile()
+        self.assertTrue(self.storage.exists(self.orphan))
+
+    def test_dry_run(self):
+        output = self.reconcile('--min-age-hours', '0', '--dry-run', '--verbosity', '2')
+        self.assertIn(f'orphan: {self.orphan}', output)
+        self.assertTrue(self.storage.exists(self.orphan))
+
+    def test_referenced_renditions_and_legacy_files_are_kept(self):
+        rendition = self.driver.write(ContentFile(b'webp', name='rendition.webp'))
+        FileRendition.objects.create(
+            blob=self.stored_file.blob, width=200, height=100, format='webp',
+            storage_location='memory', storage_key=rendition['storage_key'],
+            file_url=rendition['file_url'], file_size=4,
+        )
+        legacy = self.driver.write(ContentFile(b'legacy', name='legacy.pdf'))
+        StoredFile.objects.create(
+            file_name='legacy.pdf', mime_type='application/pdf', storage_location='memory',
+            file_url=legacy['file_url'], file_size=6,
+        )
+        self.reconcile('--min-age-hours', '0')
+        self.assertTrue(self.storage.exists(rendition['storage_key']))
+        self.assertTrue(self.storage.exists(legacy['storage_key']))
+        self.assertFalse(self.storage.exists(self.orphan))
+
+    def test_missing_content_is_reported(self):
+        self.storage.delete(self.stored_file.blob.storage_key)
+        output = self.reconcile('--verbosity', '2')
+        self.assertIn(f'missing: {self.stored_file.blob.storage_key}', output)
+        self.stored_file.refresh_from_db()
+        self.assertEqual(self.stored_file.status, 'ready')
+
+    def test_mark_missing(self):
+        self.storage.delete(self.stored_file.blob.storage_key)
+        self.reconcile('--mark-missing')
+        self.stored_file.refresh_from_db()
+        self.assertEqual(self.stored_file.status, 'failed')
+        self.assertEqual(StoredBlob.objects.get().status, 'failed')
+
+    def test_unknown_driver(self):
+        with self.assertRaises(CommandError):
+            call_command('reconcile_files', '--driver', 'missing', stdout=io.StringIO())
@@ -0,0 +1,139 @@
+"""
+Tests for image rendition derivation (renditions.py).
+"""
+
+import io
+from unittest import mock
+from django.test import TestCase
+from PIL import Image
+
+from apps.file_storage.blobs import delete_blob_content, release_blob, store_upload
+from apps.file_storage.drivers import get_driver
+from apps.file_storage.models import FileRendition, StoredBlob
+from apps.file_storage.renditions import create_renditions
+
+from .helpers import fake_cloudinary, make_upload
+
+
+def image_bytes(width, height, image_format='PNG', orientation=None):
+    image = Image.new('RGB', (width, height), (200, 30, 30))
+    output = io.BytesIO()
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        image.save(output, image_format, exif=exif)
+    else:
+        image.save(output, image_format)
+    return output.getvalue()
+
+
+@mock.patch('apps.file_storage.renditions.RENDITION_WIDTHS', [200, 800])
+class StoredRenditionTests(TestCase):
+    """Storages that can't transform images get renditions encoded with Pillow."""
+
+    def store(self, data):
+        return store_upload(make_upload(data, 'image.png', 'image/png'), 'image/png', 'memory')
+
+    def test_renditions(self):
+        blob = self.store(image_bytes(1000, 500))
+        self.assertEqual(create_renditions(blob.pk), 4)
+
+        storage = get_driver('memory').storage
+        for rendition in blob.renditions.all():
+            with self.subTest(width=rendition.width, format=rendition.format):
+                self.assertEqual(rendition.height, rendition.width // 2)
+                with storage.open(rendition.storage_key) as stored:
+                    data = stored.read()
+                self.assertEqual(rendition.file_size, len(data))
+                with Image.open(io.BytesIO(data)) as image:
+                    self.assertEqual(image.format, rendition.format.upper())
+                    self.assertEqual(image.size, (rendition.width, rendition.height))
+
+        # Nothing is left to derive
+        self.assertEqual(create_renditions(blob.pk), 0)
+
+    def test_small_images_are_not_upscaled(self):
+        blob = self.store(image_bytes(500, 500))
+        create_renditions(blob.pk)
+        self.assertEqual(set(blob.renditions.values_list('width', flat=True)), {200})
+
+    def test_exif_orientation(self):
+        # Stored landscape, displayed as a 600x1000 portrait
+        blob = self.store(image_bytes(1000, 600, 'JPEG', orientation=6))
+        self.assertEqual(create_renditions(blob.pk), 2)
+        self.assertEqual(set(blob.renditions.values_list('width', 'height')), {(200, 333)})
+
+        blob = self.store(image_bytes(1600, 1000, 'JPEG', orientation=6))
+        create_renditions(blob.pk)
+        self.assertEqual(set(blob.renditions.values_list('width', 'height')), {(200, 320), (800, 1280)})
+
+    def test_not_an_image(self):
+        blob = self.store(b'not an image')
+        self.assertEqual(create_renditions(blob.pk), 0)
+
+    def test_renditions_are_deleted_with_the_blob(self):
+        blob = self.store(image_bytes(1000, 500))
+        create_renditions(blob.pk)
+        storage_keys = list(blob.renditions.values_list('storage_key', flat=True))
+        delete_blob_content(release_blob(blob.pk))
+        self.assertFalse(FileRendition.objects.exists())
+        for storage_key in storage_keys:
+            self.assertFalse(get_driver('memory').storage.exists(storage_key))
+
+
+@mock.patch('apps.file_storage.renditions.RENDITION_WIDTHS', [200, 800])
+class TransformationRenditionTests(TestCase):
+    """Cloudinary renditions are transformation URLs of the original."""
+
+    def create_blob(self, data):
+        self.data = data
+        return StoredBlob.objects.create(
+            content_hash='c' * 64,
+            storage_location='cloudinary',
+            storage_key='uploads/image',
+            file_url='https://res.cloudinary.com/test/image/upload/uploads/image.jpg',
+            file_size=len(data),
+        )
+
+    def create_renditions(self, blob):
+        driver = get_driver('cloudinary')
+        with fake_cloudinary() as server, \
+                mock.patch.object(driver, 'open', side_effect=lambda key: io.BytesIO(self.data)):
+            created = create_renditions(blob.pk)
+        # Nothing is encoded or uploaded
+        self.assertEqual(server.requests, [])
+        return created
+
+    def test_transformation_urls(self):
+        blob = self.create_blob(image_bytes(1000, 500, 'JPEG'))
+        self.assertEqual(self.create_renditions(blob), 4)
+
+        for rendition in blob.renditions.all():
+            with self.subTest(width=rendition.width, format=rendition.format):
+                self.assertEqual(rendition.height, rendition.width // 2)
+                self.assertEqual(rendition.storage_key, '')
+                self.assertIsNone(rendition.file_size)
+                self.assertIn(f'w_{rendition.width}', rendition.file_url)
+                self.assertIn('f_webp' if rendition.format == 'webp' else 'f_jpg', rendition.file_url)
+                self.assertIn('c_limit', rendition.file_url)
+                self.assertTrue(rendition.file_url.endswith('/uploads/image'))
+
+    def test_exif_orientation(self):
+        # Stored landscape, displayed portrait
+        blob = self.create_blob(image_bytes(1000, 500, 'JPEG', orientation=6))
+        self.create_renditions(blob)
+        self.assertEqual(
+            set(blob.renditions.values_list('width', 'height')),
+            {(200, 400)},
+        )
+
+    def test_not_an_image(self):
+        blob = self.create_blob(b'not an image')
+        self.assertEqual(self.create_renditions(blob), 0)
+
+    def test_derived_renditions_have_no_object_to_delete(self):
+        blob = self.create_blob(image_bytes(1000, 500, 'JPEG'))
+        self.create_renditions(blob)
+        with mock.patch('apps.file_storage.blobs.delete_stored_object') as delete:
+            delete_blob_content(release_blob(blob.pk))
+        delete.assert_called_once_with('cloudinary', 'uploads/image')
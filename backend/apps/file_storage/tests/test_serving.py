@@ -0,0 +1,189 @@
+"""
+Tests for serving local file content (serving.py).
+"""
+
+import tempfile
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, InMemoryStorage
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from apps.file_storage.models import StoredFile
+from apps.file_storage.serving import local_file_response, parse_range_header
+
+CONTENT = bytes(range(256)) * 40
+
+
+class ServingTestCase(TestCase):
+    """A stored file kept in a temporary default storage."""
+
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.storage = FileSystemStorage(location=directory)
+        self.enterContext(mock.patch('apps.file_storage.serving.default_storage', self.storage))
+        self.path = self.storage.save('uploads/file.bin', ContentFile(CONTENT))
+        self.stored_file = StoredFile.objects.create(
+            file_name='file.bin',
+            mime_type='application/octet-stream',
+            storage_location='local',
+            file_url=f'/media/{self.path}',
+            file_size=len(CONTENT),
+            content_hash='a' * 64,
+        )
+        self.factory = RequestFactory()
+
+    def serve(self, storage=None, **headers):
+        request = self.factory.get('/', **headers)
+        return local_file_response(request, self.stored_file, self.path, storage=storage)
+
+
+class AccelServingTests(ServingTestCase):
+    """The front proxy sends files when accelerated serving is enabled."""
+
+    @mock.patch('apps.file_storage.serving.ACCEL_MODE', 'nginx')
+    def test_nginx(self):
+        response = self.serve()
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/uploads/file.bin')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], f'"{"a" * 64}"')
+
+    @mock.patch('apps.file_storage.serving.ACCEL_MODE', 'sendfile')
+    def test_sendfile(self):
+        response = self.serve()
+        self.assertEqual(response['X-Sendfile'], self.storage.path(self.path))
+
+    @mock.patch('apps.file_storage.serving.ACCEL_MODE', '')
+    def test_disabled(self):
+        response = self.serve()
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+
+    def test_storage_without_paths_is_streamed(self):
+        # The proxy can't read files of a storage without filesystem paths
+        # (S3, Cloudinary)
+        storage = mock.Mock(wraps=self.storage)
+        storage.path.side_effect = NotImplementedError
+        for mode, header in [('nginx', 'X-Accel-Redirect'), ('sendfile', 'X-Sendfile')]:
+            with mock.patch('apps.file_storage.serving.ACCEL_MODE', mode), \
+                    mock.patch('apps.file_storage.serving.default_storage', storage):
+                response = self.serve(storage=storage)
+            self.assertNotIn(header, response)
+            self.assertEqual(b''.join(response.streaming_content), CONTENT)
+
+    @mock.patch('apps.file_storage.serving.ACCEL_MODE', 'nginx')
+    def test_other_storages_are_streamed(self):
+        storage = InMemoryStorage()
+        storage.save(self.path, ContentFile(CONTENT))
+        response = self.serve(storage=storage)
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+
+
+class ParseRangeHeaderTests(SimpleTestCase):
+    """Range headers are parsed into merged, inclusive byte ranges."""
+
+    def test_ranges(self):
+        for header, expected in [
+            ('bytes=0-99', [(0, 99)]),
+            ('bytes=100-', [(100, 999)]),
+            ('bytes=-100', [(900, 999)]),
+            ('bytes=-5000', [(0, 999)]),
+            ('bytes=900-5000', [(900, 999)]),
+            ('bytes=0-0,-1', [(0, 0), (999, 999)]),
+            ('bytes=0-9, 20-29', [(0, 9), (20, 29)]),
+            # Overlapping and adjacent ranges are merged
+            ('bytes=0-9,5-19', [(0, 19)]),
+            ('bytes=10-19,0-9', [(0, 19)]),
+            # Nothing satisfiable
+            ('bytes=1000-', []),
+            ('bytes=-0', []),
+            # Malformed or ignored
+            ('bytes=5-1', None),
+            ('bytes=a-b', None),
+            ('bytes=10', None),
+            ('items=0-9', None),
+            ('bytes=', None),
+            ('bytes=' + ','.join(f'{n * 10}-{n * 10 + 1}' for n in range(17)), None),
+        ]:
+            with self.subTest(header=header):
+                self.assertEqual(parse_range_header(header, 1000), expected)
+
+
+@mock.patch('apps.file_storage.serving.ACCEL_MODE', '')
+class RangeServingTests(ServingTestCase):
+    """Files are served with validators, 304s and partial content."""
+
+    def test_full_response(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], f'"{"a" * 64}"')
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+
+    def test_not_modified(self):
+        response = self.serve(HTTP_IF_NONE_MATCH=f'"{"a" * 64}"')
+        self.assertEqual(response.status_code, 304)
+        response = self.serve(HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_single_range(self):
+        response = self.serve(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(CONTENT)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[100:200])
+
+    def test_multiple_ranges(self):
+        response = self.serve(HTTP_RANGE='bytes=0-9,-10')
+        self.assertEqual(response.status_code, 206)
+        boundary = response['Content-Type'].split('boundary=')[1]
+        body = b''.join(response.streaming_content)
+        self.assertIn(f'Content-Range: bytes 0-9/{len(CONTENT)}'.encode(), body)
+        self.assertIn(CONTENT[:10], body)
+        self.assertIn(CONTENT[-10:], body)
+        self.assertTrue(body.endswith(f'--{boundary}--\r\n'.encode()))
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(HTTP_RANGE=f'bytes={len(CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_if_range(self):
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=f'"{"a" * 64}"')
+        self.assertEqual(response.status_code, 206)
+        # A stale validator gets the whole (changed) file
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_private_files_are_not_shared_cached(self):
+        self.stored_file.is_public = False
+        self.assertIn('private', self.serve()['Cache-Control'])
+
+    def test_etag_without_content_hash(self):
+        self.stored_file.content_hash = ''
+        first = self.serve()['ETag']
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH=first).status_code, 304)
+        self.stored_file.file_size += 1
+        self.assertNotEqual(self.serve()['ETag'], first)
+
+
+class FileMetadataETagTests(TestCase):
+    """File metadata responses can be revalidated with If-None-Match."""
+
+    def test_not_modified(self):
+        stored_file = StoredFile.objects.create(
+            file_name='file.pdf', mime_type='application/pdf', storage_location='local',
+            file_url='/media/uploads/file.pdf', file_size=10,
+        )
+        url = f'/api/files/files/{stored_file.file_reference}/'
+        client = APIClient()
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        not_modified = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        StoredFile.objects.filter(pk=stored_file.pk).update(description='Changed')
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
@@ -0,0 +1,102 @@
+"""
+Tests for signed, expiring download URLs (signing.py).
+"""
+
+import time
+from unittest import mock
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.file_storage.blobs import create_stored_file, store_upload
+from apps.file_storage.drivers import get_driver
+from apps.file_storage.models import StoredFile
+from apps.file_storage.signing import SIGNED_URL_PREFIX, SIGNED_URL_TTL, get_signed_url
+
+from .helpers import create_user, fake_cloudinary, make_upload
+
+CONTENT = b'%PDF-private content'
+
+
+class SignedURLTests(TestCase):
+    """Private local files are served from signed URLs without a lookup."""
+
+    def setUp(self):
+        self.user = create_user()
+        blob = store_upload(make_upload(CONTENT), 'application/pdf', 'memory')
+        self.stored_file = create_stored_file(
+            blob, file_name='private.pdf', mime_type='application/pdf',
+            uploaded_by=self.user, is_public=False,
+        )
+        self.client = APIClient()
+
+    def issue(self, user=None, **params):
+        if user is not None:
+            self.client.force_authenticate(user)
+        return self.client.get(
+            f'/api/files/files/{self.stored_file.file_reference}/signed-url/', params
+        )
+
+    def test_owner_gets_a_url(self):
+        response = self.issue(self.user)
+        self.assertEqual(response.status_code, 200, response.content)
+        url = response.json()['signed_url']
+        self.assertTrue(url.startswith(SIGNED_URL_PREFIX))
+        self.assertAlmostEqual(response.json()['expires_at'], time.time() + SIGNED_URL_TTL, delta=5)
+
+    def test_access_is_checked_when_issuing(self):
+        self.assertEqual(self.issue().status_code, 403)
+        self.assertEqual(self.issue(create_user('other@example.com')).status_code, 403)
+
+    def test_ttl_is_capped(self):
+        response = self.issue(self.user, ttl=SIGNED_URL_TTL * 10)
+        self.assertLessEqual(response.json()['expires_at'], time.time() + SIGNED_URL_TTL + 1)
+        response = self.issue(self.user, ttl=60)
+        self.assertAlmostEqual(response.json()['expires_at'], time.time() + 60, delta=5)
+
+    def test_download_without_database(self):
+        url, _ = get_signed_url(self.stored_file)
+        client = APIClient()
+        with self.assertNumQueries(0):
+            response = client.get(url)
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, CONTENT)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(response['ETag'], f'"{self.stored_file.content_hash}"')
+
+    def test_range_request(self):
+        url, _ = get_signed_url(self.stored_file)
+        response = APIClient().get(url, HTTP_RANGE='bytes=0-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[:5])
+
+    def test_expired_url(self):
+        url, expires_at = get_signed_url(self.stored_file, ttl=60)
+        with mock.patch('apps.file_storage.signing.time.time', return_value=expires_at + 1):
+            response = APIClient().get(url)
+        self.assertEqual(response.status_code, 410)
+
+    def test_tampered_url(self):
+        url, _ = get_signed_url(self.stored_file)
+        token = url[len(SIGNED_URL_PREFIX):].strip('/')
+        tampered = token[:-2] + ('AA' if token[-2:] != 'AA' else 'BB')
+        response = APIClient().get(f'{SIGNED_URL_PREFIX}{tampered}/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_deleted_content(self):
+        url, _ = get_signed_url(self.stored_file)
+        get_driver('memory').storage.delete(self.stored_file.blob.storage_key)
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_cloudinary_files_get_a_storage_url(self):
+        stored_file = StoredFile(
+            file_name='private.pdf', mime_type='application/pdf', storage_location='cloudinary',
+            file_url='https://res.cloudinary.com/test/raw/upload/v1/uploads/private.pdf',
+            file_size=10,
+        )
+        with fake_cloudinary():
+            url, expires_at = get_signed_url(stored_file, ttl=60)
+        self.assertFalse(url.startswith(SIGNED_URL_PREFIX))
+        self.assertIn(f'expires_at={expires_at}', url)
+        self.assertIn('signature=', url)
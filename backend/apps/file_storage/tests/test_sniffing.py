@@ -0,0 +1,78 @@
+"""
+Tests for upload type sniffing (utils.sniff_mime_type, mime_types_agree).
+"""
+
+import io
+import struct
+from django.test import SimpleTestCase
+from PIL import Image
+
+from apps.file_storage.utils import mime_types_agree, sniff_mime_type
+
+
+def bmp_bytes():
+    output = io.BytesIO()
+    Image.new('RGB', (4, 4)).save(output, 'BMP')
+    return output.getvalue()
+
+
+def ftyp(brand):
+    return struct.pack('>I', 24) + b'ftyp' + brand + b'\x00\x00\x02\x00isommp41'
+
+
+class SniffMimeTypeTests(SimpleTestCase):
+    """Uploads are identified by their leading bytes."""
+
+    def test_signatures(self):
+        for header, expected in [
+            (b'\xff\xd8\xff\xe0\x00\x10JFIF', 'image/jpeg'),
+            (b'\x89PNG\r\n\x1a\n\x00\x00', 'image/png'),
+            (b'GIF89a\x01\x00', 'image/gif'),
+            (bmp_bytes(), 'image/bmp'),
+            (b'%PDF-1.7\n', 'application/pdf'),
+            (b'PK\x03\x04\x14\x00', 'application/zip'),
+            (b'RIFF\x24\x00\x00\x00WEBPVP8 ', 'image/webp'),
+            (b'RIFF\x24\x00\x00\x00WAVEfmt ', 'audio/wav'),
+            (b'ID3\x03\x00\x00\x00\x00\x0f\x76', 'audio/mpeg'),
+            (b'ID3\x04\x00\x00\x00\x00\x00\x21', 'audio/mpeg'),
+            (b'OggS\x00\x02', 'audio/ogg'),
+            (ftyp(b'isom'), 'video/mp4'),
+            (ftyp(b'mp42'), 'video/mp4'),
+            (ftyp(b'qt  '), 'video/quicktime'),
+            (ftyp(b'M4A '), 'audio/mp4'),
+            (ftyp(b'M4B '), 'audio/mp4'),
+            # Text starting like a short signature
+            (b'BMW owners club minutes, 2024', None),
+            (b'BM' + b'\x00' * 30, None),
+            (b'ID3 tags explained: a primer', None),
+            (b'ID3\x03\x01 tag', None),
+            (b'hello world', None),
+            (b'', None),
+        ]:
+            with self.subTest(header=header[:12]):
+                self.assertEqual(sniff_mime_type(header), expected)
+
+
+class MimeTypesAgreeTests(SimpleTestCase):
+    """The declared type must not contradict the sniffed one."""
+
+    def test_agreement(self):
+        for declared, sniffed, expected in [
+            ('image/png', 'image/png', True),
+            ('image/jpeg', 'image/png', True),
+            ('application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+             'application/zip', True),
+            ('text/plain', None, True),
+            ('image/png', 'application/pdf', False),
+            ('application/pdf', 'image/jpeg', False),
+            # MP4 audio with a generic brand
+            ('audio/mp4', 'video/mp4', True),
+            ('audio/x-m4a', 'video/mp4', True),
+            ('video/mp4', 'audio/mp4', True),
+            ('audio/webm', 'video/webm', True),
+            ('video/ogg', 'audio/ogg', True),
+            ('audio/mp4', 'image/png', False),
+            ('image/png', 'video/mp4', False),
+        ]:
+            with self.subTest(declared=declared, sniffed=sniffed):
+                self.assertEqual(mime_types_agree(declared, sniffed), expected)
@@ -0,0 +1,59 @@
+"""
+Tests for the cached storage statistics (stats.py).
+"""
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.file_storage.models import StoredFile
+from apps.file_storage.stats import get_file_stats
+
+
+class FileStatsTests(TestCase):
+    """Statistics come from one query and are cached until files change."""
+
+    def setUp(self):
+        cache.clear()
+        for name, mime_type, location, size in [
+            ('a.jpg', 'image/jpeg', 'cloudinary', 100),
+            ('b.png', 'image/png', 'cloudinary', 200),
+            ('c.mp4', 'video/mp4', 'cloudinary', 1000),
+            ('d.pdf', 'application/pdf', 'local', 50),
+            ('e.zip', 'application/zip', 'memory', 5),
+        ]:
+            StoredFile.objects.create(
+                file_name=name, mime_type=mime_type, storage_location=location,
+                file_url=f'/media/{name}', file_size=size,
+            )
+
+    def test_counts(self):
+        with self.assertNumQueries(1):
+            stats = get_file_stats()
+        self.assertEqual(stats['total_files'], 5)
+        self.assertEqual(stats['total_size'], 1355)
+        self.assertEqual(stats['by_type'], {'images': 2, 'videos': 1, 'documents': 1})
+        self.assertEqual(stats['by_storage']['cloudinary'], 3)
+        self.assertEqual(stats['by_storage']['local'], 1)
+        self.assertEqual(stats['by_storage']['memory'], 1)
+
+    def test_cached(self):
+        get_file_stats()
+        with self.assertNumQueries(0):
+            get_file_stats()
+
+    def test_changes_invalidate(self):
+        get_file_stats()
+        StoredFile.objects.create(
+            file_name='f.gif', mime_type='image/gif', storage_location='local',
+            file_url='/media/f.gif', file_size=10,
+        )
+        self.assertEqual(get_file_stats()['by_type']['images'], 3)
+
+        StoredFile.objects.filter(file_name='a.jpg').get().delete()
+        self.assertEqual(get_file_stats()['total_files'], 5)
+
+    def test_endpoint(self):
+        response = APIClient().get('/api/files/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stats'], get_file_stats())
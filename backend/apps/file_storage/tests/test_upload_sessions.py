@@ -0,0 +1,151 @@
+"""
+Tests for resumable upload sessions (upload_sessions.py and views).
+"""
+
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.file_storage.drivers import get_driver
+from apps.file_storage.models import StoredFile, UploadSession, UploadSessionPart
+
+from .helpers import create_user, failing_transfer, temporary_staging
+
+CHUNK_SIZE = 100_000
+PDF = b'%PDF-1.4\n' + bytes(range(256)) * 1000
+
+
+@mock.patch('apps.file_storage.views.SESSION_CHUNK_SIZE', CHUNK_SIZE)
+@mock.patch('apps.file_storage.views.determine_storage_location', return_value='memory')
+class UploadSessionTests(TestCase):
+    """Files are uploaded in numbered parts and assembled on completion."""
+
+    def setUp(self):
+        self.staging = self.enterContext(temporary_staging())
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def open_session(self, data=PDF):
+        response = self.client.post('/api/files/upload/sessions/', {
+            'file_name': 'file.pdf',
+            'total_size': len(data),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['session']['session_id']
+
+    def put_part(self, session_id, number, data):
+        return self.client.generic(
+            'PUT', f'/api/files/upload/sessions/{session_id}/parts/{number}/',
+            data, content_type='application/octet-stream',
+        )
+
+    def upload_parts(self, session_id, data=PDF, order=None):
+        numbers = list(range(1, -(-len(data) // CHUNK_SIZE) + 1))
+        for number in order or numbers:
+            part = data[(number - 1) * CHUNK_SIZE:number * CHUNK_SIZE]
+            response = self.put_part(session_id, number, part)
+            self.assertEqual(response.status_code, 200, response.content)
+
+    def complete(self, session_id):
+        return self.client.post(f'/api/files/upload/sessions/{session_id}/complete/')
+
+    def test_parts_are_assembled(self, determine_storage_location):
+        session_id = self.open_session()
+        self.upload_parts(session_id, order=[3, 1, 2])
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 201, response.content)
+
+        stored_file = StoredFile.objects.get(file_reference=response.json()['file_reference'])
+        with get_driver('memory').open(stored_file.blob.storage_key) as stored:
+            self.assertEqual(stored.read(), PDF)
+        self.assertEqual(UploadSession.objects.get().status, 'completed')
+        self.assertEqual(self.staging.listdir('upload_sessions')[0], [])
+
+    @mock.patch('apps.file_storage.background.enqueue_blob_upload')
+    def test_failed_transfer_is_retried(self, enqueue_blob_upload, determine_storage_location):
+        session_id = self.open_session()
+        self.upload_parts(session_id)
+        with failing_transfer():
+            response = self.complete(session_id)
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(StoredFile.objects.get().status, 'pending')
+        enqueue_blob_upload.assert_called_once()
+
+    def test_missing_parts(self, determine_storage_location):
+        session_id = self.open_session()
+        self.upload_parts(session_id, order=[1, 3])
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('[2]', response.json()['errors'][0])
+        self.assertEqual(UploadSession.objects.get().status, 'open')
+
+    def test_part_size_is_checked(self, determine_storage_location):
+        session_id = self.open_session()
+        response = self.put_part(session_id, 1, PDF[:CHUNK_SIZE - 1])
+        self.assertEqual(response.status_code, 400)
+        response = self.put_part(session_id, 4, b'x')
+        self.assertEqual(response.status_code, 400)
+
+    def test_expired_session_cannot_be_completed(self, determine_storage_location):
+        session_id = self.open_session()
+        self.upload_parts(session_id)
+        UploadSession.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.complete(session_id)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(UploadSession.objects.get().status, 'open')
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_expired_session_rejects_parts(self, determine_storage_location):
+        session_id = self.open_session()
+        UploadSession.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.put_part(session_id, 1, PDF[:CHUNK_SIZE])
+        self.assertEqual(response.status_code, 409)
+
+    def test_completed_session_cannot_be_completed_again(self, determine_storage_location):
+        session_id = self.open_session()
+        self.upload_parts(session_id)
+        self.assertEqual(self.complete(session_id).status_code, 201)
+        self.assertEqual(self.complete(session_id).status_code, 409)
+        self.assertEqual(StoredFile.objects.count(), 1)
+
+    def test_abort_discards_parts(self, determine_storage_location):
+        session_id = self.open_session()
+        self.upload_parts(session_id, order=[1])
+        response = self.client.delete(f'/api/files/upload/sessions/{session_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UploadSession.objects.get().status, 'aborted')
+        self.assertFalse(self.staging.exists(f'upload_sessions/{session_id}'))
+
+    def test_expired_sessions_are_purged(self, determine_storage_location):
+        expired_open, expired_completing, current = (self.open_session() for _ in range(3))
+        for session_id in (expired_open, expired_completing, current):
+            self.upload_parts(session_id, order=[1])
+        UploadSession.objects.filter(session_id=expired_completing).update(status='completing')
+        UploadSession.objects.exclude(session_id=current).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        # Finished sessions are kept whether or not they have expired
+        completed = self.open_session()
+        self.upload_parts(completed)
+        self.assertEqual(self.complete(completed).status_code, 201)
+        UploadSession.objects.filter(session_id=completed).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        call_command('purge_upload_sessions', stdout=StringIO())
+
+        self.assertEqual(
+            sorted(UploadSession.objects.values_list('status', flat=True)),
+            ['completed', 'open'],
+        )
+        self.assertEqual(UploadSessionPart.objects.filter(session__session_id=current).count(), 1)
+        self.assertFalse(UploadSessionPart.objects.exclude(session__session_id__in=(current, completed)).exists())
+        for session_id in (expired_open, expired_completing):
+            self.assertFalse(self.staging.exists(f'upload_sessions/{session_id}'))
+        self.assertTrue(self.staging.exists(f'upload_sessions/{current}'))
@@ -0,0 +1,103 @@
+"""
+Tests for streaming uploads (streaming.py and the upload view).
+"""
+
+import hashlib
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from apps.file_storage.models import StoredFile
+from apps.file_storage.utils import MAX_UPLOAD_SIZE, FileTooLargeError, validate_file_size
+
+from .helpers import create_user, failing_transfer, make_upload
+
+PDF = b'%PDF-1.4\n' + b'x' * 300_000
+
+
+class StreamingUploadTests(SimpleTestCase):
+    """Bytes are hashed, counted and size-checked as they are read."""
+
+    def test_chunks_are_hashed(self):
+        upload = make_upload(PDF)
+        data = b''.join(upload.chunks(chunk_size=1000))
+        self.assertEqual(data, PDF)
+        self.assertEqual(upload.sha256, hashlib.sha256(PDF).hexdigest())
+        self.assertEqual(upload.bytes_read, len(PDF))
+        self.assertEqual(upload.sniffed_mime_type, 'application/pdf')
+
+    def test_reads_are_hashed(self):
+        upload = make_upload(PDF)
+        while upload.read(4096):
+            pass
+        self.assertEqual(upload.sha256, hashlib.sha256(PDF).hexdigest())
+
+    def test_rewind_resets_digest(self):
+        upload = make_upload(PDF)
+        upload.read(1000)
+        upload.seek(0)
+        b''.join(upload.chunks())
+        self.assertEqual(upload.sha256, hashlib.sha256(PDF).hexdigest())
+        self.assertEqual(upload.bytes_read, len(PDF))
+
+    def test_size_limit(self):
+        upload = make_upload(PDF, max_size=len(PDF) - 1)
+        with self.assertRaises(FileTooLargeError):
+            b''.join(upload.chunks())
+
+    def test_validate_file_size_uses_setting(self):
+        self.assertTrue(validate_file_size(mock.Mock(size=MAX_UPLOAD_SIZE)))
+        self.assertFalse(validate_file_size(mock.Mock(size=MAX_UPLOAD_SIZE + 1)))
+        self.assertFalse(validate_file_size(mock.Mock(size=101), max_size=100))
+
+
+@mock.patch('apps.file_storage.views.determine_storage_location', return_value='memory')
+class FileUploadViewTests(TestCase):
+    """The upload view streams files to storage."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, data, name='file.pdf', content_type='application/pdf'):
+        return self.client.post('/api/files/upload/', {
+            'file': SimpleUploadedFile(name, data, content_type=content_type),
+        }, format='multipart')
+
+    def test_upload(self, determine_storage_location):
+        response = self.upload(PDF)
+        self.assertEqual(response.status_code, 201, response.content)
+        stored_file = StoredFile.objects.get(file_reference=response.json()['file_reference'])
+        self.assertEqual(stored_file.file_size, len(PDF))
+        self.assertEqual(stored_file.content_hash, hashlib.sha256(PDF).hexdigest())
+
+    def test_oversized_upload_is_rejected(self, determine_storage_location):
+        with mock.patch('apps.file_storage.views.validate_file_size', return_value=False):
+            response = self.upload(PDF)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'{MAX_UPLOAD_SIZE // (1024 * 1024)}MB', response.json()['errors'][0])
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_content_must_match_type(self, determine_storage_location):
+        response = self.upload(b'\x89PNG\r\n\x1a\n' + b'x' * 100)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StoredFile.objects.exists())
+
+    @mock.patch('apps.file_storage.background.enqueue_blob_upload')
+    def test_failed_transfer_is_retried(self, enqueue_blob_upload, determine_storage_location):
+        with failing_transfer():
+            response = self.upload(PDF)
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(response.json()['message'], 'File accepted for processing')
+        stored_file = StoredFile.objects.get()
+        self.assertEqual((stored_file.status, stored_file.blob.status), ('pending', 'pending'))
+        enqueue_blob_upload.assert_called_once_with(stored_file.blob_id)
+
+    @mock.patch('apps.file_storage.views.retry_blob_upload', return_value=False)
+    def test_failed_transfer_is_not_reported_stored(self, retry_blob_upload, determine_storage_location):
+        with failing_transfer():
+            response = self.upload(PDF)
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(response.json()['success'])
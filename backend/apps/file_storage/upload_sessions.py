@@ -0,0 +1,216 @@
+"""
+File Storage Upload Sessions
+
+This module contains the helpers behind resumable, multi-part uploads:
+writing parts to the local staging area and assembling them into the
+final stored file without loading them into memory.
+"""
+
+import os
+import hashlib
+import shutil
+import uuid
+from django.conf import settings
+from django.utils import timezone
+
+from .models import UploadSession
+from .utils import staging_storage
+
+
+# Size of every part except the last one
+SESSION_CHUNK_SIZE = getattr(settings, 'FILE_STORAGE_SESSION_CHUNK_SIZE', 8 * 1024 * 1024)
+
+# Largest file that can be uploaded through a session
+MAX_SESSION_UPLOAD_SIZE = getattr(settings, 'FILE_STORAGE_MAX_SESSION_UPLOAD_SIZE', 200 * 1024 * 1024)
+
+# How long an unfinished session stays open
+SESSION_TTL_HOURS = getattr(settings, 'FILE_STORAGE_SESSION_TTL_HOURS', 24)
+
+# Block size used when copying request bodies and parts
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class PartSizeError(Exception):
+    """Raised when a received part doesn't have the expected size."""
+
+
+def write_part(session, part_number, stream):
+    """
+    Write a single part of an upload session to the staging area.
+
+    The part is written to a temporary file and renamed into place, so
+    a retried or concurrent PUT of the same part never leaves a torn file.
+
+    Args:
+        session: UploadSession the part belongs to
+        part_number (int): 1-based part number
+        stream: File-like object with the part body (e.g. the request)
+
+    Returns:
+        tuple: (size, SHA-256 hex digest) of the written part
+    """
+    expected_size = session.expected_part_size(part_number)
+    final_path = staging_storage.path(session.part_path(part_number))
+    temp_path = f"{final_path}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, 'wb') as part_file:
+            while True:
+                data = stream.read(COPY_BUFFER_SIZE)
+                if not data:
+                    break
+                size += len(data)
+                if size > expected_size:
+                    raise PartSizeError(
+                        f"Part {part_number} must be {expected_size} bytes"
+                    )
+                hasher.update(data)
+                part_file.write(data)
+
+        if size != expected_size:
+            raise PartSizeError(
+                f"Part {part_number} must be {expected_size} bytes, got {size}"
+            )
+
+        os.replace(temp_path, final_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return size, hasher.hexdigest()
+
+
+def discard_parts(session):
+    """Remove every staged part of an upload session."""
+    discard_session_directory(session.session_id)
+
+
+def discard_session_directory(session_id):
+    """Remove the staging directory of an upload session."""
+    shutil.rmtree(
+        staging_storage.path(f"upload_sessions/{session_id}"),
+        ignore_errors=True
+    )
+
+
+def purge_expired_sessions(batch_size=1000):
+    """
+    Delete unfinished upload sessions that have expired, with their parts.
+
+    Sessions that were never completed or aborted stay 'open' (or
+    'completing', if the process died while assembling them) and keep
+    their parts in the staging area until they are purged.
+
+    Args:
+        batch_size (int): Number of sessions deleted per query
+
+    Returns:
+        int: Number of sessions purged
+    """
+    purged = 0
+    while True:
+        # Served by the (status, expires_at) index
+        expired = list(
+            UploadSession.objects.filter(
+                status__in=('open', 'completing'),
+                expires_at__lte=timezone.now(),
+            ).values_list('pk', 'session_id')[:batch_size]
+        )
+        if not expired:
+            return purged
+
+        UploadSession.objects.filter(pk__in=[pk for pk, _ in expired]).delete()
+        for _, session_id in expired:
+            discard_session_directory(session_id)
+        purged += len(expired)
+
+
+class PartsReader:
+    """
+    Read-only file object over the staged parts of an upload session.
+
+    Parts are opened one at a time as the reader advances, so assembling
+    a session only ever holds one read buffer in memory.
+    """
+
+    def __init__(self, session):
+        self.name = session.file_name
+        self.size = session.total_size
+        self._paths = [
+            staging_storage.path(session.part_path(number))
+            for number in range(1, session.total_parts + 1)
+        ]
+        self._index = 0
+        self._current = None
+        self._position = 0
+        self.closed = False
+
+    def read(self, size=-1):
+        chunks = []
+        remaining = size
+        while self._index < len(self._paths) and remaining != 0:
+            if self._current is None:
+                self._current = open(self._paths[self._index], 'rb')
+            data = self._current.read(remaining if remaining > 0 else -1)
+            if not data:
+                self._current.close()
+                self._current = None
+                self._index += 1
+                continue
+            chunks.append(data)
+            self._position += len(data)
+            if remaining > 0:
+                remaining -= len(data)
+        return b''.join(chunks)
+
+    def seek(self, offset, whence=0):
+        # Only rewinding and seeking to the end are needed by the
+        # storage backends (Cloudinary sizes streams this way)
+        self._close_current()
+        if whence == 2 and offset == 0:
+            self._index = len(self._paths)
+            self._position = self.size
+        elif whence == 0 and offset == 0:
+            self._index = 0
+            self._position = 0
+        else:
+            raise OSError("PartsReader only supports seeking to the start or end")
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def _close_current(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        self._close_current()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def missing_parts(session):
+    """
+    Check that every part of a session has been received.
+
+    Args:
+        session: UploadSession to check
+
+    Returns:
+        list: Missing part numbers (empty if the session is complete)
+    """
+    received = set(session.parts.values_list('part_number', flat=True))
+    return [
+        number for number in range(1, session.total_parts + 1)
+        if number not in received
+    ]
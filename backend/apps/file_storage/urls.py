@@ -13,14 +13,26 @@ urlpatterns = [
     # File upload endpoint
     path('upload/', views.FileUploadView.as_view(), name='file_upload'),
     
+    # Resumable multi-part upload endpoints
+    path('upload/sessions/', views.create_upload_session, name='create_upload_session'),
+    path('upload/sessions/<uuid:session_id>/', views.upload_session_detail, name='upload_session_detail'),
+    path('upload/sessions/<uuid:session_id>/parts/<int:part_number>/', views.upload_session_part, name='upload_session_part'),
+    path('upload/sessions/<uuid:session_id>/complete/', views.complete_upload_session, name='complete_upload_session'),
+    
     # File retrieval endpoints
     path('files/<uuid:file_reference>/', views.get_file_by_reference, name='get_file'),
     path('files/<uuid:file_reference>/serve/', views.serve_file, name='serve_file'),
+    path('files/<uuid:file_reference>/signed-url/', views.get_signed_file_url, name='get_signed_file_url'),
+    path('files/signed/<str:token>/', views.serve_signed, name='serve_signed_file'),
     
     # File management endpoints
     path('files/', views.list_user_files, name='list_user_files'),
     path('files/<uuid:file_reference>/delete/', views.delete_file, name='delete_file'),
+    path('files/bulk/delete/', views.bulk_delete_files, name='bulk_delete_files'),
+    path('files/bulk/update/', views.bulk_update_files, name='bulk_update_files'),
     
     # Statistics endpoint
     path('stats/', views.file_stats, name='file_stats'),
+    path('usage/', views.storage_usage, name='storage_usage'),
+    path('cloudinary/metrics/', views.cloudinary_metrics, name='cloudinary_metrics'),
 ]
@@ -7,14 +7,55 @@ storage decisions, and file operations.
 
 import os
 import uuid
+import logging
 import mimetypes
 from datetime import datetime
 from django.conf import settings
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage, FileSystemStorage
+from django.utils.dateparse import parse_datetime
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
+import cloudinary.utils
+
+from .gateway import get_gateway
+
+logger = logging.getLogger(__name__)
+
+# Work-in-progress files (upload session parts, uploads waiting for a
+# background transfer) are kept on local disk regardless of DEFAULT_FILE_STORAGE
+staging_storage = FileSystemStorage(
+    location=getattr(settings, 'FILE_STORAGE_STAGING_ROOT', os.path.join(settings.BASE_DIR, 'upload_staging'))
+)
+
+# Largest upload accepted by the upload endpoints
+MAX_UPLOAD_SIZE = getattr(settings, 'FILE_STORAGE_MAX_UPLOAD_SIZE', 50 * 1024 * 1024)
+
+# Chunk size for Cloudinary chunked uploads (Cloudinary requires at least 5MB)
+CLOUDINARY_CHUNK_SIZE = getattr(settings, 'FILE_STORAGE_CLOUDINARY_CHUNK_SIZE', 6 * 1024 * 1024)
+
+# Rules deciding which storage driver receives an upload (first match wins)
+STORAGE_ROUTES = getattr(settings, 'FILE_STORAGE_ROUTES', [
+    {'mime_types': ['image/', 'video/'], 'driver': 'cloudinary'},
+    {'driver': 'local'},
+])
+
+# Public IDs per Cloudinary delete_resources call (the API maximum is 100)
+CLOUDINARY_DELETE_BATCH_SIZE = 100
+
+# Assets per Cloudinary resources listing call (the API maximum is 500)
+CLOUDINARY_LIST_PAGE_SIZE = 500
+
+# Threads used to delete local files in bulk
+DELETE_WORKERS = getattr(settings, 'FILE_STORAGE_DELETE_WORKERS', 8)
+
+
+class FileTooLargeError(Exception):
+    """Raised when an upload stream grows past the configured size limit."""
+
+
+class FileTypeMismatchError(Exception):
+    """Raised when the content of a file doesn't match its declared type."""
 
 
 def get_file_mime_type(file):
@@ -40,21 +81,179 @@ def get_file_mime_type(file):
     return 'application/octet-stream'
 
 
-def determine_storage_location(mime_type):
+# Number of leading bytes read from an upload to detect its type
+SNIFF_HEADER_SIZE = 4096
+
+# Byte signatures of the file types we accept, as (pattern, MIME type).
+# None in a pattern matches any byte (e.g. the chunk size of RIFF files).
+FILE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF-', 'application/pdf'),
+    (b'PK\x03\x04', 'application/zip'),
+    (b'Rar!\x1a\x07', 'application/x-rar-compressed'),
+    (b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (b'\x1f\x8b', 'application/gzip'),
+    (b'\x1a\x45\xdf\xa3', 'video/webm'),
+    (b'OggS', 'audio/ogg'),
+    # RIFF containers and ISO media files carry their type a few bytes in
+    ((*b'RIFF', None, None, None, None, *b'WEBP'), 'image/webp'),
+    ((*b'RIFF', None, None, None, None, *b'AVI '), 'video/x-msvideo'),
+    ((*b'RIFF', None, None, None, None, *b'WAVE'), 'audio/wav'),
+    ((None, None, None, None, *b'ftyp'), 'video/mp4'),
+    ((None, None, None, None, *b'ftypqt'), 'video/quicktime'),
+    ((None, None, None, None, *b'ftypM4A '), 'audio/mp4'),
+    ((None, None, None, None, *b'ftypM4B '), 'audio/mp4'),
+]
+
+# Two-letter 'BM' and 'ID3' prefixes also start plain text, so those
+# signatures extend into header fields that text won't reproduce: the
+# zero reserved bytes and the DIB header size of BMP files, and the
+# version and zero revision byte of ID3v2 tags
+FILE_SIGNATURES += [
+    ((*b'BM', None, None, None, None, 0, 0, 0, 0, None, None, None, None, dib_size, 0, 0, 0), 'image/bmp')
+    for dib_size in (12, 40, 52, 56, 64, 108, 124)
+]
+FILE_SIGNATURES += [
+    ((*b'ID3', version, 0), 'audio/mpeg')
+    for version in (2, 3, 4)
+]
+
+# Containers that hold either audio or video: a sniffed container type
+# agrees with any of these declared types
+CONTAINER_MIME_TYPES = {
+    'video/mp4': {'audio/mp4', 'audio/x-m4a', 'audio/m4a', 'audio/aac', 'audio/x-m4b'},
+    'audio/mp4': {'video/mp4'},
+    'video/webm': {'audio/webm'},
+    'audio/ogg': {'video/ogg', 'application/ogg'},
+}
+
+
+def compile_signatures(signatures):
+    """
+    Build a byte trie from (pattern, MIME type) signatures.
+    
+    Each node is a dict mapping a byte value (or None for any byte) to
+    the next node; the MIME type of a complete pattern is kept under the
+    'mime_type' key of its last node.
+    """
+    root = {}
+    for pattern, mime_type in signatures:
+        node = root
+        for byte in pattern:
+            node = node.setdefault(byte, {})
+        node['mime_type'] = mime_type
+    return root
+
+
+SIGNATURE_TRIE = compile_signatures(FILE_SIGNATURES)
+
+
+def sniff_mime_type(header):
+    """
+    Detect the MIME type of a file from its leading bytes.
+    
+    The header is walked through the signature trie once; the longest
+    matching signature wins, so 'ftypM4A ' beats the generic 'ftyp'.
+    
+    Args:
+        header (bytes): First bytes of the file
+        
+    Returns:
+        str: Detected MIME type, or None if the signature is unknown
+    """
+    best = None
+    nodes = [SIGNATURE_TRIE]
+    for byte in header:
+        next_nodes = []
+        for node in nodes:
+            for key in (byte, None):
+                child = node.get(key)
+                if child is not None:
+                    next_nodes.append(child)
+                    if 'mime_type' in child:
+                        best = child['mime_type']
+        if not next_nodes:
+            break
+        nodes = next_nodes
+    return best
+
+
+def read_file_header(file, size=SNIFF_HEADER_SIZE):
+    """
+    Read the leading bytes of a file without consuming it.
+    
+    Args:
+        file: Django UploadedFile object
+        size (int): Number of bytes to read
+        
+    Returns:
+        bytes: Up to `size` leading bytes of the file
+    """
+    position = file.tell()
+    file.seek(0)
+    header = file.read(size)
+    file.seek(position)
+    return header
+
+
+def mime_types_agree(declared, sniffed):
     """
-    Determine where a file should be stored based on its MIME type.
+    Check that a sniffed MIME type is consistent with the declared one.
+    
+    Only the top-level type is compared, so container formats such as
+    .docx (a zip archive) are not rejected. Audio and video in the same
+    container (an .m4a declared audio/mp4 whose brand sniffs as
+    video/mp4) agree as well.
+    
+    Args:
+        declared (str): MIME type reported by the client
+        sniffed (str): MIME type detected from the file content, or None
+        
+    Returns:
+        bool: True if the file content matches the declared type
+    """
+    if not sniffed:
+        return True
+    if declared in CONTAINER_MIME_TYPES.get(sniffed, ()):
+        return True
+    return declared.split('/')[0] == sniffed.split('/')[0]
+
+
+def determine_storage_location(mime_type, file_size=None):
+    """
+    Determine where a file should be stored.
+    
+    The first rule in FILE_STORAGE_ROUTES matching the MIME type and size
+    decides. A rule may set 'mime_types' (prefixes such as 'video/' or
+    full types), 'min_size' and 'max_size' in bytes; rules without
+    conditions match everything. Size conditions don't match when the
+    size isn't known yet.
     
     Args:
         mime_type (str): MIME type of the file
+        file_size (int, optional): Size of the file in bytes
         
     Returns:
-        str: 'cloudinary' for images/videos, 'local' for documents
+        str: Name of the storage driver, by default 'cloudinary' for
+             images/videos and 'local' for everything else
     """
-    # Images and videos go to Cloudinary
-    if mime_type.startswith(('image/', 'video/')):
-        return 'cloudinary'
+    for route in STORAGE_ROUTES:
+        mime_types = route.get('mime_types')
+        if mime_types and not mime_type.startswith(tuple(mime_types)):
+            continue
+        min_size = route.get('min_size')
+        max_size = route.get('max_size')
+        if (min_size is not None or max_size is not None) and file_size is None:
+            continue
+        if min_size is not None and file_size < min_size:
+            continue
+        if max_size is not None and file_size > max_size:
+            continue
+        return route['driver']
     
-    # Everything else goes to local storage
     return 'local'
 
 
@@ -85,12 +284,39 @@ def generate_local_file_path(file_name, year=None, month=None):
     return os.path.join(directory, unique_filename)
 
 
+class KeepOpenFile:
+    """
+    Proxy of a file object whose close() does nothing.
+    
+    cloudinary.uploader.upload_large closes the stream it is given, also
+    when the upload fails, which would leave nothing to retry with.
+    """
+    
+    def __init__(self, file):
+        self._file = file
+    
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+    
+    def close(self):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        pass
+
+
 def upload_to_cloudinary(file, public_id=None, folder="dol_uploads"):
     """
     Upload a file to Cloudinary.
     
+    The file is sent with Cloudinary's chunked upload API, so at most
+    one chunk of the file is held in memory at a time.
+    
     Args:
-        file: Django UploadedFile object
+        file: Django UploadedFile or StreamingUpload object
         public_id (str, optional): Custom public ID for the file
         folder (str): Cloudinary folder to store the file
         
@@ -103,18 +329,26 @@ def upload_to_cloudinary(file, public_id=None, folder="dol_uploads"):
             file_extension = os.path.splitext(file.name)[1]
             public_id = f"{folder}/{uuid.uuid4()}"
         
-        # Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(
-            file,
+        # Upload to Cloudinary in chunks; a retried upload starts over on
+        # the same (still open) file
+        upload_result = get_gateway().call(
+            'upload',
+            cloudinary.uploader.upload_large,
+            KeepOpenFile(file),
+            rewind=lambda: file.seek(0),
             public_id=public_id,
             folder=folder,
             resource_type="auto",  # Automatically detect image/video/raw
             overwrite=True,
             invalidate=True,
+            filename=file.name,
+            chunk_size=CLOUDINARY_CHUNK_SIZE,
         )
         
         return upload_result
         
+    except FileTooLargeError:
+        raise
     except Exception as e:
         raise Exception(f"Cloudinary upload failed: {str(e)}")
 
@@ -123,16 +357,19 @@ def upload_to_local_storage(file, file_path):
     """
     Upload a file to local storage.
     
+    The file is handed to the storage backend as-is so it is written
+    chunk by chunk instead of being read into memory first.
+    
     Args:
-        file: Django UploadedFile object
+        file: Django UploadedFile or StreamingUpload object
         file_path (str): Path where to store the file
         
     Returns:
         str: URL to access the stored file
     """
     try:
-        # Save file to local storage
-        saved_path = default_storage.save(file_path, ContentFile(file.read()))
+        # Stream the file to local storage
+        saved_path = default_storage.save(file_path, file)
         
         # Generate URL for accessing the file
         file_url = default_storage.url(saved_path)
@@ -140,60 +377,160 @@ def upload_to_local_storage(file, file_path):
         return file_url
         
     except Exception as e:
+        # Don't leave a partially written file behind
+        delete_local_file(file_path)
+        if isinstance(e, FileTooLargeError):
+            raise
         raise Exception(f"Local storage upload failed: {str(e)}")
 
 
+def store_file(file, storage_location):
+    """
+    Stream a file to the given storage driver.
+    
+    Args:
+        file: Django File-like object (usually a StreamingUpload)
+        storage_location (str): Name of the storage driver
+        
+    Returns:
+        dict: file_url, storage_key (Cloudinary public ID, storage path,
+              ...) and the size reported by the storage, if any
+    """
+    from .drivers import get_driver
+    return get_driver(storage_location).write(file)
+
+
+def delete_stored_object(storage_location, storage_key):
+    """
+    Delete an object written by store_file.
+    
+    Args:
+        storage_location (str): Name of the storage driver
+        storage_key (str): Key returned by store_file
+        
+    Returns:
+        bool: True if deletion was successful
+    """
+    from .drivers import get_driver
+    return get_driver(storage_location).delete(storage_key)
+
+
+def delete_stored_objects(storage_location, storage_keys):
+    """
+    Delete many objects written by store_file.
+    
+    Cloudinary assets are removed with the bulk delete API; other
+    storages delete in parallel.
+    
+    Args:
+        storage_location (str): Name of the storage driver
+        storage_keys (list): Keys returned by store_file
+        
+    Returns:
+        set: Keys that were deleted
+    """
+    storage_keys = list(storage_keys)
+    if not storage_keys:
+        return set()
+    
+    from .drivers import get_driver
+    return get_driver(storage_location).delete_many(storage_keys)
+
+
+def get_storage_key(storage_location, file_url):
+    """
+    Derive the storage key of a file from its URL.
+    
+    Args:
+        storage_location (str): Name of the storage driver
+        file_url (str): URL the file is served from
+        
+    Returns:
+        str: Storage key, or None if unknown
+    """
+    from .drivers import get_driver
+    return get_driver(storage_location).get_storage_key(file_url)
+
+
 def validate_file_type(file):
     """
     Validate if a file type is allowed.
     
+    Only the first few KB of the file are read. When its signature is
+    known, the detected type must be allowed and agree with the declared
+    one, so a renamed executable can't pass as an image.
+    
     Args:
         file: Django UploadedFile object
         
     Returns:
         bool: True if file type is allowed
     """
-    allowed_mime_types = {
-        # Images
-        'image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/bmp',
-        'image/webp', 'image/svg+xml',
-        # Videos
-        'video/mp4', 'video/avi', 'video/mov', 'video/wmv', 'video/flv',
-        'video/webm', 'video/quicktime', 'video/x-msvideo',
-        # Documents
-        'application/pdf',
-        'application/msword',
-        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        'application/vnd.ms-excel',
-        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        'application/vnd.ms-powerpoint',
-        'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-        'text/plain',
-        # Archives
-        'application/zip',
-        'application/x-rar-compressed',
-        'application/x-7z-compressed',
-        'application/x-tar',
-        'application/gzip',
-    }
-    
     mime_type = get_file_mime_type(file)
-    return mime_type in allowed_mime_types
+    if not is_allowed_mime_type(mime_type):
+        return False
+    
+    sniffed = sniff_mime_type(read_file_header(file))
+    if sniffed is None:
+        return True
+    return is_allowed_mime_type(sniffed) and mime_types_agree(mime_type, sniffed)
+
+
+# MIME types accepted for upload
+ALLOWED_MIME_TYPES = frozenset({
+    # Images
+    'image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/bmp',
+    'image/webp', 'image/svg+xml',
+    # Videos
+    'video/mp4', 'video/avi', 'video/mov', 'video/wmv', 'video/flv',
+    'video/webm', 'video/quicktime', 'video/x-msvideo',
+    # Audio
+    'audio/mpeg', 'audio/mp4', 'audio/x-m4a', 'audio/wav', 'audio/x-wav',
+    'audio/ogg',
+    # Documents
+    'application/pdf',
+    'application/msword',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.ms-excel',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.ms-powerpoint',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'text/plain',
+    # Archives
+    'application/zip',
+    'application/x-rar-compressed',
+    'application/x-7z-compressed',
+    'application/x-tar',
+    'application/gzip',
+})
 
 
-def validate_file_size(file, max_size_mb=50):
+def is_allowed_mime_type(mime_type):
+    """
+    Check if a MIME type is allowed for upload.
+    
+    Args:
+        mime_type (str): MIME type to check
+        
+    Returns:
+        bool: True if the MIME type is allowed
+    """
+    return mime_type in ALLOWED_MIME_TYPES
+
+
+def validate_file_size(file, max_size=MAX_UPLOAD_SIZE):
     """
     Validate if a file size is within limits.
     
     Args:
         file: Django UploadedFile object
-        max_size_mb (int): Maximum file size in MB
+        max_size (int): Maximum file size in bytes (FILE_STORAGE_MAX_UPLOAD_SIZE
+                        by default)
         
     Returns:
         bool: True if file size is within limits
     """
-    max_size_bytes = max_size_mb * 1024 * 1024
-    return file.size <= max_size_bytes
+    return file.size <= max_size
 
 
 def get_file_info(file):
@@ -214,6 +551,94 @@ def get_file_info(file):
     }
 
 
+def open_cloudinary_file(public_id):
+    """
+    Open a Cloudinary asset for streaming reads.
+    
+    Assets are uploaded with resource_type "auto", so the delivery URL is
+    tried for each resource type in turn.
+    
+    Args:
+        public_id (str): Cloudinary public ID of the file
+        
+    Returns:
+        File-like object streaming the asset content
+    """
+    for resource_type in ('image', 'video', 'raw'):
+        url, _ = cloudinary.utils.cloudinary_url(
+            public_id, resource_type=resource_type, secure=True
+        )
+        response = get_gateway().open_url(url)
+        if response is not None:
+            return response
+    raise FileNotFoundError(f"Cloudinary asset {public_id} not found")
+
+
+def get_cloudinary_resource_type(mime_type):
+    """Get the Cloudinary resource type an asset of a MIME type is stored as."""
+    if mime_type.startswith('image/'):
+        return 'image'
+    if mime_type.startswith(('video/', 'audio/')):
+        # Cloudinary stores audio as video resources
+        return 'video'
+    return 'raw'
+
+
+def cloudinary_transformation_url(public_id, width, image_format):
+    """
+    Build the delivery URL of a downscaled, re-encoded copy of an image.
+    
+    Cloudinary derives the copy on its first request and caches it, so
+    nothing has to be encoded or uploaded here.
+    
+    Args:
+        public_id (str): Cloudinary public ID of the original image
+        width (int): Width of the copy in pixels (never upscaled)
+        image_format (str): 'webp' or 'jpeg'
+        
+    Returns:
+        str: Transformation URL
+    """
+    url, _ = cloudinary.utils.cloudinary_url(
+        public_id,
+        resource_type='image',
+        type='upload',
+        secure=True,
+        transformation=[{
+            'width': width,
+            'crop': 'limit',
+            'fetch_format': 'jpg' if image_format == 'jpeg' else image_format,
+            'quality': 'auto',
+        }],
+    )
+    return url
+
+
+def cloudinary_signed_download_url(public_id, mime_type, file_url, expires_at):
+    """
+    Build a signed, expiring Cloudinary download URL for an asset.
+    
+    Args:
+        public_id (str): Cloudinary public ID of the file
+        mime_type (str): MIME type of the file
+        file_url (str): Delivery URL of the file (for its format)
+        expires_at (int): Unix timestamp after which the URL stops working
+        
+    Returns:
+        str: Signed download URL
+    """
+    file_format = os.path.splitext(file_url.split('?', 1)[0])[1].lstrip('.')
+    if not file_format:
+        file_format = (mimetypes.guess_extension(mime_type) or '').lstrip('.')
+    return cloudinary.utils.private_download_url(
+        public_id,
+        file_format,
+        resource_type=get_cloudinary_resource_type(mime_type),
+        type='upload',
+        expires_at=expires_at,
+    )
+
+
 def delete_cloudinary_file(public_id):
     """
     Delete a file from Cloudinary.
@@ -225,13 +650,71 @@ def delete_cloudinary_file(public_id):
         bool: True if deletion was successful
     """
     try:
-        result = cloudinary.uploader.destroy(public_id)
+        result = get_gateway().call('destroy', cloudinary.uploader.destroy, public_id)
         return result.get('result') == 'ok'
-    except Exception as e:
-        print(f"Error deleting Cloudinary file {public_id}: {str(e)}")
+    except Exception:
+        logger.exception("Error deleting Cloudinary file %s", public_id)
         return False
 
 
+def delete_cloudinary_files(public_ids):
+    """
+    Delete many files from Cloudinary with the bulk delete API.
+    
+    Args:
+        public_ids (list): Cloudinary public IDs of the files to delete
+        
+    Returns:
+        set: Public IDs that were deleted
+    """
+    deleted = set()
+    public_ids = list(public_ids)
+    for start in range(0, len(public_ids), CLOUDINARY_DELETE_BATCH_SIZE):
+        batch = public_ids[start:start + CLOUDINARY_DELETE_BATCH_SIZE]
+        try:
+            result = get_gateway().call('delete_resources', cloudinary.api.delete_resources, batch)
+        except Exception:
+            logger.exception("Error deleting Cloudinary files %s", batch)
+            continue
+        deleted.update(
+            public_id for public_id, outcome in result.get('deleted', {}).items()
+            if outcome == 'deleted'
+        )
+    return deleted
+
+
+def list_cloudinary_files(prefix):
+    """
+    List the Cloudinary assets whose public ID starts with a prefix.
+    
+    Assets are fetched a page at a time for every resource type, so the
+    listing never has to be held in memory.
+    
+    Args:
+        prefix (str): Public ID prefix (usually the upload folder)
+        
+    Yields:
+        tuple: (public ID, creation datetime) of every asset
+    """
+    for resource_type in ('image', 'video', 'raw'):
+        next_cursor = None
+        while True:
+            options = {
+                'type': 'upload',
+                'resource_type': resource_type,
+                'prefix': prefix,
+                'max_results': CLOUDINARY_LIST_PAGE_SIZE,
+            }
+            if next_cursor:
+                options['next_cursor'] = next_cursor
+            result = get_gateway().call('resources', cloudinary.api.resources, **options)
+            for resource in result.get('resources', []):
+                yield resource['public_id'], parse_datetime(resource.get('created_at') or '')
+            next_cursor = result.get('next_cursor')
+            if not next_cursor:
+                break
+
+
 def delete_local_file(file_path):
     """
     Delete a file from local storage.
@@ -5,38 +5,107 @@ This module contains API views for file upload, retrieval, and management.
 """
 
 import os
-from django.conf import settings
-from django.http import JsonResponse, HttpResponse, Http404
+import json
+import mimetypes
+from datetime import timedelta
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.template.defaultfilters import filesizeformat
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_http_methods
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
-from .models import StoredFile
+from .models import StoredFile, UploadSession, UploadSessionPart
 from .serializers import (
     StoredFileSerializer,
     FileUploadSerializer,
     FileResponseSerializer,
-    FileListSerializer
+    FileListSerializer,
+    UploadSessionCreateSerializer,
+    UploadSessionSerializer,
+    BulkFileSerializer,
+    BulkFileUpdateSerializer,
 )
 from .utils import (
     get_file_mime_type,
     determine_storage_location,
-    generate_local_file_path,
-    upload_to_cloudinary,
-    upload_to_local_storage,
     validate_file_type,
     validate_file_size,
+    is_allowed_mime_type,
     get_file_info,
-    delete_cloudinary_file,
-    delete_local_file,
-    get_cloudinary_public_id_from_url,
+    FileTooLargeError,
+    FileTypeMismatchError,
+    MAX_UPLOAD_SIZE,
 )
+from .streaming import StreamingUpload
+from .drivers import get_driver
+from .background import retry_blob_upload
+from .blobs import store_upload, create_stored_file, delete_stored_file, delete_stored_files
+from .stats import get_file_stats, invalidate_file_stats
+from .gateway import get_gateway
+from .quotas import QuotaExceededError, get_usage, release_quota, reserve_quota
+from .serving import local_file_response, conditional_response, data_etag
+from .signing import get_signed_url, serve_signed_file, SIGNED_URL_TTL
+from .pagination import (
+    InvalidCursorError,
+    after_cursor,
+    encode_cursor,
+    get_page_size,
+    STREAM_CHUNK_SIZE,
+)
+from .upload_sessions import (
+    PartSizeError,
+    PartsReader,
+    write_part,
+    discard_parts,
+    missing_parts,
+    SESSION_CHUNK_SIZE,
+    MAX_SESSION_UPLOAD_SIZE,
+    SESSION_TTL_HOURS,
+)
+
+
+def upload_response(stored_file):
+    """
+    Answer a finished upload.
+    
+    Files whose content has reached its storage are created (201); files
+    still waiting for a background transfer are accepted (202). A file
+    whose transfer already failed is queued for another attempt rather
+    than reported as stored.
+    """
+    if stored_file.status == 'failed':
+        retry_blob_upload(stored_file.blob_id)
+        stored_file.refresh_from_db()
+    
+    if stored_file.status == 'failed':
+        return Response({
+            'success': False,
+            'message': 'File upload failed',
+            'errors': ['The file could not be transferred to storage'],
+            'file_reference': str(stored_file.file_reference),
+        }, status=status.HTTP_502_BAD_GATEWAY)
+    
+    if stored_file.status == 'ready':
+        message, response_status = 'File uploaded successfully', status.HTTP_201_CREATED
+    else:
+        # The transfer to remote storage continues in the background
+        message, response_status = 'File accepted for processing', status.HTTP_202_ACCEPTED
+    return Response({
+        'success': True,
+        'message': message,
+        'file_data': StoredFileSerializer(stored_file).data,
+        'file_reference': str(stored_file.file_reference),
+        'file_url': stored_file.file_url,
+    }, status=response_status)
 
 
 class FileUploadView(APIView):
@@ -85,54 +154,60 @@ class FileUploadView(APIView):
                 return Response({
                     'success': False,
                     'message': 'File size exceeds limit',
-                    'errors': ['File size cannot exceed 50MB']
+                    'errors': [f'File size cannot exceed {MAX_UPLOAD_SIZE // (1024 * 1024)}MB']
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Get file information
             file_info = get_file_info(file)
             mime_type = file_info['mime_type']
-            storage_location = determine_storage_location(mime_type)
+            storage_location = determine_storage_location(mime_type, file.size)
+            
+            # Count the upload against the user's quota before transferring it
+            try:
+                reserve_quota(request.user, file.size)
+            except QuotaExceededError as quota_error:
+                return Response({
+                    'success': False,
+                    'message': 'Storage quota exceeded',
+                    'errors': [str(quota_error)]
+                }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Generate file reference
-            file_reference = None
+            # Stream the file to storage; hashing, size checks and MIME
+            # sniffing happen in the same pass, and content that is already
+            # stored is shared instead of being written again
+            upload = StreamingUpload(file, max_size=MAX_UPLOAD_SIZE)
             
             try:
-                if storage_location == 'cloudinary':
-                    # Upload to Cloudinary
-                    upload_result = upload_to_cloudinary(file)
-                    file_url = upload_result['secure_url']
-                    file_size = upload_result.get('bytes', file.size)
+                try:
+                    blob = store_upload(upload, mime_type, storage_location)
                     
-                else:
-                    # Upload to local storage
-                    file_path = generate_local_file_path(file.name)
-                    file_url = upload_to_local_storage(file, file_path)
-                    file_size = file.size
-                
-                # Create database record
-                stored_file = StoredFile.objects.create(
-                    file_name=file.name,
-                    file_reference=file_reference,
-                    mime_type=mime_type,
-                    storage_location=storage_location,
-                    file_url=file_url,
-                    file_size=file_size,
-                    uploaded_by=request.user,
-                    is_public=is_public,
-                    description=description,
-                )
+                    # Create database record
+                    stored_file = create_stored_file(
+                        blob,
+                        file_name=file.name,
+                        mime_type=mime_type,
+                        uploaded_by=request.user,
+                        is_public=is_public,
+                        description=description,
+                    )
+                except Exception:
+                    release_quota(request.user.pk, file.size)
+                    raise
                 
-                # Serialize the response
-                file_serializer = StoredFileSerializer(stored_file)
+                return upload_response(stored_file)
                 
+            except FileTooLargeError as size_error:
                 return Response({
-                    'success': True,
-                    'message': 'File uploaded successfully',
-                    'file_data': file_serializer.data,
-                    'file_reference': str(stored_file.file_reference),
-                    'file_url': stored_file.file_url,
-                }, status=status.HTTP_201_CREATED)
-                
+                    'success': False,
+                    'message': 'File size exceeds limit',
+                    'errors': [str(size_error)]
+                }, status=status.HTTP_400_BAD_REQUEST)
+            except FileTypeMismatchError as type_error:
+                return Response({
+                    'success': False,
+                    'message': 'File type not allowed',
+                    'errors': [str(type_error)]
+                }, status=status.HTTP_400_BAD_REQUEST)
             except Exception as upload_error:
                 return Response({
                     'success': False,
@@ -154,7 +229,8 @@ def get_file_by_reference(request, file_reference):
     """
     Retrieve file information by file reference.
     
-    Returns file metadata and access URL.
+    Returns file metadata and access URL. Responses carry an ETag and
+    conditional requests are answered with 304 Not Modified.
     """
     try:
         stored_file = get_object_or_404(StoredFile, file_reference=file_reference)
@@ -175,10 +251,18 @@ def get_file_by_reference(request, file_reference):
         
         serializer = StoredFileSerializer(stored_file)
         
-        return Response({
+        # Let clients revalidate cached metadata with If-None-Match
+        etag = data_etag(serializer.data)
+        not_modified = conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        
+        response = Response({
             'success': True,
             'file_data': serializer.data
         }, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        return response
         
     except Http404:
         return Response({
@@ -199,7 +283,9 @@ def serve_file(request, file_reference):
     """
     Serve file content directly.
     
-    For local files, serves the file content.
+    For local files, serves the file content (or hands the transfer to
+    the front proxy when FILE_STORAGE_ACCEL_MODE is set), with ETag /
+    Last-Modified validators, 304 responses and byte-range (206) support.
     For Cloudinary files, redirects to the Cloudinary URL.
     """
     try:
@@ -218,24 +304,26 @@ def serve_file(request, file_reference):
                 'message': 'Access denied'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        if stored_file.storage_location == 'cloudinary':
-            # For Cloudinary files, redirect to the URL
+        if stored_file.status != 'ready':
+            return Response({
+                'success': False,
+                'message': f'File is not available (upload {stored_file.status})'
+            }, status=status.HTTP_409_CONFLICT)
+        
+        driver = get_driver(stored_file.storage_location)
+        if driver.serves_redirect:
+            # For Cloudinary and S3 files, redirect to the URL
             from django.http import HttpResponseRedirect
             return HttpResponseRedirect(stored_file.file_url)
         else:
-            # For local files, serve the file content
-            from django.core.files.storage import default_storage
-            from django.http import FileResponse
-            
+            # For files in a Django storage, serve the file content
             try:
-                # Extract the relative path from the URL
-                file_path = stored_file.file_url.replace(settings.MEDIA_URL, '')
+                file_path = driver.get_storage_key(stored_file.file_url)
                 
-                if default_storage.exists(file_path):
-                    file_obj = default_storage.open(file_path)
-                    response = FileResponse(file_obj, content_type=stored_file.mime_type)
-                    response['Content-Disposition'] = f'inline; filename="{stored_file.file_name}"'
-                    return response
+                if driver.storage.exists(file_path):
+                    return local_file_response(
+                        request, stored_file, file_path, storage=driver.storage
+                    )
                 else:
                     return Response({
                         'success': False,
@@ -262,14 +350,90 @@ def serve_file(request, file_reference):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_signed_file_url(request, file_reference):
+    """
+    Issue a signed, expiring download URL for a file.
+    
+    Access is checked here once; the returned URL can then be fetched
+    without authentication until it expires, straight from Cloudinary or
+    S3, or for local files through SignedFileMiddleware without touching
+    the database. Pass `ttl` (seconds) to shorten the default lifetime.
+    """
+    try:
+        stored_file = get_object_or_404(StoredFile, file_reference=file_reference)
+        
+        # Check access permissions
+        if not stored_file.is_public and not request.user.is_authenticated:
+            return Response({
+                'success': False,
+                'message': 'File is private and requires authentication'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        if not stored_file.is_public and request.user != stored_file.uploaded_by and not request.user.is_staff:
+            return Response({
+                'success': False,
+                'message': 'Access denied'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        if stored_file.status != 'ready':
+            return Response({
+                'success': False,
+                'message': f'File is not available (upload {stored_file.status})'
+            }, status=status.HTTP_409_CONFLICT)
+        
+        ttl = request.GET.get('ttl')
+        try:
+            ttl = int(ttl) if ttl else None
+        except ValueError:
+            ttl = None
+        if ttl is not None and ttl <= 0:
+            ttl = None
+        
+        url, expires_at = get_signed_url(stored_file, ttl=ttl and min(ttl, SIGNED_URL_TTL))
+        return Response({
+            'success': True,
+            'signed_url': url,
+            'expires_at': expires_at,
+        }, status=status.HTTP_200_OK)
+        
+    except Http404:
+        return Response({
+            'success': False,
+            'message': 'File not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': 'An error occurred',
+            'errors': [str(e)]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def serve_signed(request, token):
+    """
+    Serve a file from a signed URL.
+    
+    Only reached when SignedFileMiddleware isn't installed.
+    """
+    return serve_signed_file(request, token)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_user_files(request):
     """
     List files uploaded by the current user.
+    
+    Results are cursor-paginated, newest first. Pass the returned
+    `next_cursor` as `cursor` to get the next page. With `stream=true`
+    every remaining file is streamed as newline-delimited JSON instead.
     """
     try:
-        files = StoredFile.objects.filter(uploaded_by=request.user)
+        files = StoredFile.objects.filter(
+            uploaded_by=request.user
+        ).select_related('uploaded_by').prefetch_related('blob__renditions')
         
         # Apply filters if provided
         storage_location = request.GET.get('storage_location')
@@ -283,12 +447,35 @@ def list_user_files(request):
         if is_public is not None:
             files = files.filter(is_public=is_public.lower() == 'true')
         
-        serializer = FileListSerializer(files, many=True)
+        try:
+            files = after_cursor(files, request.GET.get('cursor'))
+        except InvalidCursorError as cursor_error:
+            return Response({
+                'success': False,
+                'message': 'Invalid cursor',
+                'errors': [str(cursor_error)]
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if request.GET.get('stream', '').lower() == 'true':
+            return StreamingHttpResponse(
+                stream_file_list(files),
+                content_type='application/x-ndjson'
+            )
+        
+        # Fetch one extra row to know whether there is a next page
+        page_size = get_page_size(request.GET.get('page_size'))
+        page = list(files[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        
+        serializer = FileListSerializer(page, many=True)
         
         return Response({
             'success': True,
             'files': serializer.data,
-            'count': files.count()
+            'count': len(page),
+            'has_more': has_more,
+            'next_cursor': encode_cursor(page[-1]) if has_more else None,
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -299,6 +486,14 @@ def list_user_files(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def stream_file_list(files):
+    """Yield files as NDJSON lines, reading them from a server-side cursor."""
+    for stored_file in files.iterator(chunk_size=STREAM_CHUNK_SIZE):
+        yield json.dumps(
+            FileListSerializer(stored_file).data, cls=DjangoJSONEncoder
+        ) + '\n'
+
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_file(request, file_reference):
@@ -317,18 +512,9 @@ def delete_file(request, file_reference):
                 'message': 'Permission denied'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        # Delete the actual file from storage
-        if stored_file.storage_location == 'cloudinary':
-            public_id = get_cloudinary_public_id_from_url(stored_file.file_url)
-            if public_id:
-                delete_cloudinary_file(public_id)
-        else:
-            # For local files, extract the relative path
-            file_path = stored_file.file_url.replace(settings.MEDIA_URL, '')
-            delete_local_file(file_path)
-        
-        # Delete the database record
-        stored_file.delete()
+        # Delete the database record, and the stored content once no
+        # other file shares it
+        delete_stored_file(stored_file)
         
         return Response({
             'success': True,
@@ -348,37 +534,131 @@ def delete_file(request, file_reference):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def get_bulk_files(request, file_references):
+    """
+    Look up the files of a bulk request in one query.
+    
+    Returns:
+        tuple: (files, references not found, references the user may
+               not modify)
+    """
+    files = list(StoredFile.objects.filter(file_reference__in=file_references))
+    found = {stored_file.file_reference for stored_file in files}
+    not_found = [str(ref) for ref in dict.fromkeys(file_references) if ref not in found]
+    forbidden = [
+        str(stored_file.file_reference) for stored_file in files
+        if request.user.pk != stored_file.uploaded_by_id and not request.user.is_staff
+    ]
+    return files, not_found, forbidden
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_delete_files(request):
+    """
+    Delete many files and their database records.
+    
+    Only the file owner or admin can delete files; if any referenced
+    file belongs to someone else nothing is deleted. Unknown references
+    are reported and skipped.
+    """
+    serializer = BulkFileSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'message': 'Invalid request',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        files, not_found, forbidden = get_bulk_files(
+            request, serializer.validated_data['file_references']
+        )
+        if forbidden:
+            return Response({
+                'success': False,
+                'message': 'Permission denied',
+                'errors': forbidden
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        delete_stored_files(files)
+        
+        return Response({
+            'success': True,
+            'message': f'{len(files)} files deleted successfully',
+            'deleted': [str(stored_file.file_reference) for stored_file in files],
+            'not_found': not_found
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': 'An error occurred',
+            'errors': [str(e)]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def bulk_update_files(request):
+    """
+    Update the metadata (is_public, description) of many files at once.
+    
+    Only the file owner or admin can update files; if any referenced
+    file belongs to someone else nothing is changed.
+    """
+    serializer = BulkFileUpdateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'message': 'Invalid request',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        changes = dict(serializer.validated_data)
+        files, not_found, forbidden = get_bulk_files(
+            request, changes.pop('file_references')
+        )
+        if forbidden:
+            return Response({
+                'success': False,
+                'message': 'Permission denied',
+                'errors': forbidden
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        updated = StoredFile.objects.filter(
+            pk__in=[stored_file.pk for stored_file in files]
+        ).update(**changes)
+        # QuerySet.update() doesn't send post_save
+        invalidate_file_stats()
+        
+        return Response({
+            'success': True,
+            'message': f'{updated} files updated successfully',
+            'updated': [str(stored_file.file_reference) for stored_file in files],
+            'not_found': not_found
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': 'An error occurred',
+            'errors': [str(e)]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def file_stats(request):
     """
     Get file storage statistics.
     
-    Returns counts by storage location and file type.
+    Returns counts by storage location and file type. The numbers come
+    from a single aggregate query and are cached for a short time.
     """
     try:
-        stats = {
-            'total_files': StoredFile.objects.count(),
-            'by_storage': {
-                'local': StoredFile.objects.filter(storage_location='local').count(),
-                'cloudinary': StoredFile.objects.filter(storage_location='cloudinary').count(),
-            },
-            'by_type': {
-                'images': StoredFile.objects.filter(mime_type__startswith='image/').count(),
-                'videos': StoredFile.objects.filter(mime_type__startswith='video/').count(),
-                'documents': StoredFile.objects.filter(
-                    mime_type__in=[
-                        'application/pdf',
-                        'application/msword',
-                        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                        'text/plain',
-                    ]
-                ).count(),
-            },
-            'total_size': sum(
-                f.file_size or 0 for f in StoredFile.objects.all()
-            ),
-        }
+        stats = get_file_stats()
         
         return Response({
             'success': True,
@@ -391,3 +671,326 @@ def file_stats(request):
             'message': 'An error occurred',
             'errors': [str(e)]
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cloudinary_metrics(request):
+    """
+    Get Cloudinary request metrics of this process (staff only).
+    
+    Returns per-operation call, error, retry and rate-limit counts and
+    mean/max latency since the process started.
+    """
+    return Response({
+        'success': True,
+        'metrics': get_gateway().metrics()
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def storage_usage(request):
+    """
+    Get the current user's storage usage and quota.
+    """
+    try:
+        return Response({
+            'success': True,
+            'usage': get_usage(request.user)
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': 'An error occurred',
+            'errors': [str(e)]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_upload_session(request):
+    """
+    Open a resumable upload session for a large file.
+    
+    Expected data:
+    - file_name: Name of the file
+    - total_size: Size of the complete file in bytes
+    - mime_type: Optional MIME type (guessed from the name if omitted)
+    - description: Optional description
+    - is_public: Whether file should be public (default: True)
+    """
+    try:
+        serializer = UploadSessionCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'message': 'Invalid session data',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        mime_type = (
+            data.get('mime_type')
+            or mimetypes.guess_type(data['file_name'])[0]
+            or 'application/octet-stream'
+        )
+        
+        if not is_allowed_mime_type(mime_type):
+            return Response({
+                'success': False,
+                'message': 'File type not allowed',
+                'errors': ['Invalid file type']
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if data['total_size'] > MAX_SESSION_UPLOAD_SIZE:
+            return Response({
+                'success': False,
+                'message': 'File size exceeds limit',
+                'errors': [f'File size cannot exceed {MAX_SESSION_UPLOAD_SIZE // (1024 * 1024)}MB']
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Fail early; the quota is only reserved when the session completes
+        usage = get_usage(request.user)
+        if usage['quota_bytes'] is not None and usage['bytes_used'] + data['total_size'] > usage['quota_bytes']:
+            return Response({
+                'success': False,
+                'message': 'Storage quota exceeded',
+                'errors': [f"Storage quota exceeded ({filesizeformat(usage['quota_bytes'])})"]
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        session = UploadSession.objects.create(
+            file_name=data['file_name'],
+            mime_type=mime_type,
+            total_size=data['total_size'],
+            chunk_size=SESSION_CHUNK_SIZE,
+            is_public=data.get('is_public', True),
+            description=data.get('description', ''),
+            created_by=request.user,
+            expires_at=timezone.now() + timedelta(hours=SESSION_TTL_HOURS),
+        )
+        
+        return Response({
+            'success': True,
+            'message': 'Upload session created',
+            'session': UploadSessionSerializer(session).data
+        }, status=status.HTTP_201_CREATED)
+        
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': 'An error occurred',
+            'errors': [str(e)]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def upload_session_detail(request, session_id):
+    """
+    Get the state of an upload session, or abort it.
+    
+    GET lists the parts received so far so an interrupted upload can be
+    resumed. DELETE aborts the session and discards its parts.
+    """
+    try:
+        session = get_object_or_404(
+            UploadSession, session_id=session_id, created_by=request.user
+        )
+        
+        if request.method == 'DELETE':
+            if session.status == 'completing':
+                return Response({
+                    'success': False,
+                    'message': 'Upload session is being completed'
+                }, status=status.HTTP_409_CONFLICT)
+            
+            if session.status == 'open':
+                session.status = 'aborted'
+                session.save(update_fields=['status'])
+                discard_parts(session)
+            
+            return Response({
+                'success': True,
+                'message': 'Upload session aborted'
+            }, status=status.HTTP_200_OK)
+        
+        return Response({
+            'success': True,
+            'session': UploadSessionSerializer(session).data
+        }, status=status.HTTP_200_OK)
+        
+    except Http404:
+        return Response({
+            'success': False,
+            'message': 'Upload session not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': 'An error occurred',
+            'errors': [str(e)]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def upload_session_part(request, session_id, part_number):
+    """
+    Upload a single numbered part of an upload session.
+    
+    The request body is the raw bytes of the part. Parts can be sent in
+    any order and in parallel; re-sending a part replaces it.
+    """
+    try:
+        session = get_object_or_404(
+            UploadSession, session_id=session_id, created_by=request.user
+        )
+        
+        if session.status != 'open' or session.expires_at <= timezone.now():
+            return Response({
+                'success': False,
+                'message': 'Upload session is no longer open'
+            }, status=status.HTTP_409_CONFLICT)
+        
+        if not 1 <= part_number <= session.total_parts:
+            return Response({
+                'success': False,
+                'message': 'Invalid part number',
+                'errors': [f'Part number must be between 1 and {session.total_parts}']
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            size, checksum = write_part(session, part_number, request.stream)
+        except PartSizeError as size_error:
+            return Response({
+                'success': False,
+                'message': 'Invalid part size',
+                'errors': [str(size_error)]
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        UploadSessionPart.objects.update_or_create(
+            session=session,
+            part_number=part_number,
+            defaults={'size': size, 'checksum': checksum},
+        )
+        
+        return Response({
+            'success': True,
+            'part_number': part_number,
+            'size': size,
+            'checksum': checksum,
+        }, status=status.HTTP_200_OK)
+        
+    except Http404:
+        return Response({
+            'success': False,
+            'message': 'Upload session not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': 'An error occurred',
+            'errors': [str(e)]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def complete_upload_session(request, session_id):
+    """
+    Assemble the parts of an upload session into a stored file.
+    
+    The parts are streamed to storage one after another, so the file is
+    never loaded into memory as a whole.
+    """
+    try:
+        session = get_object_or_404(
+            UploadSession, session_id=session_id, created_by=request.user
+        )
+        
+        if session.status != 'open' or session.expires_at <= timezone.now():
+            return Response({
+                'success': False,
+                'message': 'Upload session is no longer open'
+            }, status=status.HTTP_409_CONFLICT)
+        
+        missing = missing_parts(session)
+        if missing:
+            return Response({
+                'success': False,
+                'message': 'Upload session is missing parts',
+                'errors': [f'Missing parts: {missing}']
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Claim the session so concurrent completions don't store it twice
+        claimed = UploadSession.objects.filter(
+            pk=session.pk, status='open', expires_at__gt=timezone.now()
+        ).update(status='completing')
+        if not claimed:
+            return Response({
+                'success': False,
+                'message': 'Upload session is no longer open'
+            }, status=status.HTTP_409_CONFLICT)
+        
+        try:
+            reserve_quota(request.user, session.total_size)
+        except QuotaExceededError as quota_error:
+            UploadSession.objects.filter(pk=session.pk).update(status='open')
+            return Response({
+                'success': False,
+                'message': 'Storage quota exceeded',
+                'errors': [str(quota_error)]
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        storage_location = determine_storage_location(session.mime_type, session.total_size)
+        upload = StreamingUpload(PartsReader(session), max_size=session.total_size)
+        
+        try:
+            try:
+                blob = store_upload(upload, session.mime_type, storage_location)
+            except FileTypeMismatchError as type_error:
+                release_quota(request.user.pk, session.total_size)
+                UploadSession.objects.filter(pk=session.pk).update(status='aborted')
+                discard_parts(session)
+                return Response({
+                    'success': False,
+                    'message': 'File type not allowed',
+                    'errors': [str(type_error)]
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            with transaction.atomic():
+                stored_file = create_stored_file(
+                    blob,
+                    file_name=session.file_name,
+                    mime_type=session.mime_type,
+                    uploaded_by=request.user,
+                    is_public=session.is_public,
+                    description=session.description,
+                )
+                session.stored_file = stored_file
+                session.status = 'completed'
+                session.save(update_fields=['stored_file', 'status'])
+            
+        except Exception:
+            # Leave the session open so the client can retry completion
+            release_quota(request.user.pk, session.total_size)
+            UploadSession.objects.filter(pk=session.pk).update(status='open')
+            raise
+        
+        discard_parts(session)
+        
+        return upload_response(stored_file)
+        
+    except Http404:
+        return Response({
+            'success': False,
+            'message': 'Upload session not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': 'File upload failed',
+            'errors': [str(e)]
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,212 @@
+"""
+Sermon Audio Metadata
+
+This module reads duration, bitrate and codec from sermon audio files.
+Remote files (Cloudinary) are read through HTTPRangeFile, which fetches
+only the byte ranges mutagen asks for (headers, the first frames, the
+trailing tags) instead of downloading the whole recording.
+
+Nothing here touches Django, so extract_audio_metadata can run in the
+worker processes of a ProcessPoolExecutor.
+"""
+
+import io
+import re
+
+import mutagen
+import urllib3
+
+# Bytes fetched per range request; mutagen's reads are small and local
+RANGE_BLOCK_SIZE = 64 * 1024
+
+# Codec names for formats whose stream info doesn't carry one
+CODECS = {
+    'MP3': 'mp3',
+    'WAVE': 'pcm',
+    'AIFF': 'pcm',
+    'FLAC': 'flac',
+    'OggVorbis': 'vorbis',
+    'OggOpus': 'opus',
+    'OggFLAC': 'flac',
+    'OggSpeex': 'speex',
+    'ASF': 'wma',
+}
+
+CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+_http = None
+
+
+def get_http():
+    """Get this process's connection pool, creating it on first use."""
+    global _http
+    if _http is None:
+        _http = urllib3.PoolManager(
+            retries=urllib3.Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)),
+            timeout=urllib3.Timeout(connect=5, read=30),
+        )
+    return _http
+
+
+class AudioMetadataError(Exception):
+    """Raised when an audio file's metadata can't be read."""
+
+
+class AudioFetchError(AudioMetadataError):
+    """Raised when an audio file can't be fetched (worth retrying)."""
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """
+    Read-only, seekable file over an HTTP URL.
+
+    Reads are served from blocks of RANGE_BLOCK_SIZE bytes fetched with
+    Range requests and kept for the lifetime of the object, so mutagen
+    can seek around the file while only the regions it touches are
+    downloaded. Servers that ignore Range get one full download.
+    """
+
+    def __init__(self, url, block_size=RANGE_BLOCK_SIZE, http=None):
+        super().__init__()
+        self.url = url
+        self.block_size = block_size
+        self.http = http or get_http()
+        self.position = 0
+        self.size = None
+        self.bytes_fetched = 0
+        self._blocks = {}
+        # The first request also tells us the size of the file
+        self._fetch(0, 0)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if position < 0:
+            raise OSError("Negative seek position")
+        self.position = position
+        return position
+
+    def readinto(self, buffer):
+        end = min(self.position + len(buffer), self.size)
+        if end <= self.position:
+            return 0
+
+        first, last = self.position // self.block_size, (end - 1) // self.block_size
+        missing = [index for index in range(first, last + 1) if index not in self._blocks]
+        if missing:
+            # One request for the whole span of missing blocks
+            self._fetch(missing[0], missing[-1])
+
+        data = b''.join(self._blocks[index] for index in range(first, last + 1))
+        offset = self.position - first * self.block_size
+        count = end - self.position
+        buffer[:count] = data[offset:offset + count]
+        self.position = end
+        return count
+
+    def _fetch(self, first, last):
+        """Fetch blocks first..last (inclusive) into the block cache."""
+        start = first * self.block_size
+        stop = (last + 1) * self.block_size - 1
+        if self.size is not None:
+            stop = min(stop, self.size - 1)
+
+        try:
+            response = self.http.request(
+                'GET', self.url, headers={'Range': f'bytes={start}-{stop}'}
+            )
+        except urllib3.exceptions.HTTPError as e:
+            raise AudioFetchError(f"Fetching {self.url} failed: {e}") from e
+
+        if response.status == 416 and start == 0:
+            # Empty file
+            self.size = 0
+            return
+        if response.status == 206:
+            match = CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+            if match and match.group(3) != '*':
+                self.size = int(match.group(3))
+        elif response.status == 200:
+            # Range not supported: the body is the whole file
+            self.size = len(response.data)
+            start = 0
+        elif response.status >= 500 or response.status == 429:
+            raise AudioFetchError(f"HTTP {response.status} for {self.url}")
+        else:
+            raise AudioMetadataError(f"HTTP {response.status} for {self.url}")
+
+        data = response.data
+        self.bytes_fetched += len(data)
+        if self.size is None:
+            self.size = start + len(data)
+        for offset in range(0, len(data), self.block_size):
+            self._blocks[(start + offset) // self.block_size] = data[offset:offset + self.block_size]
+        # Blocks past the end of the file read as empty
+        last_block = max(self.size - 1, 0) // self.block_size
+        for index in range(first, last + 1):
+            if index > last_block:
+                self._blocks[index] = b''
+
+
+def open_audio(location):
+    """Open a local path or an HTTP(S) URL for reading."""
+    if location.startswith(('http://', 'https://')):
+        return io.BufferedReader(HTTPRangeFile(location), buffer_size=RANGE_BLOCK_SIZE)
+    return open(location, 'rb')
+
+
+def extract_audio_metadata(location):
+    """
+    Read an audio file's stream information.
+
+    Args:
+        location (str): Local path or HTTP(S) URL of the file
+
+    Returns:
+        dict: duration (whole seconds), bitrate (bits per second), codec,
+              mime_type and file_size (bytes)
+
+    Raises:
+        AudioFetchError: If the file can't be fetched
+        AudioMetadataError: If the file isn't a recognized audio format
+    """
+    try:
+        with open_audio(location) as fileobj:
+            try:
+                audio = mutagen.File(fileobj)
+            except mutagen.MutagenError as e:
+                # mutagen wraps the errors of the file object it reads
+                if isinstance(e.__context__, AudioFetchError):
+                    raise e.__context__
+                raise AudioMetadataError(f"Unreadable audio file: {e}") from e
+            file_size = fileobj.seek(0, io.SEEK_END)
+    except OSError as e:
+        raise AudioFetchError(f"Opening {location} failed: {e}") from e
+
+    if audio is None or audio.info is None:
+        raise AudioMetadataError("Unrecognized audio format")
+
+    info = audio.info
+    codec = getattr(info, 'codec', None) or CODECS.get(type(audio).__name__, '')
+    return {
+        'duration': int(round(getattr(info, 'length', 0) or 0)),
+        'bitrate': int(getattr(info, 'bitrate', 0) or 0),
+        'codec': codec,
+        'mime_type': audio.mime[0] if audio.mime else '',
+        'file_size': file_size,
+    }
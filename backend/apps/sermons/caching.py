@@ -0,0 +1,110 @@
+"""
+Sermon Catalog Caching
+
+This module caches the public (anonymous) responses of the sermon
+catalog: sermon list, detail, recent and featured, and the categories.
+The catalog changes a few times a week but is read constantly, mostly
+by the same few pages on Sunday mornings.
+
+Cached responses are keyed by a catalog version, the path and the
+normalized query parameters. Any change to a sermon or category bumps
+the version (on commit, from the signals and the audio tasks), which
+retires every cached response at once instead of tracking which pages
+a change affects. Cache hits are served without touching the database,
+with an ETag (304 on a match) and a public Cache-Control.
+
+Play, download, like and comment counts are written without bumping
+the version, so cached pages show them up to SERMON_CATALOG_CACHE_TTL
+seconds old. The version lives in the Django cache, which must be
+shared between processes (Redis, Memcached) for bumps to reach them.
+"""
+
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from rest_framework.response import Response
+
+from apps.file_storage.serving import conditional_response, data_etag
+
+CATALOG_VERSION_KEY = 'sermons:catalog_version'
+
+# Seconds a response stays cached (a version bump retires it sooner)
+CATALOG_CACHE_TTL = getattr(settings, 'SERMON_CATALOG_CACHE_TTL', 10 * 60)
+
+# Seconds browsers and shared caches may reuse a response without revalidating
+CATALOG_MAX_AGE = getattr(settings, 'SERMON_CATALOG_MAX_AGE', 60)
+
+
+def get_catalog_version():
+    """Get the current catalog version."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Start from the clock so a version lost from the cache isn't reused
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), None)
+        version = cache.get(CATALOG_VERSION_KEY, int(time.time()))
+    return version
+
+
+def bump_catalog_version():
+    """Retire every cached catalog response."""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, int(time.time()), None)
+
+
+def catalog_changed():
+    """Bump the catalog version once the current transaction commits."""
+    transaction.on_commit(bump_catalog_version)
+
+
+def catalog_cache_key(request):
+    """Build the cache key of a catalog response."""
+    query = urlencode(sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+        if value != ''
+    ))
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'sermons:catalog:{get_catalog_version()}:{digest}'
+
+
+def catalog_cached(view_method):
+    """
+    Serve a read-only catalog view from the cache for anonymous users.
+
+    Authenticated users (staff see unpublished sermons) always get a
+    fresh, private response.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            response = view_method(self, request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+            return response
+
+        key = catalog_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            etag = data_etag(data)
+            cache.set(key, (data, etag), CATALOG_CACHE_TTL)
+        else:
+            data, etag = cached
+
+        response = conditional_response(request, etag) or Response(data)
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=CATALOG_MAX_AGE)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+    return wrapper
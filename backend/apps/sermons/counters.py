@@ -0,0 +1,182 @@
+"""
+Sermon Counters
+
+This module maintains the counter columns of Sermon.
+
+Like and comment counts are denormalized from SermonLike/SermonComment:
+the signals adjust them in the transaction that adds or removes the row,
+so list queries read a column instead of joining and counting, and
+rebuild_counters recomputes them from scratch.
+
+Play and download counts are buffered in memory and written behind:
+increments from every request are summed per sermon, and a flusher
+thread writes them every SERMON_COUNTER_FLUSH_INTERVAL seconds as a
+single UPDATE ... CASE statement. A popular sermon then costs one
+row update per interval instead of one per play, and updated_at is left
+alone.
+
+Buffers are per process; reads merge the deltas still buffered in the
+current process. Buffered increments are lost if the process is killed
+(processes that buffered any are flushed on normal exit).
+"""
+
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes (0 writes every increment through immediately)
+FLUSH_INTERVAL = getattr(settings, 'SERMON_COUNTER_FLUSH_INTERVAL', 10)
+
+# Buffered sermons that trigger an early flush
+MAX_PENDING = getattr(settings, 'SERMON_COUNTER_MAX_PENDING', 1000)
+
+# Sermons per UPDATE statement
+FLUSH_BATCH_SIZE = 500
+
+COUNTER_FIELDS = ('play_count', 'download_count')
+
+
+class CounterBuffer:
+    """Per-process write-behind buffer of sermon counter increments."""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._deltas = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._exit_flush_registered = False
+
+    def increment(self, sermon_id, field, amount=1):
+        """Buffer an increment of one of a sermon's counters."""
+        if field not in COUNTER_FIELDS:
+            raise ValueError(f"Unknown counter: {field}")
+        with self._lock:
+            self._deltas[sermon_id][field] += amount
+            pending = len(self._deltas)
+
+        if not self.flush_interval:
+            self.flush()
+            return
+        self._ensure_flusher()
+        if pending >= self.max_pending:
+            self._wake.set()
+
+    def pending(self, sermon_id):
+        """Get the buffered deltas of a sermon (field -> amount)."""
+        with self._lock:
+            deltas = self._deltas.get(sermon_id)
+            return dict(deltas) if deltas else dict.fromkeys(COUNTER_FIELDS, 0)
+
+    def flush(self):
+        """
+        Write the buffered increments to the database.
+
+        Returns:
+            int: Number of sermons updated
+        """
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._deltas = self._deltas, defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+            if not deltas:
+                return 0
+
+            sermon_ids = list(deltas)
+            start = 0
+            try:
+                from .models import Sermon
+
+                for start in range(0, len(sermon_ids), FLUSH_BATCH_SIZE):
+                    batch = sermon_ids[start:start + FLUSH_BATCH_SIZE]
+                    updates = {}
+                    for field in COUNTER_FIELDS:
+                        whens = [
+                            When(pk=sermon_id, then=Value(deltas[sermon_id][field]))
+                            for sermon_id in batch if deltas[sermon_id][field]
+                        ]
+                        if whens:
+                            updates[field] = F(field) + Case(*whens, default=Value(0))
+                    # .update() doesn't touch updated_at
+                    Sermon.objects.filter(pk__in=batch).update(**updates)
+            except Exception:
+                logger.exception("Flushing sermon counters failed, keeping them buffered")
+                self._restore(deltas, sermon_ids[start:])
+                return start
+            return len(sermon_ids)
+
+    def _restore(self, deltas, sermon_ids):
+        """Put deltas that couldn't be written back into the buffer."""
+        with self._lock:
+            for sermon_id in sermon_ids:
+                for field, amount in deltas[sermon_id].items():
+                    self._deltas[sermon_id][field] += amount
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='sermon-counters', daemon=True
+                )
+                self._thread.start()
+            # Only processes that buffered something flush on exit
+            if not self._exit_flush_registered:
+                atexit.register(self.flush)
+                self._exit_flush_registered = True
+
+    def _run(self):
+        """Flusher thread: flush every interval, or early when woken."""
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+counter_buffer = CounterBuffer()
+
+
+def adjust_counter(sermon_id, field, amount):
+    """
+    Add to (or subtract from) a denormalized counter of a sermon.
+
+    Run it in the transaction that creates or deletes the counted row.
+    """
+    from .models import Sermon
+
+    Sermon.objects.filter(pk=sermon_id).update(**{field: Greatest(F(field) + amount, Value(0))})
+
+
+def rebuild_counters():
+    """
+    Recompute every sermon's like and comment counts.
+
+    Returns:
+        int: Number of sermons updated
+    """
+    from .models import Sermon, SermonComment, SermonLike
+
+    def count_of(model):
+        return Subquery(
+            model.objects.filter(sermon=OuterRef('pk')).order_by().values('sermon').annotate(
+                total=Count('pk')
+            ).values('total')
+        )
+
+    return Sermon.objects.update(
+        like_count=Coalesce(count_of(SermonLike), 0),
+        comment_count=Coalesce(count_of(SermonComment), 0),
+    )
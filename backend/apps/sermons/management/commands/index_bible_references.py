@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from apps.sermons.models import Sermon
+from apps.sermons.scripture import index_bible_references
+
+
+class Command(BaseCommand):
+    help = 'Parses the Bible references of every sermon into the scripture index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Sermons indexed per batch (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Indexing sermon Bible references...'))
+
+        sermons = Sermon.objects.order_by('pk').only('pk', 'bible_references')
+        sermon_count = sermons.count()
+        batch_size = options['batch_size']
+        row_count = 0
+
+        last_pk = 0
+        while True:
+            batch = list(sermons.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            row_count += index_bible_references(batch)
+            last_pk = batch[-1].pk
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished indexing {sermon_count} sermons into {row_count} chapter ranges.'
+        ))
@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand
+from apps.sermons.models import Sermon
+from apps.sermons.tasks import (
+    AUDIO_BATCH_SIZE,
+    generate_renditions,
+    generate_waveforms,
+    get_process_pool,
+    process_audio_files,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Extracts duration, bitrate and codec for sermons whose audio has not been '
+        'processed, and optionally computes missing waveforms and renditions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Reprocess every sermon with an audio file, not only pending and failed ones',
+        )
+        parser.add_argument(
+            '--waveforms',
+            action='store_true',
+            help='Also compute waveform peaks for sermons without one (all of them with --all)',
+        )
+        parser.add_argument(
+            '--renditions',
+            action='store_true',
+            help='Also render the bitrate ladder for sermons without renditions (all of them with --all)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=AUDIO_BATCH_SIZE,
+            help=f'Sermons extracted and saved per batch (default: {AUDIO_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Starting sermon audio processing...'))
+
+        sermons = Sermon.objects.exclude(audio_file__isnull=True).exclude(audio_file='')
+        if not options['all']:
+            sermons = sermons.filter(processing_status__in=['pending', 'failed'])
+        sermon_ids = list(sermons.order_by('pk').values_list('pk', flat=True))
+
+        batch_size = options['batch_size']
+        pool = get_process_pool()
+        processed_count = 0
+
+        for start in range(0, len(sermon_ids), batch_size):
+            batch = sermon_ids[start:start + batch_size]
+            processed_count += process_audio_files(batch, pool)
+            self.stdout.write(f"Processed {min(start + batch_size, len(sermon_ids))}/{len(sermon_ids)} sermons")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished sermon audio processing. {processed_count} processed, '
+            f'{len(sermon_ids) - processed_count} failed.'
+        ))
+
+        if options['waveforms']:
+            self.generate_waveforms(options['all'], batch_size, pool)
+        if options['renditions']:
+            self.generate_renditions(options['all'], batch_size)
+
+    def generate_waveforms(self, regenerate, batch_size, pool):
+        self.stdout.write(self.style.SUCCESS('Starting waveform generation...'))
+
+        sermons = Sermon.objects.exclude(audio_file__isnull=True).exclude(audio_file='')
+        if not regenerate:
+            sermons = sermons.filter(waveform__isnull=True)
+        sermon_ids = list(sermons.order_by('pk').values_list('pk', flat=True))
+
+        generated_count = 0
+        for start in range(0, len(sermon_ids), batch_size):
+            generated_count += generate_waveforms(sermon_ids[start:start + batch_size], pool)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished waveform generation. {generated_count} generated, '
+            f'{len(sermon_ids) - generated_count} failed.'
+        ))
+
+    def generate_renditions(self, regenerate, batch_size):
+        self.stdout.write(self.style.SUCCESS('Starting rendition generation...'))
+
+        sermons = Sermon.objects.exclude(audio_file__isnull=True).exclude(audio_file='')
+        if not regenerate:
+            sermons = sermons.filter(renditions__isnull=True)
+        sermon_ids = list(sermons.order_by('pk').values_list('pk', flat=True).distinct())
+
+        rendered_count = 0
+        for start in range(0, len(sermon_ids), batch_size):
+            rendered_count += generate_renditions(sermon_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished rendition generation. {rendered_count} rendered, '
+            f'{len(sermon_ids) - rendered_count} failed.'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.sermons.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the like and comment counters of every sermon.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Rebuilding sermon counters...'))
+        sermon_count = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished rebuilding counters for {sermon_count} sermons.'
+        ))
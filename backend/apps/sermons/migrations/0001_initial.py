@@ -3,7 +3,6 @@
 import cloudinary.models
 from django.db import migrations, models
 import django.db.models.deletion
-import uuid
 
 
 class Migration(migrations.Migration):
@@ -17,7 +16,7 @@ class Migration(migrations.Migration):
         migrations.CreateModel(
             name='Playlist',
             fields=[
-                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
                 ('updated_at', models.DateTimeField(auto_now=True)),
                 ('name', models.CharField(max_length=100)),
@@ -35,7 +34,7 @@ class Migration(migrations.Migration):
         migrations.CreateModel(
             name='SermonCategory',
             fields=[
-                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
                 ('updated_at', models.DateTimeField(auto_now=True)),
                 ('name', models.CharField(max_length=100, unique=True)),
@@ -54,30 +53,34 @@ class Migration(migrations.Migration):
         migrations.CreateModel(
             name='Sermon',
             fields=[
-                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
                 ('created_at', models.DateTimeField(auto_now_add=True)),
                 ('updated_at', models.DateTimeField(auto_now=True)),
                 ('title', models.CharField(max_length=200)),
+                ('slug', models.SlugField(blank=True, max_length=200, unique=True)),
+                ('sermon_type', models.CharField(choices=[('sermon', 'Sermon'), ('bible_study', 'Bible Study'), ('devotional', 'Devotional')], default='sermon', help_text='Type of audio content', max_length=20)),
                 ('preacher', models.CharField(max_length=100)),
                 ('sermon_date', models.DateField(help_text='Date the sermon was delivered')),
-                ('duration', models.IntegerField(default=0, help_text='Duration in seconds')),
-                ('audio_file', cloudinary.models.CloudinaryField(blank=True, help_text='Upload the audio file', max_length=255, null=True, verbose_name='sermon_audio')),
+                ('duration', models.PositiveIntegerField(default=0, help_text='Duration in seconds')),
+                ('audio_file', cloudinary.models.CloudinaryField(blank=True, help_text='Upload audio file (MP3, WAV, M4A, OGG). Max 100MB', max_length=255, null=True, verbose_name='sermon_audio')),
+                ('file_size', models.PositiveBigIntegerField(default=0, help_text='File size in bytes')),
+                ('mime_type', models.CharField(blank=True, help_text='Detected MIME type of the audio file', max_length=100)),
                 ('soundcloud_embed', models.URLField(blank=True, help_text='SoundCloud embed URL if hosted externally')),
-                ('thumbnail', cloudinary.models.CloudinaryField(blank=True, help_text='Custom thumbnail image for the sermon', max_length=255, null=True, verbose_name='sermon_thumbnails')),
+                ('thumbnail', cloudinary.models.CloudinaryField(blank=True, help_text='Custom thumbnail image for the sermon (16:9 aspect ratio recommended)', max_length=255, null=True, verbose_name='sermon_thumbnails')),
                 ('bible_references', models.TextField(blank=True, help_text='Bible references (e.g., John 3:16-17, Romans 8:28-30)')),
                 ('description', models.TextField(blank=True, help_text='Detailed description or notes about the sermon')),
-                ('play_count', models.IntegerField(default=0, help_text='Number of times the sermon has been played')),
-                ('download_count', models.IntegerField(default=0, help_text='Number of times the sermon has been downloaded')),
+                ('play_count', models.PositiveIntegerField(default=0, help_text='Number of times the sermon has been played')),
+                ('download_count', models.PositiveIntegerField(default=0, help_text='Number of times the sermon has been downloaded')),
                 ('is_featured', models.BooleanField(default=False, help_text='Featured sermons appear in prominent sections')),
-                ('order', models.IntegerField(default=0, help_text='Order in which the sermon appears in listings')),
+                ('order', models.PositiveIntegerField(default=0, help_text='Order in which the sermon appears in listings')),
                 ('is_published', models.BooleanField(default=True, help_text='Whether the sermon is published and visible to users')),
+                ('processing_status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', help_text='Current status of audio processing', max_length=20)),
+                ('processing_errors', models.TextField(blank=True, help_text='Any errors that occurred during processing')),
                 ('category', models.ForeignKey(blank=True, help_text='The category this sermon belongs to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sermons', to='sermons.sermoncategory')),
                 ('playlist', models.ForeignKey(blank=True, help_text='The playlist this sermon belongs to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sermons', to='sermons.playlist')),
             ],
             options={
-                'verbose_name': 'Sermon',
-                'verbose_name_plural': 'Sermons',
-                'ordering': ['-sermon_date', 'order'],
+                'abstract': False,
             },
         ),
     ]
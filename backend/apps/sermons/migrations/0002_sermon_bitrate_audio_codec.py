@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sermons', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sermon',
+            name='bitrate',
+            field=models.PositiveIntegerField(default=0, help_text='Audio bitrate in bits per second'),
+        ),
+        migrations.AddField(
+            model_name='sermon',
+            name='audio_codec',
+            field=models.CharField(blank=True, help_text='Audio codec (e.g. mp3, mp4a.40.2, opus)', max_length=50),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sermons', '0002_sermon_bitrate_audio_codec'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SermonWaveform',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('sermon', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='waveform', serialize=False, to='sermons.sermon')),
+                ('buckets', models.PositiveIntegerField(help_text='Number of min/max pairs in peaks')),
+                ('peaks', models.BinaryField(help_text='Interleaved int8 min/max pairs')),
+            ],
+            options={
+                'verbose_name': 'Sermon Waveform',
+                'verbose_name_plural': 'Sermon Waveforms',
+            },
+        ),
+    ]
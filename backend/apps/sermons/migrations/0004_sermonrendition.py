@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sermons', '0003_sermonwaveform'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SermonRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('format', models.CharField(choices=[('mp3', 'MP3'), ('m3u8', 'HLS')], max_length=10)),
+                ('bitrate', models.PositiveIntegerField(help_text='Bitrate in kbps')),
+                ('url', models.CharField(max_length=500)),
+                ('sermon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='sermons.sermon')),
+            ],
+            options={
+                'verbose_name': 'Sermon Rendition',
+                'verbose_name_plural': 'Sermon Renditions',
+                'ordering': ['format', 'bitrate'],
+                'unique_together': {('sermon', 'format', 'bitrate')},
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sermons', '0004_sermonrendition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sermon',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of likes'),
+        ),
+        migrations.AddField(
+            model_name='sermon',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of comments'),
+        ),
+        migrations.CreateModel(
+            name='SermonLike',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('sermon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='sermons.sermon')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sermon_likes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sermon Like',
+                'verbose_name_plural': 'Sermon Likes',
+                'unique_together': {('sermon', 'user')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SermonComment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content', models.TextField()),
+                ('sermon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='sermons.sermon')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sermon_comments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sermon Comment',
+                'verbose_name_plural': 'Sermon Comments',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,99 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The SQL is spelled out here rather than imported, so this migration
+# keeps doing what it did when it was written.
+POSTGRES_INSTALL = [
+    """
+    CREATE OR REPLACE FUNCTION sermons_sermon_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.preacher, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.bible_references, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER sermons_sermon_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, preacher, bible_references, description
+    ON sermons_sermon
+    FOR EACH ROW EXECUTE FUNCTION sermons_sermon_search_vector_update()
+    """,
+    # Fire the trigger once for existing rows
+    "UPDATE sermons_sermon SET title = title",
+    "CREATE INDEX sermons_sermon_search_vector_idx ON sermons_sermon USING GIN (search_vector)",
+]
+
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS sermons_sermon_search_vector_idx",
+    "DROP TRIGGER IF EXISTS sermons_sermon_search_vector_trigger ON sermons_sermon",
+    "DROP FUNCTION IF EXISTS sermons_sermon_search_vector_update()",
+]
+
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE sermons_sermon_fts USING fts5(
+        title, preacher, bible_references, description,
+        content='sermons_sermon', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER sermons_sermon_fts_insert AFTER INSERT ON sermons_sermon BEGIN
+        INSERT INTO sermons_sermon_fts(rowid, title, preacher, bible_references, description)
+        VALUES (new.id, new.title, new.preacher, new.bible_references, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER sermons_sermon_fts_delete AFTER DELETE ON sermons_sermon BEGIN
+        INSERT INTO sermons_sermon_fts(sermons_sermon_fts, rowid, title, preacher, bible_references, description)
+        VALUES ('delete', old.id, old.title, old.preacher, old.bible_references, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER sermons_sermon_fts_update AFTER UPDATE OF title, preacher, bible_references, description
+    ON sermons_sermon BEGIN
+        INSERT INTO sermons_sermon_fts(sermons_sermon_fts, rowid, title, preacher, bible_references, description)
+        VALUES ('delete', old.id, old.title, old.preacher, old.bible_references, old.description);
+        INSERT INTO sermons_sermon_fts(rowid, title, preacher, bible_references, description)
+        VALUES (new.id, new.title, new.preacher, new.bible_references, new.description);
+    END
+    """,
+    "INSERT INTO sermons_sermon_fts(sermons_sermon_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS sermons_sermon_fts_insert",
+    "DROP TRIGGER IF EXISTS sermons_sermon_fts_delete",
+    "DROP TRIGGER IF EXISTS sermons_sermon_fts_update",
+    "DROP TABLE IF EXISTS sermons_sermon_fts",
+]
+
+
+def run(statements_by_vendor):
+    def run_statements(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run_statements
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sermons', '0005_sermon_counters_likes_comments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sermon',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Other databases fall back to ILIKE search
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_INSTALL, 'sqlite': SQLITE_INSTALL}),
+            run({'postgresql': POSTGRES_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}),
+        ),
+    ]
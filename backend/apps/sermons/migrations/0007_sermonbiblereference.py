@@ -0,0 +1,56 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Spelled out rather than imported, so this migration keeps doing what it
+# did when it was written. The expression matches scripture.verse_span().
+POSTGRES_INSTALL = [
+    """
+    CREATE INDEX sermons_bibleref_span_idx ON sermons_sermonbiblereference USING GIST (
+        int4range(
+            book * 1000000 + chapter * 1000 + verse_start,
+            book * 1000000 + chapter * 1000 + verse_end,
+            '[]'
+        )
+    )
+    """,
+]
+
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS sermons_bibleref_span_idx",
+]
+
+
+def run(statements):
+    # Elsewhere the B-tree index is used
+    def run_statements(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run_statements
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sermons', '0006_sermon_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SermonBibleReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book', models.PositiveSmallIntegerField(help_text='Book in canonical order (1 = Genesis)')),
+                ('chapter', models.PositiveSmallIntegerField()),
+                ('verse_start', models.PositiveSmallIntegerField()),
+                ('verse_end', models.PositiveSmallIntegerField(help_text='999 for the end of the chapter')),
+                ('sermon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scripture_ranges', to='sermons.sermon')),
+            ],
+            options={
+                'verbose_name': 'Sermon Bible Reference',
+                'verbose_name_plural': 'Sermon Bible References',
+                'indexes': [models.Index(fields=['book', 'chapter', 'verse_start', 'verse_end'], name='sermons_bibleref_verses_idx')],
+            },
+        ),
+        migrations.RunPython(run(POSTGRES_INSTALL), run(POSTGRES_UNINSTALL)),
+    ]
@@ -1,8 +1,45 @@
 import os
+from functools import lru_cache
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.text import slugify
 from cloudinary.models import CloudinaryField
-from apps.core.models import TimeStampedField
+import cloudinary.utils
+
+
+@lru_cache(maxsize=4096)
+def _build_resource_url(public_id, resource_type, delivery_type, version, file_format):
+    url, _ = cloudinary.utils.cloudinary_url(
+        public_id,
+        resource_type=resource_type,
+        type=delivery_type,
+        version=version,
+        format=file_format,
+    )
+    return url
+
+
+def resource_url(resource):
+    """
+    Get the delivery URL of a Cloudinary resource, memoized.
+
+    A list page builds the same few URLs over and over (and the version
+    changes whenever the file does), so they are built once per process.
+    """
+    if not resource:
+        return None
+    if resource.url_options:
+        return resource.url
+    return _build_resource_url(
+        resource.public_id,
+        resource.resource_type or 'image',
+        resource.type,
+        resource.version,
+        resource.format,
+    )
+
 
 class TimeStampedModel(models.Model):
     """Abstract base class with self-updating created and modified fields."""
@@ -129,6 +166,15 @@ class Sermon(TimeStampedModel):
         blank=True,
         help_text="Detected MIME type of the audio file"
     )
+    bitrate = models.PositiveIntegerField(
+        default=0,
+        help_text="Audio bitrate in bits per second"
+    )
+    audio_codec = models.CharField(
+        max_length=50,
+        blank=True,
+        help_text="Audio codec (e.g. mp3, mp4a.40.2, opus)"
+    )
     
     soundcloud_embed = models.URLField(
         blank=True,
@@ -162,6 +208,16 @@ class Sermon(TimeStampedModel):
         default=0,
         help_text="Number of times the sermon has been downloaded"
     )
+
+    # Denormalized from SermonLike/SermonComment (see apps.sermons.signals)
+    like_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of likes"
+    )
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of comments"
+    )
     
     # Metadata
     is_featured = models.BooleanField(
@@ -195,16 +251,31 @@ class Sermon(TimeStampedModel):
         blank=True,
         help_text="Any errors that occurred during processing"
     )
+
+    # Maintained by a database trigger on PostgreSQL (see apps.sermons.search)
+    search_vector = SearchVectorField(null=True, editable=False)
     
     def increment_play_count(self):
-        """Increment the play count"""
-        self.play_count = models.F('play_count') + 1
-        self.save(update_fields=['play_count', 'updated_at'])
+        """Increment the play count (written behind, see apps.sermons.counters)"""
+        from .counters import counter_buffer
+        counter_buffer.increment(self.pk, 'play_count')
 
     def increment_download_count(self):
-        """Increment the download count"""
-        self.download_count = models.F('download_count') + 1
-        self.save(update_fields=['download_count', 'updated_at'])
+        """Increment the download count (written behind, see apps.sermons.counters)"""
+        from .counters import counter_buffer
+        counter_buffer.increment(self.pk, 'download_count')
+
+    @property
+    def current_play_count(self):
+        """Play count including increments not yet written"""
+        from .counters import counter_buffer
+        return self.play_count + counter_buffer.pending(self.pk)['play_count']
+
+    @property
+    def current_download_count(self):
+        """Download count including increments not yet written"""
+        from .counters import counter_buffer
+        return self.download_count + counter_buffer.pending(self.pk)['download_count']
         
     def get_audio_url(self):
         """Get the audio URL with Cloudinary transformations if needed"""
@@ -217,7 +288,7 @@ class Sermon(TimeStampedModel):
         #     'quality': 'auto:low',
         #     'bit_rate': '64k'
         # })
-        return self.audio_file.url
+        return resource_url(self.audio_file)
         
     def get_duration_display(self):
         """Return duration in MM:SS format"""
@@ -248,13 +319,129 @@ class Sermon(TimeStampedModel):
     @property
     def audio_url(self):
         """Get the Cloudinary audio URL"""
-        if self.audio_file:
-            return self.audio_file.url
-        return None
+        return resource_url(self.audio_file)
     
     @property
     def thumbnail_url(self):
         """Get the Cloudinary thumbnail URL"""
-        if self.thumbnail:
-            return self.thumbnail.url
-        return None
\ No newline at end of file
+        return resource_url(self.thumbnail)
+
+class SermonWaveform(TimeStampedModel):
+    """Precomputed waveform peaks of a sermon's audio, kept apart from the sermon row"""
+    sermon = models.OneToOneField(
+        Sermon,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='waveform'
+    )
+    buckets = models.PositiveIntegerField(
+        help_text="Number of min/max pairs in peaks"
+    )
+    peaks = models.BinaryField(
+        help_text="Interleaved int8 min/max pairs"
+    )
+
+    class Meta:
+        verbose_name = 'Sermon Waveform'
+        verbose_name_plural = 'Sermon Waveforms'
+
+    def __str__(self):
+        return f"Waveform of {self.sermon_id}"
+
+
+class SermonRendition(TimeStampedModel):
+    """Transcoded variant of a sermon's audio at one step of the bitrate ladder"""
+    FORMATS = (
+        ('mp3', 'MP3'),
+        ('m3u8', 'HLS'),
+    )
+
+    sermon = models.ForeignKey(
+        Sermon,
+        on_delete=models.CASCADE,
+        related_name='renditions'
+    )
+    format = models.CharField(max_length=10, choices=FORMATS)
+    bitrate = models.PositiveIntegerField(help_text="Bitrate in kbps")
+    url = models.CharField(max_length=500)
+
+    class Meta:
+        ordering = ['format', 'bitrate']
+        unique_together = ['sermon', 'format', 'bitrate']
+        verbose_name = 'Sermon Rendition'
+        verbose_name_plural = 'Sermon Renditions'
+
+    def __str__(self):
+        return f"{self.sermon_id} {self.bitrate}k {self.format}"
+
+
+class SermonLike(TimeStampedModel):
+    """A user's like of a sermon"""
+    sermon = models.ForeignKey(
+        Sermon,
+        on_delete=models.CASCADE,
+        related_name='likes'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='sermon_likes'
+    )
+
+    class Meta:
+        unique_together = ['sermon', 'user']
+        verbose_name = 'Sermon Like'
+        verbose_name_plural = 'Sermon Likes'
+
+    def __str__(self):
+        return f"{self.user_id} likes {self.sermon_id}"
+
+
+class SermonComment(TimeStampedModel):
+    """A user's comment on a sermon"""
+    sermon = models.ForeignKey(
+        Sermon,
+        on_delete=models.CASCADE,
+        related_name='comments'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='sermon_comments'
+    )
+    content = models.TextField()
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Sermon Comment'
+        verbose_name_plural = 'Sermon Comments'
+
+    def __str__(self):
+        return f"Comment by {self.user_id} on {self.sermon_id}"
+
+
+class SermonBibleReference(models.Model):
+    """One chapter's verse range cited by a sermon, parsed from its bible_references"""
+    sermon = models.ForeignKey(
+        Sermon,
+        on_delete=models.CASCADE,
+        related_name='scripture_ranges'
+    )
+    book = models.PositiveSmallIntegerField(help_text="Book in canonical order (1 = Genesis)")
+    chapter = models.PositiveSmallIntegerField()
+    verse_start = models.PositiveSmallIntegerField()
+    verse_end = models.PositiveSmallIntegerField(help_text="999 for the end of the chapter")
+
+    class Meta:
+        # apps.sermons.scripture adds a GiST range index on PostgreSQL
+        indexes = [
+            models.Index(
+                fields=['book', 'chapter', 'verse_start', 'verse_end'],
+                name='sermons_bibleref_verses_idx'
+            ),
+        ]
+        verbose_name = 'Sermon Bible Reference'
+        verbose_name_plural = 'Sermon Bible References'
+
+    def __str__(self):
+        return f"{self.sermon_id}: {self.book} {self.chapter}:{self.verse_start}-{self.verse_end}"
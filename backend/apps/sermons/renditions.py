@@ -0,0 +1,246 @@
+"""
+Sermon Audio Renditions
+
+This module maintains a bitrate ladder of every sermon's audio (MP3 at
+32/64/128 kbps by default, plus audio-only HLS when enabled) so
+listeners on slow or metered connections don't have to stream the
+original upload. Players either pick a rendition from the ladder the
+serializers expose or let the audio endpoint pick one from the
+client's bandwidth.
+
+Renditions are produced by a transcoder. The real one has Cloudinary
+derive them (asynchronous eager transformations, delivered by URL); the
+local stand-in encodes them with ffmpeg into a local directory, so the
+pipeline can be exercised offline and in tests.
+"""
+
+import os
+import shutil
+import subprocess
+from functools import lru_cache
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.module_loading import import_string
+import cloudinary.uploader
+import cloudinary.utils
+
+from apps.file_storage.gateway import get_gateway
+from .audio import AudioMetadataError, open_audio
+
+# Bitrates (kbps) of the ladder
+AUDIO_BITRATES = getattr(settings, 'SERMON_AUDIO_BITRATES', [32, 64, 128])
+
+# Also produce audio-only HLS at every bitrate
+AUDIO_HLS = getattr(settings, 'SERMON_AUDIO_HLS', False)
+
+# Share of the client's reported downlink a rendition may use
+BANDWIDTH_HEADROOM = 0.8
+
+HLS_SEGMENT_SECONDS = 10
+
+
+def get_ladder():
+    """Get the (format, bitrate) pairs every sermon is rendered at."""
+    ladder = [('mp3', bitrate) for bitrate in AUDIO_BITRATES]
+    if AUDIO_HLS:
+        ladder += [('m3u8', bitrate) for bitrate in AUDIO_BITRATES]
+    return ladder
+
+
+def pick_rendition(renditions, bandwidth=None):
+    """
+    Pick the rendition to stream.
+
+    Args:
+        renditions: Renditions of one format
+        bandwidth (float, optional): Bandwidth available in kbps (None
+            if unknown)
+
+    Returns:
+        The highest-bitrate rendition that fits the bandwidth (the lowest
+        one if none fits, the highest one if the bandwidth is unknown),
+        or None if there are no renditions
+    """
+    renditions = sorted(renditions, key=lambda rendition: rendition.bitrate)
+    if not renditions:
+        return None
+    if bandwidth is None:
+        return renditions[-1]
+    fitting = [rendition for rendition in renditions if rendition.bitrate <= bandwidth]
+    return fitting[-1] if fitting else renditions[0]
+
+
+def get_client_bandwidth(request):
+    """
+    Get the bandwidth (kbps) a client can stream at, if it tells us.
+
+    Explicit ?bandwidth= (kbps) wins, then the Save-Data and Downlink
+    (Mbps) client hints.
+    """
+    bandwidth = request.query_params.get('bandwidth')
+    if bandwidth:
+        try:
+            return max(float(bandwidth), 0)
+        except ValueError:
+            pass
+    if request.headers.get('Save-Data', '').lower() == 'on':
+        return 0
+    downlink = request.headers.get('Downlink')
+    if downlink:
+        try:
+            return float(downlink) * 1000 * BANDWIDTH_HEADROOM
+        except ValueError:
+            pass
+    return None
+
+
+def build_master_playlist(renditions):
+    """Build an HLS master playlist over the HLS renditions."""
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for rendition in sorted(renditions, key=lambda rendition: rendition.bitrate):
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={rendition.bitrate * 1000}')
+        lines.append(rendition.url)
+    return '\n'.join(lines) + '\n'
+
+
+class CloudinaryTranscoder:
+    """Transcoder that has Cloudinary derive the renditions."""
+
+    def transformation(self, rendition_format, bitrate):
+        transformation = {'bit_rate': f'{bitrate}k'}
+        if rendition_format == 'm3u8':
+            # Audio-only HLS: AAC segments without a video stream
+            transformation.update(audio_codec='aac', video_codec='none')
+        else:
+            transformation['audio_codec'] = 'mp3'
+        return transformation
+
+    def url(self, public_id, rendition_format, bitrate):
+        url, _ = cloudinary.utils.cloudinary_url(
+            public_id,
+            resource_type='video',
+            format=rendition_format,
+            secure=True,
+            transformation=[self.transformation(rendition_format, bitrate)],
+        )
+        return url
+
+    def transcode(self, sermon, source, ladder):
+        """
+        Render a sermon's audio at every step of the ladder.
+
+        Args:
+            sermon: Sermon to render
+            source (str): URL or path of the original audio
+            ladder: (format, bitrate) pairs
+
+        Returns:
+            dict: (format, bitrate) -> rendition URL
+        """
+        public_id = sermon.audio_file.public_id
+        # Derive the renditions now rather than on their first request;
+        # the URLs work (transcoding on the fly) until they are ready
+        get_gateway().call(
+            'explicit',
+            cloudinary.uploader.explicit,
+            public_id,
+            type='upload',
+            resource_type='video',
+            eager=[
+                dict(self.transformation(rendition_format, bitrate), format=rendition_format)
+                for rendition_format, bitrate in ladder
+            ],
+            eager_async=True,
+        )
+        return {
+            (rendition_format, bitrate): self.url(public_id, rendition_format, bitrate)
+            for rendition_format, bitrate in ladder
+        }
+
+
+class LocalTranscoder:
+    """
+    Offline stand-in for Cloudinary transcoding.
+
+    Renditions are encoded with ffmpeg into SERMON_RENDITIONS_ROOT and
+    served from SERMON_RENDITIONS_URL. Without ffmpeg the original is
+    copied unchanged for every step, which is enough to exercise the
+    ladder in tests.
+    """
+
+    def __init__(self):
+        self.storage = FileSystemStorage(
+            location=getattr(
+                settings, 'SERMON_RENDITIONS_ROOT',
+                os.path.join(settings.BASE_DIR, 'sermon_renditions')
+            ),
+            base_url=getattr(settings, 'SERMON_RENDITIONS_URL', '/sermon-renditions/'),
+        )
+        self.ffmpeg = shutil.which(getattr(settings, 'SERMON_FFMPEG_BINARY', 'ffmpeg'))
+
+    def transcode(self, sermon, source, ladder):
+        directory = str(sermon.pk)
+        shutil.rmtree(self.storage.path(directory), ignore_errors=True)
+        os.makedirs(self.storage.path(directory))
+
+        copy = None
+        if not self.ffmpeg:
+            with open_audio(source) as fileobj:
+                copy = self.storage.save(f'{directory}/original', File(fileobj))
+
+        urls = {}
+        for rendition_format, bitrate in ladder:
+            if rendition_format == 'm3u8':
+                name = self.encode_hls(directory, source, bitrate, copy, sermon.duration)
+            else:
+                name = self.encode_mp3(directory, source, bitrate, copy)
+            urls[(rendition_format, bitrate)] = self.storage.url(name)
+        return urls
+
+    def encode_mp3(self, directory, source, bitrate, copy):
+        name = f'{directory}/{bitrate}k.mp3'
+        if copy:
+            shutil.copyfile(self.storage.path(copy), self.storage.path(name))
+        else:
+            self.run_ffmpeg('-i', source, '-vn', '-c:a', 'libmp3lame', '-b:a', f'{bitrate}k', self.storage.path(name))
+        return name
+
+    def encode_hls(self, directory, source, bitrate, copy, duration):
+        variant = f'{directory}/hls_{bitrate}k'
+        os.makedirs(self.storage.path(variant))
+        name = f'{variant}/index.m3u8'
+        if copy:
+            # Single segment pointing at the copied original
+            with open(self.storage.path(name), 'w') as playlist:
+                playlist.write(
+                    '#EXTM3U\n#EXT-X-VERSION:3\n'
+                    f'#EXT-X-TARGETDURATION:{max(duration, 1)}\n'
+                    f'#EXTINF:{max(duration, 1)},\n../original\n#EXT-X-ENDLIST\n'
+                )
+        else:
+            self.run_ffmpeg(
+                '-i', source, '-vn', '-c:a', 'aac', '-b:a', f'{bitrate}k',
+                '-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+                '-hls_segment_filename', self.storage.path(f'{variant}/segment%03d.ts'),
+                self.storage.path(name),
+            )
+        return name
+
+    def run_ffmpeg(self, *args):
+        result = subprocess.run(
+            [self.ffmpeg, '-nostdin', '-v', 'error', '-y', *args],
+            capture_output=True,
+        )
+        if result.returncode:
+            raise AudioMetadataError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()[-500:]}")
+
+
+@lru_cache(maxsize=None)
+def get_transcoder():
+    """Get the configured transcoder instance."""
+    transcoder_path = getattr(
+        settings, 'SERMON_AUDIO_TRANSCODER',
+        'apps.sermons.renditions.CloudinaryTranscoder'
+    )
+    return import_string(transcoder_path)()
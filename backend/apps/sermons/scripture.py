@@ -0,0 +1,368 @@
+"""
+Sermon Scripture Index
+
+This module parses the free-text Sermon.bible_references ("John 3:16-17,
+Romans 8:28-30") into structured (book, chapter, verse_start, verse_end)
+rows, one per chapter covered, kept in SermonBibleReference. Sermons
+covering a passage are then found with an indexed verse-range overlap
+query instead of a substring scan.
+
+On PostgreSQL the overlap test runs against a GiST index over an
+int4range of absolute verse positions, so a query range spanning several
+chapters is a single && probe; other databases use the B-tree index on
+(book, chapter, verse_start, verse_end), one probe per chapter.
+"""
+
+import re
+from django.contrib.postgres.fields import IntegerRangeField
+from django.db import connection, transaction
+from django.db.models import F, Func, Q, Value
+from psycopg2.extras import NumericRange
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+# Stands for "to the end of the chapter" in verse_end
+CHAPTER_END = 999
+
+# Canonical (Protestant) order: name, chapters, extra abbreviations.
+# Unique prefixes of the names are accepted as well.
+BOOKS = [
+    ('Genesis', 50, ['gn']),
+    ('Exodus', 40, ['ex']),
+    ('Leviticus', 27, ['lv']),
+    ('Numbers', 36, ['nm', 'nb']),
+    ('Deuteronomy', 34, ['dt']),
+    ('Joshua', 24, ['jsh']),
+    ('Judges', 21, ['jdg', 'jg']),
+    ('Ruth', 4, ['rth']),
+    ('1 Samuel', 31, ['1sm']),
+    ('2 Samuel', 24, ['2sm']),
+    ('1 Kings', 22, ['1kgs']),
+    ('2 Kings', 25, ['2kgs']),
+    ('1 Chronicles', 29, ['1chr']),
+    ('2 Chronicles', 36, ['2chr']),
+    ('Ezra', 10, []),
+    ('Nehemiah', 13, []),
+    ('Esther', 10, []),
+    ('Job', 42, ['jb']),
+    ('Psalms', 150, ['ps', 'psa', 'psalm', 'pss']),
+    ('Proverbs', 31, ['prv']),
+    ('Ecclesiastes', 12, ['eccl', 'qoh']),
+    ('Song of Solomon', 8, ['song', 'sos', 'songofsongs', 'canticles']),
+    ('Isaiah', 66, []),
+    ('Jeremiah', 52, []),
+    ('Lamentations', 5, []),
+    ('Ezekiel', 48, ['ezk']),
+    ('Daniel', 12, ['dn']),
+    ('Hosea', 14, []),
+    ('Joel', 3, ['jl']),
+    ('Amos', 9, []),
+    ('Obadiah', 1, ['ob']),
+    ('Jonah', 4, ['jnh']),
+    ('Micah', 7, []),
+    ('Nahum', 3, []),
+    ('Habakkuk', 3, []),
+    ('Zephaniah', 3, []),
+    ('Haggai', 2, []),
+    ('Zechariah', 14, []),
+    ('Malachi', 4, []),
+    ('Matthew', 28, ['mt']),
+    ('Mark', 16, ['mk', 'mrk']),
+    ('Luke', 24, ['lk']),
+    ('John', 21, ['jn', 'jhn']),
+    ('Acts', 28, []),
+    ('Romans', 16, ['rm']),
+    ('1 Corinthians', 16, []),
+    ('2 Corinthians', 13, []),
+    ('Galatians', 6, []),
+    ('Ephesians', 6, []),
+    ('Philippians', 4, ['phil', 'php']),
+    ('Colossians', 4, []),
+    ('1 Thessalonians', 5, []),
+    ('2 Thessalonians', 3, []),
+    ('1 Timothy', 6, []),
+    ('2 Timothy', 4, []),
+    ('Titus', 3, []),
+    ('Philemon', 1, ['phlm', 'philem', 'phm']),
+    ('Hebrews', 13, []),
+    ('James', 5, ['jas', 'jm']),
+    ('1 Peter', 5, ['1pt']),
+    ('2 Peter', 3, ['2pt']),
+    ('1 John', 5, ['1jn']),
+    ('2 John', 1, ['2jn']),
+    ('3 John', 1, ['3jn']),
+    ('Jude', 1, []),
+    ('Revelation', 22, ['rv', 'apocalypse']),
+]
+
+BOOK_NUMBERS = {
+    re.sub(r'\s', '', name.lower()): number for number, (name, _, _) in enumerate(BOOKS, 1)
+}
+
+BOOK_ALIASES = {
+    alias: number
+    for number, (_, _, aliases) in enumerate(BOOKS, 1)
+    for alias in aliases
+}
+
+ORDINALS = {
+    'i': '1', 'first': '1', '1st': '1',
+    'ii': '2', 'second': '2', '2nd': '2',
+    'iii': '3', 'third': '3', '3rd': '3',
+}
+
+SEGMENT = re.compile(
+    r'^(?P<book>(?:[1-3]\s*)?[a-z][a-z.\s]*?)?\s*'
+    r'(?P<spec>\d+[a-c]?(?:\s*[:.]\s*\d+[a-c]?)?(?:\s*-\s*\d+[a-c]?(?:\s*[:.]\s*\d+[a-c]?)?)?)?$',
+    re.IGNORECASE,
+)
+
+SPEC = re.compile(r'^(\d+)(?::(\d+))?(?:-(\d+)(?::(\d+))?)?$')
+
+def find_book(name):
+    """
+    Get the number (1-66) of a book from its name or an abbreviation.
+
+    Returns:
+        int: Book number, or None if the name is unknown or ambiguous
+    """
+    name = name.lower().replace('.', ' ').strip()
+    words = name.split()
+    if len(words) > 1 and words[0] in ORDINALS:
+        words[0] = ORDINALS[words[0]]
+    key = ''.join(words)
+    if not key:
+        return None
+
+    if key in BOOK_NUMBERS:
+        return BOOK_NUMBERS[key]
+    if key in BOOK_ALIASES:
+        return BOOK_ALIASES[key]
+    # Unique prefix of a name, at least two letters past any number
+    if len(key.lstrip('123')) >= 2:
+        matches = {number for full, number in BOOK_NUMBERS.items() if full.startswith(key)}
+        if len(matches) == 1:
+            return matches.pop()
+    return None
+
+
+def chapter_rows(book, chapter_start, verse_start, chapter_end, verse_end):
+    """Split a passage into one (book, chapter, verse_start, verse_end) row per chapter."""
+    chapters = BOOKS[book - 1][1]
+    chapter_end = min(chapter_end, chapters)
+    rows = []
+    for chapter in range(chapter_start, chapter_end + 1):
+        rows.append((
+            book,
+            chapter,
+            verse_start if chapter == chapter_start else 1,
+            verse_end if chapter == chapter_end else CHAPTER_END,
+        ))
+    return rows
+
+
+def parse_references(text, strict=False):
+    """
+    Parse free-text Bible references.
+
+    Understands books by name or abbreviation, chapters, verses, verse
+    and chapter ranges, and lists separated by commas or semicolons,
+    where a list item without a book continues the previous one: after
+    a comma bare numbers are more verses of the same chapter, after a
+    semicolon they are chapters ("John 3:16, 18; 4" = John 3:16, John
+    3:18 and John 4).
+
+    Args:
+        text (str): References, e.g. "John 3:16-17, Romans 8:28-30"
+        strict (bool): Raise on parts that can't be parsed or aren't in
+            the book instead of skipping them (or, for ranges running
+            past the last chapter, cutting them short)
+
+    Returns:
+        list: (book, chapter, verse_start, verse_end) tuples, one per
+              chapter covered (verse_end is CHAPTER_END for "to the end
+              of the chapter")
+
+    Raises:
+        ValueError: In strict mode, if a part can't be parsed or isn't
+            in its book
+    """
+    text = text.replace('–', '-').replace('—', '-')
+    rows = []
+    book = None
+    chapter = None
+    in_verses = False
+
+    for segment in re.split(r'([;,\n])', text):
+        segment = segment.strip()
+        if segment in (';', '\n'):
+            # A new list: bare numbers are chapters again
+            in_verses = False
+        if segment in ('', ';', ',', '\n'):
+            continue
+
+        match = SEGMENT.match(segment)
+        if not match or not (match.group('book') or match.group('spec')):
+            if strict:
+                raise ValueError(f"Can't parse '{segment}'")
+            continue
+
+        if match.group('book') and match.group('book').strip():
+            book = find_book(match.group('book'))
+            chapter = None
+            in_verses = False
+            if book is None:
+                if strict:
+                    raise ValueError(f"Unknown book '{match.group('book').strip()}'")
+                continue
+        elif book is None:
+            if strict:
+                raise ValueError(f"No book for '{segment}'")
+            continue
+
+        spec = match.group('spec')
+        if not spec:
+            # The whole book
+            rows.extend(chapter_rows(book, 1, 1, BOOKS[book - 1][1], CHAPTER_END))
+            continue
+
+        spec = re.sub(r'[a-c\s]', '', spec.lower()).replace('.', ':')
+        c1, v1, c2, v2 = (int(part) if part else None for part in SPEC.match(spec).groups())
+        single_chapter = BOOKS[book - 1][1] == 1
+
+        if v1 is None and v2 is None and (single_chapter or (in_verses and not match.group('book'))):
+            # Bare numbers are verses: "Jude 5", or "18" after "John 3:16"
+            if single_chapter and match.group('book'):
+                chapter = 1
+            v1, c1 = c1, chapter
+            v2, c2 = c2, None
+            if c2 is None and v2 is not None:
+                c2 = c1
+        if v1 is None:
+            # Whole chapters: "Romans 8" or "Romans 8-9" (or "Romans 8-9:5")
+            chapter_end, verse_end, verses_follow = c2 or c1, v2 or CHAPTER_END, False
+        elif c2 is not None and v2 is not None:
+            # "Romans 8:28-9:5"
+            chapter_end, verse_end, verses_follow = c2, v2, True
+        elif c2 is None or c2 >= v1:
+            # "John 3:16" or "John 3:16-17"
+            chapter_end, verse_end, verses_follow = c1, c2 or v1, True
+        else:
+            # "John 3:16-4" runs on to the end of chapter 4
+            chapter_end, verse_end, verses_follow = c2, CHAPTER_END, False
+
+        name, chapters, _ = BOOKS[book - 1]
+        if not 1 <= c1 <= chapters or (strict and chapter_end > chapters):
+            if strict:
+                raise ValueError(f"'{segment}': {name} has {chapters} chapters")
+            continue
+        if (c1, v1 or 1) > (chapter_end, verse_end):
+            if strict:
+                raise ValueError(f"'{segment}' ends before it starts")
+            continue
+        rows.extend(chapter_rows(book, c1, v1 or 1, chapter_end, verse_end))
+        chapter = min(chapter_end, chapters)
+        in_verses = verses_follow
+
+    return rows
+
+
+def index_bible_references(sermons):
+    """
+    Rebuild the scripture rows of sermons from their bible_references.
+
+    Args:
+        sermons: Sermons (only pk and bible_references are needed)
+
+    Returns:
+        int: Number of rows written
+    """
+    from .models import SermonBibleReference
+
+    sermons = list(sermons)
+    rows = [
+        SermonBibleReference(
+            sermon_id=sermon.pk, book=book, chapter=chapter,
+            verse_start=verse_start, verse_end=verse_end,
+        )
+        for sermon in sermons
+        for book, chapter, verse_start, verse_end in set(parse_references(sermon.bible_references or ''))
+    ]
+    with transaction.atomic():
+        SermonBibleReference.objects.filter(sermon_id__in=[sermon.pk for sermon in sermons]).delete()
+        SermonBibleReference.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def verse_span():
+    """int4range of the absolute verse positions a row covers (matches the GiST index of migration 0007)."""
+    def position(verse):
+        return F('book') * 1000000 + F('chapter') * 1000 + F(verse)
+    return Func(
+        position('verse_start'), position('verse_end'), Value('[]'),
+        function='int4range',
+        output_field=IntegerRangeField(),
+    )
+
+
+def verse_positions(rows):
+    """
+    Turn chapter rows into (lower, upper) absolute verse positions,
+    merging rows that continue into the next chapter.
+    """
+    spans = []
+    for book, chapter, verse_start, verse_end in sorted(rows):
+        base = book * 1000000 + chapter * 1000
+        lower, upper = base + verse_start, base + verse_end
+        # Chapter end N:999 is followed directly by verse (N + 1):1
+        continues = spans and spans[-1][1] % 1000 == CHAPTER_END and lower == spans[-1][1] + 1000 - CHAPTER_END + 1
+        if spans and (lower <= spans[-1][1] or continues):
+            spans[-1][1] = max(spans[-1][1], upper)
+        else:
+            spans.append([lower, upper])
+    return [tuple(span) for span in spans]
+
+
+def overlapping_sermon_ids(rows):
+    """
+    Query the IDs of sermons whose references overlap any of `rows`.
+
+    Args:
+        rows: (book, chapter, verse_start, verse_end) tuples as returned
+              by parse_references
+    """
+    from .models import SermonBibleReference
+
+    references = SermonBibleReference.objects.all()
+    if connection.vendor == 'postgresql':
+        spans = Q()
+        for lower, upper in verse_positions(rows):
+            spans |= Q(span__overlap=NumericRange(lower, upper, '[]'))
+        references = references.alias(span=verse_span()).filter(spans)
+    else:
+        overlaps = Q()
+        for book, chapter, verse_start, verse_end in rows:
+            overlaps |= Q(
+                book=book, chapter=chapter,
+                verse_start__lte=verse_end, verse_end__gte=verse_start,
+            )
+        references = references.filter(overlaps)
+    return references.values('sermon_id')
+
+
+class BibleReferenceFilter(BaseFilterBackend):
+    """Filter sermons by a Bible passage: ?reference=Romans 8 (or John 3:16-18, ...)."""
+
+    param = 'reference'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.param, '').strip()
+        if not text:
+            return queryset
+        try:
+            rows = parse_references(text, strict=True)
+        except ValueError as e:
+            raise ValidationError({self.param: str(e)})
+        if not rows:
+            return queryset.none()
+        return queryset.filter(pk__in=overlapping_sermon_ids(rows))
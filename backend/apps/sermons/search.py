@@ -0,0 +1,68 @@
+"""
+Sermon Search
+
+This module contains the full-text search backend for sermons. On
+PostgreSQL, a trigger keeps Sermon.search_vector (a weighted tsvector
+over title, preacher, Bible references and description) up to date,
+a GIN index serves the matches and results are ranked with ts_rank.
+On SQLite (local development and tests), an FTS5 table kept in sync by
+triggers does the same, ranked with bm25. Other databases fall back to
+DRF's ILIKE search. The triggers, index and FTS5 table are created by
+migration 0006.
+
+The ?search= query parameter is unchanged.
+"""
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F
+from rest_framework.filters import SearchFilter
+
+SEARCH_CONFIG = 'english'
+
+# bm25 weights of the FTS5 columns (title, preacher, bible_references,
+# description), in step with the A/A/B/C tsvector weights
+FTS5_WEIGHTS = (10.0, 10.0, 4.0, 1.0)
+
+FTS5_TABLE = 'sermons_sermon_fts'
+
+
+def fts5_query(terms):
+    """Build an FTS5 query matching every term as a prefix."""
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+class SermonSearchFilter(SearchFilter):
+    """
+    Full-text ?search= for sermons, most relevant first.
+
+    Place it after OrderingFilter: without an explicit ?ordering=,
+    results are ordered by rank, then by the view's ordering.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        vendor = connection.vendor
+        if vendor == 'postgresql':
+            query = SearchQuery(' '.join(terms), search_type='websearch', config=SEARCH_CONFIG)
+            queryset = queryset.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query)
+            )
+        elif vendor == 'sqlite':
+            # Join the FTS5 table so matching and ranking stay in one
+            # query (bm25 is lower for better matches)
+            queryset = queryset.extra(
+                tables=[FTS5_TABLE],
+                where=[f'{FTS5_TABLE}.rowid = {queryset.model._meta.db_table}.id', f'{FTS5_TABLE} MATCH %s'],
+                params=[fts5_query(terms)],
+                select={'search_rank': f"-bm25({FTS5_TABLE}, {', '.join(map(str, FTS5_WEIGHTS))})"},
+            )
+        else:
+            return super().filter_queryset(request, queryset, view)
+
+        if request.query_params.get('ordering'):
+            return queryset
+        return queryset.order_by('-search_rank', *queryset.query.order_by)
@@ -1,8 +1,9 @@
 import os
 from rest_framework import serializers
 from django.core.exceptions import ValidationError
+from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
-from .models import Sermon, SermonCategory
+from .models import Sermon, SermonCategory, SermonComment, SermonRendition
 
 
 class SermonCategorySerializer(serializers.ModelSerializer):
@@ -13,10 +14,42 @@ class SermonCategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'sermon_count', 'created_at']
     
     def get_sermon_count(self, obj):
+        # SermonCategoryViewSet annotates the count; fall back to a query
+        # for categories serialized elsewhere
+        if hasattr(obj, 'published_sermon_count'):
+            return obj.published_sermon_count
         return obj.sermons.filter(is_published=True).count()
 
 
-class SermonSerializer(serializers.ModelSerializer):
+class SermonRenditionSerializer(serializers.ModelSerializer):
+    """One step of a sermon's bitrate ladder."""
+
+    class Meta:
+        model = SermonRendition
+        fields = ['format', 'bitrate', 'url']
+        read_only_fields = fields
+
+
+class RenditionLadderMixin(serializers.Serializer):
+    """Expose a sermon's MP3 ladder and, when rendered, its HLS playlist."""
+    renditions = serializers.SerializerMethodField()
+    hls_url = serializers.SerializerMethodField()
+
+    def get_renditions(self, obj):
+        """Return the MP3 renditions, lowest bitrate first"""
+        renditions = [rendition for rendition in obj.renditions.all() if rendition.format == 'mp3']
+        return SermonRenditionSerializer(renditions, many=True).data
+
+    def get_hls_url(self, obj):
+        """Return the URL of the HLS master playlist"""
+        if not any(rendition.format == 'm3u8' for rendition in obj.renditions.all()):
+            return None
+        url = reverse('sermons:sermon-hls', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class SermonSerializer(RenditionLadderMixin, serializers.ModelSerializer):
     """Serializer for the Sermon model with audio file handling."""
     # Read-only fields
     audio_url = serializers.SerializerMethodField()
@@ -25,19 +58,23 @@ class SermonSerializer(serializers.ModelSerializer):
     duration_display = serializers.CharField(source='get_duration_display', read_only=True)
     file_size_mb = serializers.SerializerMethodField()
     processing_status = serializers.CharField(read_only=True)
+    play_count = serializers.IntegerField(source='current_play_count', read_only=True)
+    download_count = serializers.IntegerField(source='current_download_count', read_only=True)
     
     class Meta:
         model = Sermon
         fields = [
             'id', 'title', 'slug', 'sermon_type', 'preacher', 'description', 
             'category', 'category_name', 'playlist', 'audio_file', 'audio_url',
+            'renditions', 'hls_url',
             'thumbnail', 'thumbnail_url', 'bible_references', 'sermon_date',
             'duration', 'duration_display', 'play_count', 'download_count',
-            'is_featured', 'is_published', 'order', 'processing_status',
+            'like_count', 'comment_count', 'is_featured', 'is_published', 'order', 'processing_status',
             'processing_errors', 'file_size_mb', 'created_at', 'updated_at'
         ]
         read_only_fields = [
-            'slug', 'duration', 'play_count', 'download_count', 'created_at', 
+            'slug', 'duration', 'play_count', 'download_count', 'like_count',
+            'comment_count', 'created_at', 
             'updated_at', 'processing_status', 'processing_errors'
         ]
         extra_kwargs = {
@@ -56,7 +93,7 @@ class SermonSerializer(serializers.ModelSerializer):
     
     def get_thumbnail_url(self, obj):
         """Return the Cloudinary thumbnail URL"""
-        return obj.thumbnail.url if obj.thumbnail else None
+        return obj.thumbnail_url
         
     def get_file_size_mb(self, obj):
         """Return file size in MB"""
@@ -125,21 +162,23 @@ class SermonSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class SermonListSerializer(serializers.ModelSerializer):
+class SermonListSerializer(RenditionLadderMixin, serializers.ModelSerializer):
     """Lightweight serializer for list views with essential fields."""
     audio_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
     category_name = serializers.CharField(source='category.name', read_only=True)
     duration_display = serializers.CharField(source='get_duration_display', read_only=True)
+    play_count = serializers.IntegerField(source='current_play_count', read_only=True)
+    download_count = serializers.IntegerField(source='current_download_count', read_only=True)
     
     class Meta:
         model = Sermon
         fields = [
             'id', 'title', 'slug', 'preacher', 'sermon_type',
-            'category_name', 'audio_url', 'thumbnail_url', 
+            'category_name', 'audio_url', 'renditions', 'hls_url', 'thumbnail_url',
             'sermon_date', 'duration', 'duration_display',
-            'play_count', 'download_count', 'is_featured',
-            'is_published', 'created_at'
+            'play_count', 'download_count', 'like_count', 'comment_count',
+            'is_featured', 'is_published', 'created_at'
         ]
         read_only_fields = fields
     
@@ -149,4 +188,18 @@ class SermonListSerializer(serializers.ModelSerializer):
     
     def get_thumbnail_url(self, obj):
         """Return the Cloudinary thumbnail URL"""
-        return obj.thumbnail.url if obj.thumbnail else None
\ No newline at end of file
+        return obj.thumbnail_url
+
+
+class SermonCommentSerializer(serializers.ModelSerializer):
+    """Serializer for comments on a sermon."""
+    user_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SermonComment
+        fields = ['id', 'user', 'user_name', 'content', 'created_at']
+        read_only_fields = ['id', 'user', 'user_name', 'created_at']
+
+    def get_user_name(self, obj):
+        """Return the commenter's display name"""
+        return obj.user.get_full_name() or obj.user.email
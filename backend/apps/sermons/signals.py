@@ -1,9 +1,12 @@
 import logging
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.conf import settings
-from .models import Sermon
-from .tasks import process_audio_file
+from .caching import catalog_changed
+from .counters import adjust_counter
+from .models import Sermon, SermonCategory, SermonComment, SermonLike
+from .scripture import index_bible_references
+from .tasks import queue_audio_processing
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +17,7 @@ def handle_sermon_save(sender, instance, created, **kwargs):
         # If this is a new sermon with an audio file, queue it for processing
         if created and instance.audio_file:
             logger.info(f"New sermon {instance.id} created with audio file, queuing for processing")
-            process_audio_file.delay(instance.id)
+            queue_audio_processing(instance.id)
             
         # If audio file was changed, update metadata
         if not created and instance.audio_file:
@@ -23,7 +26,7 @@ def handle_sermon_save(sender, instance, created, **kwargs):
                 old_instance = Sermon.objects.get(pk=instance.pk)
                 if old_instance.audio_file != instance.audio_file:
                     logger.info(f"Audio file changed for sermon {instance.id}, requeuing for processing")
-                    process_audio_file.delay(instance.id)
+                    queue_audio_processing(instance.id)
             except Sermon.DoesNotExist:
                 pass
                 
@@ -31,8 +34,48 @@ def handle_sermon_save(sender, instance, created, **kwargs):
         logger.error(f"Error in handle_sermon_save for sermon {instance.id}: {str(e)}")
         raise
 
+@receiver(post_save, sender=Sermon)
+def index_sermon_references(sender, instance, created, update_fields=None, **kwargs):
+    """Re-parse a sermon's Bible references into the scripture index"""
+    if update_fields is None or 'bible_references' in update_fields:
+        index_bible_references([instance])
+
+@receiver(post_save, sender=Sermon)
+@receiver(post_delete, sender=Sermon)
+@receiver(post_save, sender=SermonCategory)
+@receiver(post_delete, sender=SermonCategory)
+def sermon_catalog_changed(sender, **kwargs):
+    """Retire cached catalog responses"""
+    catalog_changed()
+
 @receiver(pre_save, sender=Sermon)
 def validate_sermon(sender, instance, **kwargs):
     """Pre-save validation for Sermon model."""
     # This will call the clean() method we defined in the model
     instance.clean()
+
+
+@receiver(post_save, sender=SermonLike)
+def sermon_like_saved(sender, instance, created, **kwargs):
+    """Count a new like on its sermon"""
+    if created:
+        adjust_counter(instance.sermon_id, 'like_count', 1)
+
+
+@receiver(post_delete, sender=SermonLike)
+def sermon_like_deleted(sender, instance, **kwargs):
+    """Uncount a removed like"""
+    adjust_counter(instance.sermon_id, 'like_count', -1)
+
+
+@receiver(post_save, sender=SermonComment)
+def sermon_comment_saved(sender, instance, created, **kwargs):
+    """Count a new comment on its sermon"""
+    if created:
+        adjust_counter(instance.sermon_id, 'comment_count', 1)
+
+
+@receiver(post_delete, sender=SermonComment)
+def sermon_comment_deleted(sender, instance, **kwargs):
+    """Uncount a removed comment"""
+    adjust_counter(instance.sermon_id, 'comment_count', -1)
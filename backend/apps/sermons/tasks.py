@@ -1,95 +1,332 @@
+"""
+Sermon Audio Processing
+
+This module extracts audio metadata (duration, bitrate, codec) and
+waveform peaks for sermons, and renders their bitrate ladder. Extraction
+runs in a bounded process pool; results are written back with batched
+bulk writes. When Celery is installed the tasks are
+Celery tasks; otherwise .delay() queues the sermon for the in-process
+pool once the current transaction commits, and sermons queued close
+together are processed (and saved) as one batch.
+"""
+
 import logging
-from celery import shared_task
-from django.core.files.storage import default_storage
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
 from django.conf import settings
-from mutagen import File
-from mutagen.mp3 import MP3
-from mutagen.wave import WAVE
-from mutagen.oggvorbis import OggVorbis
-from mutagen.mp4 import MP4
-from .models import Sermon
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .audio import AudioFetchError, extract_audio_metadata
+from .caching import catalog_changed
+from .models import Sermon, SermonRendition, SermonWaveform
+from .renditions import get_ladder, get_transcoder
+from .waveform import compute_waveform
+
+try:
+    from celery import shared_task
+except ImportError:
+    shared_task = None
 
 logger = logging.getLogger(__name__)
 
-def get_audio_duration(file_path):
-    """Get duration of audio file in seconds using mutagen."""
-    try:
-        audio = File(file_path)
-        if audio is None:
-            return 0
-            
-        # Get duration based on file type
-        if hasattr(audio.info, 'length'):
-            return int(audio.info.length)
-        elif hasattr(audio.info, 'length_seconds'):
-            return int(audio.info.length_seconds)
-        return 0
-    except Exception as e:
-        logger.error(f"Error getting audio duration: {str(e)}")
-        return 0
+# Processes extracting metadata at once
+AUDIO_WORKERS = getattr(settings, 'SERMON_AUDIO_WORKERS', 2)
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def process_audio_file(self, sermon_id):
-    """Process an uploaded audio file to extract metadata."""
-    try:
-        sermon = Sermon.objects.get(id=sermon_id)
-        
-        if not sermon.audio_file:
-            logger.warning(f"No audio file found for sermon {sermon_id}")
-            return
-            
-        # Update status to processing
-        sermon.processing_status = 'processing'
-        sermon.save(update_fields=['processing_status', 'updated_at'])
-        
+# Sermons per bulk update
+AUDIO_BATCH_SIZE = getattr(settings, 'SERMON_AUDIO_BATCH_SIZE', 50)
+
+# Min/max pairs per waveform
+WAVEFORM_BUCKETS = getattr(settings, 'SERMON_WAVEFORM_BUCKETS', 1000)
+
+# ffmpeg decodes waveforms of any format (without it, only WAV)
+FFMPEG_BINARY = getattr(settings, 'SERMON_FFMPEG_BINARY', 'ffmpeg')
+
+METADATA_FIELDS = [
+    'duration', 'bitrate', 'audio_codec', 'mime_type', 'file_size',
+    'processing_status', 'processing_errors', 'updated_at',
+]
+
+_process_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """Get the shared metadata process pool, creating it on first use."""
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            # Spawned workers only import apps.sermons.audio, not Django
+            _process_pool = ProcessPoolExecutor(
+                max_workers=AUDIO_WORKERS,
+                mp_context=get_context('spawn'),
+            )
+    return _process_pool
+
+
+def get_audio_location(sermon):
+    """Get the URL (or local path) metadata is read from."""
+    url = sermon.get_audio_url()
+    if url and url.startswith('//'):
+        url = 'https:' + url
+    return url
+
+
+def sermons_with_audio(sermon_ids):
+    """Get the sermons among `sermon_ids` that have an audio file."""
+    return list(
+        Sermon.objects.filter(pk__in=sermon_ids).exclude(audio_file__isnull=True).exclude(audio_file='')
+    )
+
+
+def run_for_sermons(func, sermons, pool=None, args=()):
+    """
+    Run func(audio location, *args) for every sermon.
+
+    Args:
+        func: Module-level function (it may run in a worker process)
+        sermons: Sermons with an audio file
+        pool (optional): Executor to run in (default: this process)
+        args (tuple): Extra arguments passed to func
+
+    Returns:
+        list: (sermon, result or the exception raised) pairs
+    """
+    if pool is None:
+        results = []
+        for sermon in sermons:
+            try:
+                results.append((sermon, func(get_audio_location(sermon), *args)))
+            except Exception as e:
+                results.append((sermon, e))
+        return results
+
+    futures = [
+        (sermon, pool.submit(func, get_audio_location(sermon), *args))
+        for sermon in sermons
+    ]
+    results = []
+    for sermon, future in futures:
         try:
-            # Get file path from Cloudinary
-            file_path = sermon.audio_file.path
-            
-            # Get duration using mutagen
-            duration = get_audio_duration(file_path)
-            
-            # Update sermon with metadata
-            sermon.duration = duration
-            sermon.processing_status = 'completed'
-            sermon.save(update_fields=['duration', 'processing_status', 'updated_at'])
-            
-            logger.info(f"Successfully processed audio for sermon {sermon_id}")
-            
+            results.append((sermon, future.result()))
         except Exception as e:
-            error_msg = f"Error processing audio: {str(e)}"
-            logger.error(f"{error_msg} for sermon {sermon_id}")
-            sermon.processing_status = 'failed'
-            sermon.processing_errors = error_msg
-            sermon.save(update_fields=['processing_status', 'processing_errors', 'updated_at'])
-            raise  # Re-raise to trigger Celery retry
-            
-    except Sermon.DoesNotExist:
-        logger.error(f"Sermon {sermon_id} not found")
-    except Exception as e:
-        logger.error(f"Unexpected error processing sermon {sermon_id}: {str(e)}")
-        # If we've retried enough, mark as failed
-        if self.request.retries >= self.max_retries:
+            results.append((sermon, e))
+    return results
+
+
+def extract_metadata(sermons, pool=None):
+    """
+    Read the metadata of sermons' audio files.
+
+    Returns:
+        list: (sermon, metadata dict or the exception raised) pairs
+    """
+    return run_for_sermons(extract_audio_metadata, sermons, pool)
+
+
+def save_metadata(results):
+    """Write extraction results back in batched bulk updates."""
+    now = timezone.now()
+    for sermon, metadata in results:
+        sermon.updated_at = now
+        if isinstance(metadata, Exception):
+            logger.error("Error processing audio for sermon %s: %s", sermon.pk, metadata)
             sermon.processing_status = 'failed'
-            sermon.processing_errors = f"Max retries reached: {str(e)}"
-            sermon.save(update_fields=['processing_status', 'processing_errors', 'updated_at'])
-        raise self.retry(exc=e)
-
-@shared_task
-generate_audio_waveform(sermon_id):
-    ""
-    Generate a waveform representation of the audio file.
-    This is an optional task that can be called after process_audio_file.
+            sermon.processing_errors = f"Error processing audio: {metadata}"
+            continue
+        sermon.duration = metadata['duration']
+        sermon.bitrate = metadata['bitrate']
+        sermon.audio_codec = metadata['codec']
+        sermon.mime_type = metadata['mime_type'] or sermon.mime_type
+        sermon.file_size = metadata['file_size'] or sermon.file_size
+        sermon.processing_status = 'completed'
+        sermon.processing_errors = ''
+
+    Sermon.objects.bulk_update(
+        [sermon for sermon, _ in results], METADATA_FIELDS, batch_size=AUDIO_BATCH_SIZE
+    )
+    catalog_changed()
+
+
+def process_audio_files(sermon_ids, pool=None):
     """
-    try:
-        sermon = Sermon.objects.get(id=sermon_id)
-        if not sermon.audio_file:
+    Extract and save audio metadata for a batch of sermons.
+
+    Args:
+        sermon_ids: IDs of the sermons to process
+        pool (optional): Executor to extract in (default: this process)
+
+    Returns:
+        int: Number of sermons processed successfully
+    """
+    sermons = sermons_with_audio(sermon_ids)
+    if not sermons:
+        return 0
+
+    Sermon.objects.filter(pk__in=[sermon.pk for sermon in sermons]).update(
+        processing_status='processing', updated_at=timezone.now()
+    )
+    results = extract_metadata(sermons, pool)
+    save_metadata(results)
+    return sum(1 for _, metadata in results if not isinstance(metadata, Exception))
+
+
+def generate_waveforms(sermon_ids, pool=None):
+    """
+    Compute and save waveform peaks for a batch of sermons.
+
+    Args:
+        sermon_ids: IDs of the sermons to process
+        pool (optional): Executor to decode in (default: this process)
+
+    Returns:
+        int: Number of waveforms saved
+    """
+    sermons = sermons_with_audio(sermon_ids)
+    results = run_for_sermons(
+        compute_waveform, sermons, pool, args=(WAVEFORM_BUCKETS, FFMPEG_BINARY)
+    )
+
+    waveforms = []
+    for sermon, peaks in results:
+        if isinstance(peaks, Exception):
+            logger.error("Error generating waveform for sermon %s: %s", sermon.pk, peaks)
+            continue
+        waveforms.append(SermonWaveform(sermon=sermon, buckets=len(peaks) // 2, peaks=peaks))
+    SermonWaveform.objects.bulk_create(
+        waveforms,
+        batch_size=AUDIO_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['sermon'],
+        update_fields=['buckets', 'peaks', 'updated_at'],
+    )
+    return len(waveforms)
+
+
+def generate_renditions(sermon_ids, pool=None):
+    """
+    Render the bitrate ladder of a batch of sermons.
+
+    The transcoder does its work elsewhere (Cloudinary or ffmpeg), so
+    `pool` is not used.
+
+    Returns:
+        int: Number of sermons rendered
+    """
+    ladder = get_ladder()
+    transcoder = get_transcoder()
+
+    rendered = []
+    renditions = []
+    for sermon in sermons_with_audio(sermon_ids):
+        try:
+            urls = transcoder.transcode(sermon, get_audio_location(sermon), ladder)
+        except Exception as e:
+            logger.error("Error rendering audio for sermon %s: %s", sermon.pk, e)
+            continue
+        rendered.append(sermon.pk)
+        renditions.extend(
+            SermonRendition(sermon=sermon, format=rendition_format, bitrate=bitrate, url=url)
+            for (rendition_format, bitrate), url in urls.items()
+        )
+
+    with transaction.atomic():
+        SermonRendition.objects.bulk_create(
+            renditions,
+            batch_size=AUDIO_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['sermon', 'format', 'bitrate'],
+            update_fields=['url', 'updated_at'],
+        )
+        # Steps dropped from the ladder since the last run
+        current = Q()
+        for rendition_format, bitrate in ladder:
+            current |= Q(format=rendition_format, bitrate=bitrate)
+        SermonRendition.objects.filter(sermon_id__in=rendered).exclude(current).delete()
+        catalog_changed()
+    return len(rendered)
+
+
+class AudioQueue:
+    """
+    In-process stand-in for the Celery queue.
+
+    Queued sermon IDs are drained by a single dispatcher thread, so IDs
+    queued while a batch is running are picked up together as the next
+    batch and handed to process_batch(sermon_ids, pool) (pool is None
+    unless use_pool).
+    """
+
+    def __init__(self, process_batch, use_pool=True):
+        self.process_batch = process_batch
+        self.use_pool = use_pool
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._dispatcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sermon-audio')
+
+    def delay(self, sermon_id):
+        """Queue a sermon once the current transaction commits."""
+        transaction.on_commit(lambda: self.put(sermon_id))
+
+    def put(self, sermon_id):
+        with self._lock:
+            schedule = not self._pending
+            self._pending.add(sermon_id)
+        if schedule:
+            self._dispatcher.submit(self.drain)
+
+    def drain(self):
+        """Dispatcher entry point: process everything queued so far."""
+        with self._lock:
+            sermon_ids, self._pending = list(self._pending), set()
+        if not sermon_ids:
+            return
+        close_old_connections()
+        pool = get_process_pool() if self.use_pool else None
+        try:
+            for start in range(0, len(sermon_ids), AUDIO_BATCH_SIZE):
+                self.process_batch(sermon_ids[start:start + AUDIO_BATCH_SIZE], pool)
+        except Exception:
+            logger.exception("Processing audio for sermons %s failed", sermon_ids)
+        finally:
+            close_old_connections()
+
+
+if shared_task is not None:
+    @shared_task(bind=True, max_retries=3, default_retry_delay=60)
+    def process_audio_file(self, sermon_id):
+        """Extract audio metadata for a sermon (the Celery worker is the pool)."""
+        sermons = sermons_with_audio([sermon_id])
+        if not sermons:
+            logger.warning("No audio file found for sermon %s", sermon_id)
             return
-            
-        # This is a placeholder - you would typically use a library like librosa or pydub
-        # to generate waveform data and store it as JSON or an image
-        logger.info(f"Generating waveform for sermon {sermon_id}")
-        
-    except Exception as e:
-        logger.error(f"Error generating waveform: {str(e)}")
-        raise
+
+        Sermon.objects.filter(pk=sermon_id).update(processing_status='processing', updated_at=timezone.now())
+        results = extract_metadata(sermons)
+        error = results[0][1]
+        if isinstance(error, AudioFetchError) and self.request.retries < self.max_retries:
+            raise self.retry(exc=error)
+        save_metadata(results)
+
+    @shared_task
+    def generate_audio_waveform(sermon_id):
+        """Compute waveform peaks for a sermon."""
+        generate_waveforms([sermon_id])
+
+    @shared_task
+    def generate_audio_renditions(sermon_id):
+        """Render the bitrate ladder of a sermon."""
+        generate_renditions([sermon_id])
+else:
+    process_audio_file = AudioQueue(process_audio_files)
+    generate_audio_waveform = AudioQueue(generate_waveforms)
+    generate_audio_renditions = AudioQueue(generate_renditions, use_pool=False)
+
+
+def queue_audio_processing(sermon_id):
+    """Queue everything derived from a sermon's audio file."""
+    process_audio_file.delay(sermon_id)
+    generate_audio_waveform.delay(sermon_id)
+    generate_audio_renditions.delay(sermon_id)
+
@@ -0,0 +1,116 @@
+"""
+Shared helpers for the sermon tests.
+"""
+
+import io
+import re
+import threading
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth import get_user_model
+import numpy as np
+
+from apps.sermons.models import Sermon
+
+
+def wav_bytes(samples, rate=8000, channels=1, width=2):
+    """Encode int16 samples (channels interleaved) as a PCM WAV file."""
+    samples = np.asarray(samples, dtype=np.int16)
+    if width == 1:
+        data = ((samples >> 8) + 128).astype(np.uint8).tobytes()
+    elif width == 4:
+        data = (samples.astype('<i4') << 16).tobytes()
+    else:
+        data = samples.astype('<i2').tobytes()
+    output = io.BytesIO()
+    with wave.open(output, 'wb') as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(width)
+        writer.setframerate(rate)
+        writer.writeframes(data)
+    return output.getvalue()
+
+
+def create_user(email='user@example.com', **fields):
+    return get_user_model().objects.create_user(email=email, password='password', **fields)
+
+
+def create_sermon(number=0, **fields):
+    fields = {
+        'title': f'Sermon {number}',
+        'slug': f'sermon-{number}',
+        'preacher': 'Preacher',
+        'sermon_date': '2024-01-01',
+        'audio_file': f'video/upload/v1/sermon_audio/sermon-{number}.mp3',
+        **fields,
+    }
+    return Sermon.objects.create(**fields)
+
+
+class FileServer:
+    """
+    HTTP server on localhost serving one file, honouring Range headers.
+
+    Served byte counts are kept in `served`. With ranges=False, Range
+    headers are ignored; `status` overrides every response's status.
+    """
+
+    def __init__(self, content, ranges=True, status=None):
+        self.content = content
+        self.ranges = ranges
+        self.status = status
+        self.served = []
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/audio'
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                content = server.content
+                if server.status is not None:
+                    self.send(server.status, b'error')
+                    return
+                match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+                if not server.ranges or not match:
+                    self.send(200, content)
+                    return
+                start = int(match.group(1))
+                end = min(int(match.group(2) or len(content) - 1), len(content) - 1)
+                if start >= len(content):
+                    self.send(416, b'', {'Content-Range': f'bytes */{len(content)}'})
+                    return
+                self.send(206, content[start:end + 1], {
+                    'Content-Range': f'bytes {start}-{end}/{len(content)}',
+                })
+
+            def send(self, status, body, headers=None):
+                server.served.append(len(body))
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
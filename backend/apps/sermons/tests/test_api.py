@@ -0,0 +1,263 @@
+"""
+Sermon API Query Count Tests
+
+Regression tests that keep the sermon and category endpoints at a fixed
+number of queries however many rows they return, and that anonymous
+catalog reads are served from the cache.
+
+Usage:
+    python manage.py test apps.sermons
+"""
+
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+import cloudinary
+
+from apps.sermons.caching import get_catalog_version
+from apps.sermons.counters import counter_buffer
+from apps.sermons.models import (
+    Sermon,
+    SermonCategory,
+    SermonLike,
+    SermonRendition,
+    _build_resource_url,
+    resource_url,
+)
+
+_cloud_name = None
+
+
+def setUpModule():
+    # URLs are built locally, but need a cloud name to build
+    global _cloud_name
+    _cloud_name = cloudinary.config().cloud_name
+    cloudinary.config(cloud_name=_cloud_name or 'test')
+
+
+def tearDownModule():
+    cloudinary.config(cloud_name=_cloud_name)
+
+
+class SermonAPITestCase(TestCase):
+    """Categories and sermons with audio, thumbnails and renditions."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.categories = [
+            SermonCategory.objects.create(name=f'Category {number}', slug=f'category-{number}')
+            for number in range(3)
+        ]
+
+    def create_sermons(self, count):
+        start = Sermon.objects.count()
+        for number in range(start, start + count):
+            sermon = Sermon.objects.create(
+                title=f'Sermon {number}',
+                slug=f'sermon-{number}',
+                preacher='Preacher',
+                sermon_date='2024-01-01',
+                category=self.categories[number % len(self.categories)],
+                audio_file=f'video/upload/v1/sermon_audio/sermon-{number}.mp3',
+                thumbnail=f'image/upload/v1/sermon_thumbnails/sermon-{number}.jpg',
+                bible_references='John 3:16',
+                is_published=True,
+            )
+            SermonRendition.objects.bulk_create([
+                SermonRendition(sermon=sermon, format='mp3', bitrate=bitrate, url=f'/{number}/{bitrate}k.mp3')
+                for bitrate in (32, 64, 128)
+            ])
+
+
+@mock.patch('apps.sermons.signals.queue_audio_processing')
+class SermonQueryCountTests(SermonAPITestCase):
+    """The sermon and category endpoints don't query per row."""
+
+    def count_queries(self, url, params=None):
+        # Count the queries of building the response, not of a cache hit
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url, params=None, expected=None):
+        """Query count doesn't grow with the number of sermons."""
+        self.create_sermons(2)
+        few = self.count_queries(url, params)
+        self.create_sermons(8)
+        many = self.count_queries(url, params)
+        self.assertEqual(few, many)
+        if expected is not None:
+            self.assertEqual(many, expected)
+
+    def test_sermon_list(self, queue_audio_processing):
+        # COUNT, page, renditions
+        self.assertConstantQueries('/api/sermons/sermons/', expected=3)
+
+    def test_sermon_list_filtered(self, queue_audio_processing):
+        self.assertConstantQueries('/api/sermons/sermons/', {
+            'category': self.categories[0].pk,
+            'reference': 'John 3',
+            'ordering': 'title',
+        })
+
+    def test_sermon_detail(self, queue_audio_processing):
+        self.create_sermons(1)
+        sermon = Sermon.objects.get()
+        # Sermon (with category), renditions
+        self.assertEqual(self.count_queries(f'/api/sermons/sermons/{sermon.pk}/'), 2)
+
+    def test_category_list(self, queue_audio_processing):
+        self.assertConstantQueries('/api/sermons/categories/', expected=1)
+
+    def test_category_list_counts(self, queue_audio_processing):
+        self.create_sermons(6)
+        Sermon.objects.filter(slug='sermon-0').update(is_published=False)
+        response = self.client.get('/api/sermons/categories/')
+        counts = {category['id']: category['sermon_count'] for category in response.json()}
+        self.assertEqual(counts, {
+            category.pk: category.sermons.filter(is_published=True).count()
+            for category in self.categories
+        })
+
+    def test_category_sermons(self, queue_audio_processing):
+        self.assertConstantQueries(f'/api/sermons/categories/{self.categories[0].pk}/sermons/')
+
+    def test_play_counts_need_no_queries(self, queue_audio_processing):
+        self.create_sermons(2)
+        with mock.patch.object(counter_buffer, 'flush_interval', 3600):
+            for sermon in Sermon.objects.all():
+                sermon.increment_play_count()
+            self.assertConstantQueries('/api/sermons/sermons/', expected=3)
+            counter_buffer.flush()
+
+
+@mock.patch('apps.sermons.signals.queue_audio_processing')
+class CatalogCacheTests(SermonAPITestCase):
+    """Anonymous catalog reads come from the cache until the catalog changes."""
+
+    def get(self, url, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **headers)
+        return response, len(queries)
+
+    def test_cache_hit_needs_no_queries(self, queue_audio_processing):
+        self.create_sermons(3)
+        sermon = Sermon.objects.first()
+        for url in [
+            '/api/sermons/sermons/',
+            '/api/sermons/sermons/?page=1&ordering=title',
+            f'/api/sermons/sermons/{sermon.pk}/',
+            '/api/sermons/sermons/recent/',
+            '/api/sermons/sermons/featured/',
+            '/api/sermons/categories/',
+        ]:
+            first, _ = self.get(url)
+            second, queries = self.get(url)
+            self.assertEqual(queries, 0, url)
+            self.assertEqual(first.json(), second.json())
+            self.assertEqual(first['ETag'], second['ETag'])
+            self.assertIn('public', second['Cache-Control'])
+
+    def test_query_params_normalized(self, queue_audio_processing):
+        self.create_sermons(2)
+        self.get('/api/sermons/sermons/?ordering=title&page=1')
+        _, queries = self.get('/api/sermons/sermons/?page=1&ordering=title&search=')
+        self.assertEqual(queries, 0)
+
+    def test_etag(self, queue_audio_processing):
+        self.create_sermons(2)
+        response, _ = self.get('/api/sermons/sermons/')
+        not_modified, queries = self.get('/api/sermons/sermons/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(queries, 0)
+
+    def test_changes_retire_cached_responses(self, queue_audio_processing):
+        self.create_sermons(2)
+        response, _ = self.get('/api/sermons/sermons/')
+        with self.captureOnCommitCallbacks(execute=True):
+            sermon = Sermon.objects.first()
+            sermon.title = 'Renamed'
+            sermon.save()
+        changed, queries = self.get('/api/sermons/sermons/')
+        self.assertGreater(queries, 0)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertIn('Renamed', [result['title'] for result in changed.json()['results']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categories[0].name = 'Renamed category'
+            self.categories[0].save()
+        _, queries = self.get('/api/sermons/sermons/')
+        self.assertGreater(queries, 0)
+
+    def test_deletes_retire_cached_responses(self, queue_audio_processing):
+        self.create_sermons(2)
+        self.get('/api/sermons/sermons/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Sermon.objects.first().delete()
+        response, queries = self.get('/api/sermons/sermons/')
+        self.assertGreater(queries, 0)
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_bumps_wait_for_the_commit(self, queue_audio_processing):
+        self.create_sermons(2)
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Sermon.objects.first().save()
+        self.assertEqual(get_catalog_version(), version)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_counters_keep_the_cache(self, queue_audio_processing):
+        self.create_sermons(1)
+        sermon = Sermon.objects.get()
+        user = get_user_model().objects.create_user(email='member@example.com', password='x')
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            SermonLike.objects.create(sermon=sermon, user=user)
+            sermon.increment_play_count()
+            counter_buffer.flush()
+        self.assertEqual(get_catalog_version(), version)
+
+    def test_authenticated_not_cached(self, queue_audio_processing):
+        self.create_sermons(2)
+        user = get_user_model().objects.create_user(email='staff@example.com', password='x', is_staff=True)
+        self.client.force_authenticate(user)
+        self.get('/api/sermons/sermons/')
+        response, queries = self.get('/api/sermons/sermons/')
+        self.assertGreater(queries, 0)
+        self.assertIn('private', response['Cache-Control'])
+
+
+class ResourceUrlTests(TestCase):
+    """Cloudinary URLs are built once per resource."""
+
+    def setUp(self):
+        _build_resource_url.cache_clear()
+
+    def test_memoized(self):
+        field = Sermon._meta.get_field('audio_file')
+        resource = field.to_python('video/upload/v1/sermon_audio/a.mp3')
+        with mock.patch('cloudinary.utils.cloudinary_url', return_value=('https://example/a.mp3', {})) as build:
+            urls = {resource_url(resource) for _ in range(5)}
+            resource_url(field.to_python('video/upload/v1/sermon_audio/a.mp3'))
+        self.assertEqual(urls, {'https://example/a.mp3'})
+        self.assertEqual(build.call_count, 1)
+
+    def test_new_version_rebuilds(self):
+        field = Sermon._meta.get_field('audio_file')
+        first = resource_url(field.to_python('video/upload/v1/sermon_audio/a.mp3'))
+        second = resource_url(field.to_python('video/upload/v2/sermon_audio/a.mp3'))
+        self.assertNotEqual(first, second)
+
+    def test_matches_cloudinary(self):
+        field = Sermon._meta.get_field('thumbnail')
+        resource = field.to_python('image/upload/v1/sermon_thumbnails/a.jpg')
+        self.assertEqual(resource_url(resource), resource.url)
+        self.assertIsNone(resource_url(None))
@@ -0,0 +1,127 @@
+"""
+Tests for audio metadata extraction (audio.py, tasks.process_audio_files).
+"""
+
+import os
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase, TestCase
+import numpy as np
+import urllib3
+
+from apps.sermons.audio import (
+    AudioFetchError,
+    AudioMetadataError,
+    HTTPRangeFile,
+    extract_audio_metadata,
+)
+from apps.sermons.tasks import process_audio_files
+
+from .helpers import FileServer, create_sermon, wav_bytes
+
+# 30 seconds of 16-bit mono audio at 8 kHz: 480 kB
+WAV = wav_bytes(np.zeros(8000 * 30), rate=8000)
+
+
+def write_temporary(test, content, suffix='.wav'):
+    directory = test.enterContext(tempfile.TemporaryDirectory())
+    path = os.path.join(directory, f'audio{suffix}')
+    with open(path, 'wb') as audio_file:
+        audio_file.write(content)
+    return path
+
+
+class ExtractAudioMetadataTests(SimpleTestCase):
+    """Stream information is read from local files and over HTTP."""
+
+    def setUp(self):
+        # No retries, so error statuses are reported at once
+        self.enterContext(mock.patch(
+            'apps.sermons.audio._http', urllib3.PoolManager(retries=False)
+        ))
+
+    def test_local_file(self):
+        metadata = extract_audio_metadata(write_temporary(self, WAV))
+        self.assertEqual(metadata['duration'], 30)
+        self.assertEqual(metadata['bitrate'], 8000 * 16)
+        self.assertEqual(metadata['codec'], 'pcm')
+        self.assertIn('audio/wav', metadata['mime_type'])
+        self.assertEqual(metadata['file_size'], len(WAV))
+
+    def test_url(self):
+        with FileServer(WAV) as server:
+            metadata = extract_audio_metadata(server.url)
+        self.assertEqual(metadata['duration'], 30)
+        self.assertEqual(metadata['file_size'], len(WAV))
+        # Only the header region is downloaded
+        self.assertLess(sum(server.served), len(WAV) // 2)
+
+    def test_server_without_ranges(self):
+        with FileServer(WAV, ranges=False) as server:
+            metadata = extract_audio_metadata(server.url)
+        self.assertEqual(metadata['duration'], 30)
+
+    def test_not_audio(self):
+        with self.assertRaises(AudioMetadataError):
+            extract_audio_metadata(write_temporary(self, b'not audio' * 100, '.txt'))
+
+    def test_missing_file(self):
+        with FileServer(WAV, status=404) as server, self.assertRaises(AudioMetadataError) as raised:
+            extract_audio_metadata(server.url)
+        self.assertNotIsInstance(raised.exception, AudioFetchError)
+
+    def test_server_error_is_retryable(self):
+        with FileServer(WAV, status=503) as server, self.assertRaises(AudioFetchError):
+            extract_audio_metadata(server.url)
+
+
+class HTTPRangeFileTests(SimpleTestCase):
+    """Reads are served from fetched blocks, each fetched once."""
+
+    def test_reads(self):
+        content = bytes(range(256)) * 100
+        with FileServer(content) as server:
+            remote = HTTPRangeFile(server.url, block_size=1000, http=urllib3.PoolManager())
+            self.assertEqual(remote.size, len(content))
+            remote.seek(2500)
+            self.assertEqual(remote.read(1000), content[2500:3500])
+            remote.seek(-10, os.SEEK_END)
+            self.assertEqual(remote.read(), content[-10:])
+            fetched = remote.bytes_fetched
+            # Cached blocks aren't fetched again
+            remote.seek(2600)
+            self.assertEqual(remote.read(100), content[2600:2700])
+            self.assertEqual(remote.bytes_fetched, fetched)
+        self.assertLess(fetched, len(content) // 4)
+
+    def test_empty_file(self):
+        with FileServer(b'') as server:
+            remote = HTTPRangeFile(server.url, http=urllib3.PoolManager())
+            self.assertEqual(remote.size, 0)
+            self.assertEqual(remote.read(), b'')
+
+
+@mock.patch('apps.sermons.signals.queue_audio_processing')
+class ProcessAudioFilesTests(TestCase):
+    """Extracted metadata is saved on the sermons in bulk."""
+
+    def test_saves_metadata(self, queue_audio_processing):
+        path = write_temporary(self, WAV)
+        sermons = [create_sermon(number) for number in range(2)]
+        broken = create_sermon(2)
+        locations = {sermons[0].pk: path, sermons[1].pk: path, broken.pk: path + '.missing'}
+
+        with mock.patch('apps.sermons.tasks.get_audio_location', lambda sermon: locations[sermon.pk]):
+            processed = process_audio_files(list(locations))
+
+        self.assertEqual(processed, 2)
+        for sermon in sermons:
+            sermon.refresh_from_db()
+            self.assertEqual(sermon.duration, 30)
+            self.assertEqual(sermon.bitrate, 8000 * 16)
+            self.assertEqual(sermon.audio_codec, 'pcm')
+            self.assertEqual(sermon.file_size, len(WAV))
+            self.assertEqual(sermon.processing_status, 'completed')
+        broken.refresh_from_db()
+        self.assertEqual(broken.processing_status, 'failed')
+        self.assertTrue(broken.processing_errors)
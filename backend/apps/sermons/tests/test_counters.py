@@ -0,0 +1,234 @@
+"""
+Tests for the sermon counters (counters.py).
+"""
+
+import io
+from unittest import mock
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.sermons.counters import CounterBuffer, counter_buffer, rebuild_counters
+from apps.sermons.models import Sermon, SermonComment, SermonLike
+
+from .helpers import create_sermon, create_user
+
+
+def counts(sermon):
+    sermon.refresh_from_db()
+    return sermon.play_count, sermon.download_count
+
+
+@mock.patch('apps.sermons.signals.queue_audio_processing')
+class CounterBufferTests(TestCase):
+    """Play and download counts are buffered and written in bulk."""
+
+    def setUp(self):
+        with mock.patch('apps.sermons.signals.queue_audio_processing'):
+            self.sermons = [create_sermon(number) for number in range(3)]
+        # Buffer without a flusher thread; the tests flush explicitly
+        self.buffer = CounterBuffer(flush_interval=3600)
+        self.enterContext(mock.patch.object(self.buffer, '_ensure_flusher'))
+
+    def test_increment(self, queue_audio_processing):
+        first, second, _ = self.sermons
+        self.buffer.increment(first.pk, 'play_count')
+        self.buffer.increment(first.pk, 'play_count', 2)
+        self.buffer.increment(second.pk, 'download_count')
+
+        self.assertEqual(self.buffer.pending(first.pk), {'play_count': 3, 'download_count': 0})
+        self.assertEqual(self.buffer.pending(second.pk), {'play_count': 0, 'download_count': 1})
+        self.assertEqual(counts(first), (0, 0))
+        with self.assertRaises(ValueError):
+            self.buffer.increment(first.pk, 'like_count')
+
+    def test_flush(self, queue_audio_processing):
+        first, second, third = self.sermons
+        updated_at = first.updated_at
+        self.buffer.increment(first.pk, 'play_count', 3)
+        self.buffer.increment(first.pk, 'download_count')
+        self.buffer.increment(second.pk, 'play_count')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(len(queries), 1)
+
+        self.assertEqual(counts(first), (3, 1))
+        self.assertEqual(counts(second), (1, 0))
+        self.assertEqual(counts(third), (0, 0))
+        self.assertEqual(first.updated_at, updated_at)
+        self.assertEqual(self.buffer.pending(first.pk), {'play_count': 0, 'download_count': 0})
+        self.assertEqual(self.buffer.flush(), 0)
+
+    @mock.patch('apps.sermons.counters.FLUSH_BATCH_SIZE', 2)
+    def test_failed_flush_keeps_the_rest_buffered(self, queue_audio_processing):
+        for sermon in self.sermons:
+            self.buffer.increment(sermon.pk, 'play_count', 2)
+
+        update = Sermon.objects.filter
+        calls = []
+
+        def fail_second_batch(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise DatabaseError('connection lost')
+            return update(*args, **kwargs)
+
+        with mock.patch.object(Sermon.objects, 'filter', fail_second_batch), \
+                self.assertLogs('apps.sermons.counters', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 2)
+
+        self.assertEqual([counts(sermon)[0] for sermon in self.sermons], [2, 2, 0])
+        self.assertEqual(self.buffer.pending(self.sermons[2].pk)['play_count'], 2)
+        self.buffer.increment(self.sermons[2].pk, 'play_count')
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(counts(self.sermons[2])[0], 3)
+
+    def test_write_through(self, queue_audio_processing):
+        buffer = CounterBuffer(flush_interval=0)
+        with mock.patch.object(buffer, '_ensure_flusher') as ensure_flusher:
+            buffer.increment(self.sermons[0].pk, 'download_count')
+        ensure_flusher.assert_not_called()
+        self.assertEqual(counts(self.sermons[0]), (0, 1))
+
+    def test_max_pending_wakes_the_flusher(self, queue_audio_processing):
+        self.buffer.max_pending = 2
+        self.buffer.increment(self.sermons[0].pk, 'play_count')
+        self.assertFalse(self.buffer._wake.is_set())
+        self.buffer.increment(self.sermons[1].pk, 'play_count')
+        self.assertTrue(self.buffer._wake.is_set())
+
+    @mock.patch('apps.sermons.counters.threading.Thread')
+    @mock.patch('apps.sermons.counters.atexit.register')
+    def test_exit_flush_registered_once_buffering(self, register, thread, queue_audio_processing):
+        buffer = CounterBuffer(flush_interval=3600)
+        register.assert_not_called()
+        buffer.increment(self.sermons[0].pk, 'play_count')
+        buffer.increment(self.sermons[0].pk, 'play_count')
+        register.assert_called_once_with(buffer.flush)
+        thread.return_value.start.assert_called_once()
+
+
+@mock.patch('apps.sermons.signals.queue_audio_processing')
+class PlayCountEndpointTests(TestCase):
+    """The increment endpoints buffer, and reads include the buffer."""
+
+    def setUp(self):
+        with mock.patch('apps.sermons.signals.queue_audio_processing'):
+            self.sermon = create_sermon()
+        self.client = APIClient()
+        self.client.force_authenticate(create_user())
+        self.enterContext(mock.patch.object(counter_buffer, 'flush_interval', 3600))
+        self.enterContext(mock.patch.object(counter_buffer, '_ensure_flusher'))
+        self.addCleanup(counter_buffer.flush)
+
+    def test_increment_endpoints(self, queue_audio_processing):
+        for _ in range(2):
+            response = self.client.post(f'/api/sermons/sermons/{self.sermon.pk}/increment_play_count/')
+            self.assertEqual(response.status_code, 200)
+        self.client.post(f'/api/sermons/sermons/{self.sermon.pk}/increment_download_count/')
+
+        self.assertEqual(counts(self.sermon), (0, 0))
+        self.assertEqual(self.sermon.current_play_count, 2)
+        self.assertEqual(self.sermon.current_download_count, 1)
+
+        counter_buffer.flush()
+        self.assertEqual(counts(self.sermon), (2, 1))
+        self.assertEqual(self.sermon.current_play_count, 2)
+
+    def test_unpublished_sermons_are_not_counted(self, queue_audio_processing):
+        self.sermon.is_published = False
+        self.sermon.save()
+        response = self.client.post(f'/api/sermons/sermons/{self.sermon.pk}/increment_play_count/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(counter_buffer.pending(self.sermon.pk)['play_count'], 0)
+
+
+def social_counts(sermon):
+    sermon.refresh_from_db()
+    return sermon.like_count, sermon.comment_count
+
+
+@mock.patch('apps.sermons.signals.queue_audio_processing')
+class DenormalizedCounterTests(TestCase):
+    """Like and comment counts follow their rows."""
+
+    def setUp(self):
+        with mock.patch('apps.sermons.signals.queue_audio_processing'):
+            self.sermon = create_sermon()
+        self.users = [create_user(f'user{number}@example.com') for number in range(2)]
+
+    def test_signals(self, queue_audio_processing):
+        likes = [SermonLike.objects.create(sermon=self.sermon, user=user) for user in self.users]
+        comment = SermonComment.objects.create(sermon=self.sermon, user=self.users[0], content='Amen')
+        self.assertEqual(social_counts(self.sermon), (2, 1))
+
+        # Saving again doesn't count twice
+        comment.content = 'Amen!'
+        comment.save()
+        likes[0].delete()
+        self.assertEqual(social_counts(self.sermon), (1, 1))
+
+        comment.delete()
+        likes[1].delete()
+        self.assertEqual(social_counts(self.sermon), (0, 0))
+
+    def test_never_negative(self, queue_audio_processing):
+        like = SermonLike.objects.create(sermon=self.sermon, user=self.users[0])
+        Sermon.objects.filter(pk=self.sermon.pk).update(like_count=0)
+        like.delete()
+        self.assertEqual(social_counts(self.sermon), (0, 0))
+
+    def test_sermon_deletion_cascades(self, queue_audio_processing):
+        SermonLike.objects.create(sermon=self.sermon, user=self.users[0])
+        SermonComment.objects.create(sermon=self.sermon, user=self.users[0], content='Amen')
+        # The cascaded rows' signals adjust a sermon that is going away
+        self.sermon.delete()
+        self.assertFalse(SermonLike.objects.exists())
+
+    def test_rebuild(self, queue_audio_processing):
+        with mock.patch('apps.sermons.signals.queue_audio_processing'):
+            other = create_sermon(1)
+        for user in self.users:
+            SermonLike.objects.create(sermon=self.sermon, user=user)
+        SermonComment.objects.create(sermon=other, user=self.users[0], content='Amen')
+        Sermon.objects.update(like_count=7, comment_count=7)
+
+        self.assertEqual(rebuild_counters(), 2)
+        self.assertEqual(social_counts(self.sermon), (2, 0))
+        self.assertEqual(social_counts(other), (0, 1))
+
+        Sermon.objects.update(like_count=0)
+        output = io.StringIO()
+        call_command('rebuild_sermon_counters', stdout=output)
+        self.assertIn('2 sermons', output.getvalue())
+        self.assertEqual(social_counts(self.sermon), (2, 0))
+
+    def test_like_endpoint(self, queue_audio_processing):
+        client = APIClient()
+        url = f'/api/sermons/sermons/{self.sermon.pk}/like/'
+        self.assertEqual(client.post(url).status_code, 401)
+
+        client.force_authenticate(self.users[0])
+        for _ in range(2):
+            response = client.post(url)
+            self.assertEqual(response.data, {'liked': True, 'like_count': 1})
+        client.force_authenticate(self.users[1])
+        self.assertEqual(client.post(url).data['like_count'], 2)
+        self.assertEqual(client.delete(url).data, {'liked': False, 'like_count': 1})
+        self.assertEqual(client.delete(url).data['like_count'], 1)
+
+    def test_comments_endpoint(self, queue_audio_processing):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        url = f'/api/sermons/sermons/{self.sermon.pk}/comments/'
+        response = client.post(url, {'content': 'Amen'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['user_name'], 'user0@example.com')
+        self.assertEqual(client.post(url, {}, format='json').status_code, 400)
+        self.assertEqual(social_counts(self.sermon), (0, 1))
+
+        response = APIClient().get(url)
+        self.assertEqual([comment['content'] for comment in response.data['results']], ['Amen'])
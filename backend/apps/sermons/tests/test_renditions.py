@@ -0,0 +1,227 @@
+"""
+Tests for the bitrate ladder (renditions.py, tasks.generate_renditions).
+"""
+
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+import cloudinary
+import numpy as np
+
+from apps.sermons.models import Sermon, SermonRendition
+from apps.sermons.renditions import (
+    CloudinaryTranscoder,
+    LocalTranscoder,
+    build_master_playlist,
+    get_client_bandwidth,
+    pick_rendition,
+)
+from apps.sermons.tasks import generate_renditions
+
+from .helpers import create_sermon, wav_bytes
+
+
+def setUpModule():
+    # URLs are built locally, but need a cloud name to build
+    global _cloud_name
+    _cloud_name = cloudinary.config().cloud_name
+    cloudinary.config(cloud_name=_cloud_name or 'test')
+
+
+def tearDownModule():
+    cloudinary.config(cloud_name=_cloud_name)
+
+
+def renditions(*bitrates):
+    return [SimpleNamespace(bitrate=bitrate, url=f'/{bitrate}k') for bitrate in bitrates]
+
+
+class PickRenditionTests(SimpleTestCase):
+    """The best rendition that fits the bandwidth is picked."""
+
+    def test_pick(self):
+        ladder = renditions(128, 32, 64)
+        cases = [
+            (None, 128),
+            (1000, 128),
+            (128, 128),
+            (100, 64),
+            (64, 64),
+            (40, 32),
+            (10, 32),
+            (0, 32),
+        ]
+        for bandwidth, bitrate in cases:
+            with self.subTest(bandwidth=bandwidth):
+                self.assertEqual(pick_rendition(ladder, bandwidth).bitrate, bitrate)
+
+    def test_no_renditions(self):
+        self.assertIsNone(pick_rendition([], 100))
+
+
+class ClientBandwidthTests(SimpleTestCase):
+    """The bandwidth comes from ?bandwidth= or the client hints."""
+
+    def bandwidth(self, query='', **headers):
+        return get_client_bandwidth(Request(APIRequestFactory().get(f'/{query}', headers=headers)))
+
+    def test_bandwidth(self):
+        cases = [
+            ({}, None),
+            ({'query': '?bandwidth=48'}, 48),
+            ({'query': '?bandwidth=-5'}, 0),
+            ({'query': '?bandwidth=fast'}, None),
+            ({'query': '?bandwidth=48', 'Save-Data': 'on'}, 48),
+            ({'Save-Data': 'on', 'Downlink': '10'}, 0),
+            ({'Save-Data': 'off'}, None),
+            ({'Downlink': '0.1'}, 80),
+            ({'Downlink': 'fast'}, None),
+        ]
+        for arguments, bandwidth in cases:
+            with self.subTest(**arguments):
+                self.assertEqual(self.bandwidth(**arguments), bandwidth)
+
+
+class MasterPlaylistTests(SimpleTestCase):
+    def test_variants_by_bitrate(self):
+        self.assertEqual(build_master_playlist(renditions(64, 32)), (
+            '#EXTM3U\n#EXT-X-VERSION:3\n'
+            '#EXT-X-STREAM-INF:BANDWIDTH=32000\n/32k\n'
+            '#EXT-X-STREAM-INF:BANDWIDTH=64000\n/64k\n'
+        ))
+
+
+class CloudinaryTranscoderTests(TestCase):
+    """Renditions are derived eagerly and delivered by URL."""
+
+    @mock.patch('apps.sermons.signals.queue_audio_processing')
+    def test_transcode(self, queue_audio_processing):
+        sermon = Sermon.objects.get(pk=create_sermon().pk)
+        gateway = mock.Mock()
+        with mock.patch('apps.sermons.renditions.get_gateway', return_value=gateway):
+            urls = CloudinaryTranscoder().transcode(sermon, 'unused', [('mp3', 32), ('m3u8', 64)])
+
+        name, _, public_id = gateway.call.call_args.args
+        self.assertEqual((name, public_id), ('explicit', 'sermon_audio/sermon-0'))
+        self.assertEqual(gateway.call.call_args.kwargs['eager'], [
+            {'bit_rate': '32k', 'audio_codec': 'mp3', 'format': 'mp3'},
+            {'bit_rate': '64k', 'audio_codec': 'aac', 'video_codec': 'none', 'format': 'm3u8'},
+        ])
+        self.assertTrue(gateway.call.call_args.kwargs['eager_async'])
+
+        self.assertRegex(urls[('mp3', 32)], r'/video/upload/ac_mp3,br_32k/.*sermon_audio/sermon-0\.mp3$')
+        self.assertRegex(urls[('m3u8', 64)], r'/video/upload/ac_aac,br_64k,vc_none/.*sermon_audio/sermon-0\.m3u8$')
+
+
+@mock.patch('apps.sermons.signals.queue_audio_processing')
+class GenerateRenditionsTests(TestCase):
+    """The local transcoder renders the ladder without ffmpeg."""
+
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.source = os.path.join(directory, 'audio.wav')
+        with open(self.source, 'wb') as audio_file:
+            audio_file.write(wav_bytes(np.zeros(8000)))
+        self.root = os.path.join(directory, 'renditions')
+        self.enterContext(override_settings(
+            SERMON_RENDITIONS_ROOT=self.root, SERMON_RENDITIONS_URL='/renditions/'
+        ))
+        self.transcoder = LocalTranscoder()
+        self.transcoder.ffmpeg = None
+        self.enterContext(mock.patch('apps.sermons.tasks.get_transcoder', return_value=self.transcoder))
+        self.enterContext(mock.patch('apps.sermons.tasks.get_audio_location', return_value=self.source))
+
+    def render(self, sermon, ladder):
+        with mock.patch('apps.sermons.tasks.get_ladder', return_value=ladder):
+            return generate_renditions([sermon.pk])
+
+    def test_ladder(self, queue_audio_processing):
+        sermon = create_sermon(duration=1)
+        self.assertEqual(self.render(sermon, [('mp3', 32), ('mp3', 64), ('m3u8', 32)]), 1)
+
+        self.assertEqual(
+            list(SermonRendition.objects.values_list('format', 'bitrate', 'url')),
+            [
+                ('m3u8', 32, f'/renditions/{sermon.pk}/hls_32k/index.m3u8'),
+                ('mp3', 32, f'/renditions/{sermon.pk}/32k.mp3'),
+                ('mp3', 64, f'/renditions/{sermon.pk}/64k.mp3'),
+            ],
+        )
+        with open(self.source, 'rb') as original, \
+                open(os.path.join(self.root, str(sermon.pk), '64k.mp3'), 'rb') as rendition:
+            self.assertEqual(rendition.read(), original.read())
+        with open(os.path.join(self.root, str(sermon.pk), 'hls_32k', 'index.m3u8')) as playlist:
+            self.assertIn('../original\n', playlist.read())
+
+    def test_dropped_steps_are_deleted(self, queue_audio_processing):
+        sermon = create_sermon()
+        self.render(sermon, [('mp3', 32), ('mp3', 64)])
+        self.render(sermon, [('mp3', 64), ('mp3', 128)])
+        self.assertEqual(list(SermonRendition.objects.values_list('bitrate', flat=True)), [64, 128])
+
+    def test_failures_keep_the_renditions(self, queue_audio_processing):
+        sermon = create_sermon()
+        self.render(sermon, [('mp3', 32)])
+        with mock.patch.object(self.transcoder, 'transcode', side_effect=OSError('disk full')):
+            self.assertEqual(self.render(sermon, [('mp3', 64)]), 0)
+        self.assertEqual(list(SermonRendition.objects.values_list('bitrate', flat=True)), [32])
+
+
+@mock.patch('apps.sermons.signals.queue_audio_processing')
+class RenditionEndpointTests(TestCase):
+    """The audio endpoint redirects to the rendition that fits."""
+
+    def setUp(self):
+        self.client = APIClient()
+        with mock.patch('apps.sermons.signals.queue_audio_processing'):
+            self.sermon = create_sermon()
+        for rendition_format in ('mp3', 'm3u8'):
+            for bitrate in (32, 64, 128):
+                SermonRendition.objects.create(
+                    sermon=self.sermon, format=rendition_format, bitrate=bitrate,
+                    url=f'/{bitrate}k.{rendition_format}',
+                )
+
+    def audio(self, query='', **headers):
+        return self.client.get(f'/api/sermons/sermons/{self.sermon.pk}/audio/{query}', headers=headers)
+
+    def test_audio_redirect(self, queue_audio_processing):
+        cases = [
+            ({}, '/128k.mp3'),
+            ({'query': '?bandwidth=100'}, '/64k.mp3'),
+            ({'Save-Data': 'on'}, '/32k.mp3'),
+            ({'Downlink': '0.1'}, '/64k.mp3'),
+        ]
+        for arguments, url in cases:
+            with self.subTest(**arguments):
+                response = self.audio(**arguments)
+                self.assertEqual(response.status_code, 302)
+                self.assertEqual(response['Location'], url)
+                self.assertEqual(response['Accept-CH'], 'Downlink, Save-Data')
+                self.assertIn('Save-Data', response['Vary'])
+
+    def test_audio_falls_back_to_the_original(self, queue_audio_processing):
+        SermonRendition.objects.all().delete()
+        response = self.audio()
+        self.assertEqual(response.status_code, 302)
+        self.sermon.refresh_from_db()
+        self.assertEqual(response['Location'], self.sermon.get_audio_url())
+
+    def test_hls(self, queue_audio_processing):
+        response = self.client.get(f'/api/sermons/sermons/{self.sermon.pk}/hls/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.apple.mpegurl')
+        self.assertEqual(response.content.decode().splitlines()[-1], '/128k.m3u8')
+
+        SermonRendition.objects.filter(format='m3u8').delete()
+        response = self.client.get(f'/api/sermons/sermons/{self.sermon.pk}/hls/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_unpublished_sermons_are_hidden(self, queue_audio_processing):
+        self.sermon.is_published = False
+        self.sermon.save()
+        self.assertEqual(self.audio().status_code, 404)
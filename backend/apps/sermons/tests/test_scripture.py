@@ -0,0 +1,162 @@
+"""
+Tests for the scripture index (scripture.py).
+"""
+
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+import cloudinary
+
+from apps.sermons.models import SermonBibleReference
+from apps.sermons.scripture import CHAPTER_END, find_book, parse_references, verse_positions
+
+from .helpers import create_sermon
+
+END = CHAPTER_END
+
+
+def setUpModule():
+    # URLs are built locally, but need a cloud name to build
+    global _cloud_name
+    _cloud_name = cloudinary.config().cloud_name
+    cloudinary.config(cloud_name=_cloud_name or 'test')
+
+
+def tearDownModule():
+    cloudinary.config(cloud_name=_cloud_name)
+
+
+class FindBookTests(SimpleTestCase):
+    def test_find_book(self):
+        cases = [
+            ('Genesis', 1),
+            ('gn', 1),
+            ('Gen.', 1),
+            ('1 Cor', 46),
+            ('I Corinthians', 46),
+            ('Second Kings', 12),
+            ('Ps', 19),
+            ('jud', None),  # Judges or Jude
+            ('Hezekiah', None),
+        ]
+        for name, book in cases:
+            with self.subTest(name=name):
+                self.assertEqual(find_book(name), book)
+
+
+class ParseReferencesTests(SimpleTestCase):
+    """References are split into one row per chapter."""
+
+    def test_parse(self):
+        cases = [
+            ('John 3:16', [(43, 3, 16, 16)]),
+            ('John 3:16-17', [(43, 3, 16, 17)]),
+            ('John 3:16–17', [(43, 3, 16, 17)]),
+            ('John 3.16b-18a', [(43, 3, 16, 18)]),
+            ('John 3:16-4', [(43, 3, 16, END), (43, 4, 1, END)]),
+            ('John 3:16-4:2', [(43, 3, 16, END), (43, 4, 1, 2)]),
+            ('Romans 8', [(45, 8, 1, END)]),
+            ('Romans 8-9', [(45, 8, 1, END), (45, 9, 1, END)]),
+            ('Romans 8-9:5', [(45, 8, 1, END), (45, 9, 1, 5)]),
+            ('Jude 5-7', [(65, 1, 5, 7)]),
+            ('Ruth', [(8, chapter, 1, END) for chapter in range(1, 5)]),
+            # After a comma bare numbers are verses, after a semicolon chapters
+            ('John 3:16, 18; 4', [(43, 3, 16, 16), (43, 3, 18, 18), (43, 4, 1, END)]),
+            ('John 3:16-4, 6', [(43, 3, 16, END), (43, 4, 1, END), (43, 6, 1, END)]),
+            ('John 3:16, Romans 8:28-30', [(43, 3, 16, 16), (45, 8, 28, 30)]),
+            # Ranges past the last chapter are cut short
+            ('Genesis 49-60', [(1, 49, 1, END), (1, 50, 1, END)]),
+            # Anything else is skipped
+            ('Genesis 51, John 3:16', [(43, 3, 16, 16)]),
+            ('John 3:16-2; Romans 9:5-8:28', []),
+            ('Hezekiah 1:1', []),
+            ('3:16', []),
+            ('', []),
+        ]
+        for text, rows in cases:
+            with self.subTest(text=text):
+                self.assertEqual(parse_references(text), rows)
+
+    def test_strict(self):
+        self.assertEqual(parse_references('John 3:16-4', strict=True), [(43, 3, 16, END), (43, 4, 1, END)])
+        cases = [
+            ('Genesis 51', 'Genesis has 50 chapters'),
+            ('Genesis 49-60', 'Genesis has 50 chapters'),
+            ('John 22:1', 'John has 21 chapters'),
+            ('John 0', 'John has 21 chapters'),
+            ('John 3:16-2', 'ends before it starts'),
+            ('Romans 9-8', 'ends before it starts'),
+            ('Romans 9:5-8:28', 'ends before it starts'),
+            ('Hezekiah 1:1', 'Unknown book'),
+            ('3:16', 'No book'),
+            ('John 3:16!', "Can't parse"),
+        ]
+        for text, message in cases:
+            with self.subTest(text=text), self.assertRaisesRegex(ValueError, message):
+                parse_references(text, strict=True)
+
+
+class VersePositionsTests(SimpleTestCase):
+    """Rows become absolute verse spans, merged where they touch."""
+
+    def test_positions(self):
+        cases = [
+            ([(43, 3, 16, 17)], [(43003016, 43003017)]),
+            # Overlapping and out of order
+            ([(43, 3, 17, 20), (43, 3, 16, 18)], [(43003016, 43003020)]),
+            ([(43, 3, 16, 16), (43, 3, 18, 18)], [(43003016, 43003016), (43003018, 43003018)]),
+            # Running through the end of a chapter into the next one
+            ([(43, 3, 16, END), (43, 4, 1, 2)], [(43003016, 43004002)]),
+            # Not when the first chapter stops short
+            ([(43, 3, 16, 20), (43, 4, 1, 2)], [(43003016, 43003020), (43004001, 43004002)]),
+            ([(43, 3, 16, END), (43, 5, 1, 2)], [(43003016, 43003999), (43005001, 43005002)]),
+            ([], []),
+        ]
+        for rows, spans in cases:
+            with self.subTest(rows=rows):
+                self.assertEqual(verse_positions(rows), spans)
+
+
+@mock.patch('apps.sermons.signals.queue_audio_processing')
+class BibleReferenceFilterTests(TestCase):
+    """?reference= finds sermons whose references overlap the passage."""
+
+    def setUp(self):
+        with mock.patch('apps.sermons.signals.queue_audio_processing'):
+            create_sermon(0, bible_references='John 3:16-18')
+            create_sermon(1, bible_references='John 3:30-4:5; Romans 8')
+            create_sermon(2, bible_references='Genesis 1')
+
+    def reference(self, text):
+        cache.clear()
+        return APIClient().get('/api/sermons/sermons/', {'reference': text})
+
+    def test_indexed_on_save(self, queue_audio_processing):
+        rows = SermonBibleReference.objects.filter(sermon__slug='sermon-1').order_by('book', 'chapter')
+        self.assertEqual(
+            list(rows.values_list('book', 'chapter', 'verse_start', 'verse_end')),
+            [(43, 3, 30, END), (43, 4, 1, 5), (45, 8, 1, END)],
+        )
+
+    def test_overlaps(self, queue_audio_processing):
+        cases = [
+            ('John 3:17', ['sermon-0']),
+            ('John 3', ['sermon-0', 'sermon-1']),
+            ('John 4:5-10', ['sermon-1']),
+            ('John 3:19-29', []),
+            ('Rom 8:28', ['sermon-1']),
+            ('Genesis 1:1, John 3:16', ['sermon-0', 'sermon-2']),
+        ]
+        for text, slugs in cases:
+            with self.subTest(text=text):
+                response = self.reference(text)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(sorted(sermon['slug'] for sermon in response.data['results']), slugs)
+
+    def test_invalid_reference(self, queue_audio_processing):
+        for text in ('Genesis 51', 'John 3:16-2', 'Hezekiah 1'):
+            with self.subTest(text=text):
+                response = self.reference(text)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('reference', response.data)
@@ -0,0 +1,88 @@
+"""
+Tests for full-text sermon search (search.py).
+"""
+
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+import cloudinary
+
+from apps.sermons.models import Sermon
+from apps.sermons.search import fts5_query
+
+from .helpers import create_sermon
+
+
+def setUpModule():
+    # URLs are built locally, but need a cloud name to build
+    global _cloud_name
+    _cloud_name = cloudinary.config().cloud_name
+    cloudinary.config(cloud_name=_cloud_name or 'test')
+
+
+def tearDownModule():
+    cloudinary.config(cloud_name=_cloud_name)
+
+
+@mock.patch('apps.sermons.signals.queue_audio_processing')
+class SermonSearchTests(TestCase):
+    """?search= matches the FTS5 table, most relevant first."""
+
+    def setUp(self):
+        with mock.patch('apps.sermons.signals.queue_audio_processing'):
+            self.grace = create_sermon(0, title='Amazing Grace', description='Saved by faith')
+            self.faith = create_sermon(1, title='Faith and Works', description='Grace abounds')
+            self.hope = create_sermon(2, title='Living Hope', preacher='Grace Smith', sermon_date='2024-02-01')
+            self.other = create_sermon(3, title='The Prodigal Son', bible_references='Luke 15:11-32')
+
+    def search(self, query, **params):
+        # Catalog responses are cached until the commit bumps the version
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/api/sermons/sermons/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [sermon['slug'] for sermon in response.data['results']], queries
+
+    def test_ranking(self, queue_audio_processing):
+        # Title and preacher matches outrank description matches
+        slugs, _ = self.search('grace')
+        self.assertEqual(set(slugs[:2]), {'sermon-0', 'sermon-2'})
+        self.assertEqual(slugs[2:], ['sermon-1'])
+
+    def test_every_term_as_prefix(self, queue_audio_processing):
+        self.assertEqual(self.search('graci')[0], [])
+        self.assertEqual(self.search('amaz gra')[0], ['sermon-0'])
+        self.assertEqual(self.search('luke')[0], ['sermon-3'])
+
+    def test_single_query(self, queue_audio_processing):
+        # Matching and ranking are joined into the page query
+        _, queries = self.search('grace')
+        page = [query['sql'] for query in queries if 'bm25' in query['sql']]
+        self.assertEqual(len(page), 1)
+        self.assertIn('MATCH', page[0])
+        self.assertIn('ORDER BY', page[0])
+
+    def test_index_follows_changes(self, queue_audio_processing):
+        self.other.title = 'Grace for the prodigal'
+        self.other.save()
+        self.hope.delete()
+        slugs, _ = self.search('grace')
+        self.assertIn('sermon-3', slugs)
+        self.assertNotIn('sermon-2', slugs)
+        self.assertEqual(self.search('prodigal')[0], ['sermon-3'])
+
+    def test_explicit_ordering(self, queue_audio_processing):
+        slugs, _ = self.search('grace', ordering='title')
+        self.assertEqual(slugs, ['sermon-0', 'sermon-1', 'sermon-2'])
+
+    def test_unpublished_sermons_are_hidden(self, queue_audio_processing):
+        Sermon.objects.filter(pk=self.grace.pk).update(is_published=False)
+        self.assertNotIn('sermon-0', self.search('grace')[0])
+
+    def test_fts5_query(self, queue_audio_processing):
+        self.assertEqual(fts5_query(['grace', 'say "amen"']), '"grace"* "say ""amen"""*')
+        # Quotes and operators are taken literally
+        self.assertEqual(self.search('"grace" OR')[0], [])
@@ -0,0 +1,127 @@
+"""
+Tests for waveform peaks (waveform.py, tasks.generate_waveforms).
+"""
+
+import os
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+import numpy as np
+
+from apps.sermons.audio import AudioMetadataError
+from apps.sermons.models import SermonWaveform
+from apps.sermons.tasks import generate_waveforms
+from apps.sermons.waveform import BLOCK_SIZE, compute_waveform, reduce_peaks
+
+from .helpers import create_sermon, wav_bytes
+
+
+def pairs(peaks):
+    values = np.frombuffer(peaks, dtype=np.int8)
+    return list(zip(values[0::2].tolist(), values[1::2].tolist()))
+
+
+class ReducePeaksTests(SimpleTestCase):
+    """Samples are reduced to int8 min/max pairs per bucket."""
+
+    def test_buckets(self):
+        # Four quarters of increasing loudness
+        samples = np.concatenate([
+            np.tile(np.array([-level, level], dtype=np.int16), BLOCK_SIZE * 4)
+            for level in (256, 2560, 12800, 32512)
+        ])
+        self.assertEqual(pairs(reduce_peaks([samples], 4)), [(-1, 1), (-10, 10), (-50, 50), (-127, 127)])
+        self.assertEqual(pairs(reduce_peaks([samples], 2)), [(-10, 10), (-127, 127)])
+
+    def test_chunk_boundaries_dont_matter(self):
+        samples = np.random.default_rng(1).integers(-32768, 32767, 10000, dtype=np.int16)
+        whole = reduce_peaks([samples], 50)
+        chunked = reduce_peaks(np.array_split(samples, [7, 300, 301, 4999]), 50)
+        self.assertEqual(whole, chunked)
+
+    def test_short_audio_has_fewer_buckets(self):
+        samples = np.array([0, 1000, -1000], dtype=np.int16)
+        self.assertEqual(pairs(reduce_peaks([samples], 100)), [(-4, 3)])
+
+    def test_no_samples(self):
+        with self.assertRaises(AudioMetadataError):
+            reduce_peaks([], 10)
+
+
+class ComputeWaveformTests(SimpleTestCase):
+    """WAV files are decoded without ffmpeg."""
+
+    def write(self, content):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, 'audio.wav')
+        with open(path, 'wb') as audio_file:
+            audio_file.write(content)
+        return path
+
+    def test_sample_widths(self):
+        samples = np.tile(np.array([-16384, 16384], dtype=np.int16), 4000)
+        for width in (1, 2, 4):
+            with self.subTest(width=width):
+                path = self.write(wav_bytes(samples, width=width))
+                peaks = compute_waveform(path, 10, ffmpeg=None)
+                self.assertEqual(pairs(peaks), [(-64, 64)] * 10)
+
+    def test_not_wav(self):
+        with self.assertRaises(AudioMetadataError):
+            compute_waveform(self.write(b'ID3\x03\x00 not wav'), 10, ffmpeg=None)
+
+
+@mock.patch('apps.sermons.signals.queue_audio_processing')
+@mock.patch('apps.sermons.tasks.FFMPEG_BINARY', None)
+@mock.patch('apps.sermons.tasks.WAVEFORM_BUCKETS', 20)
+class WaveformTaskTests(TestCase):
+    """Waveforms are saved in bulk and served as raw bytes."""
+
+    def test_generate_and_serve(self, queue_audio_processing):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, 'audio.wav')
+        with open(path, 'wb') as audio_file:
+            audio_file.write(wav_bytes(np.full(8000, 8192)))
+        sermon = create_sermon()
+
+        with mock.patch('apps.sermons.tasks.get_audio_location', return_value=path):
+            self.assertEqual(generate_waveforms([sermon.pk]), 1)
+            # Generating again replaces the peaks
+            self.assertEqual(generate_waveforms([sermon.pk]), 1)
+
+        waveform = SermonWaveform.objects.get()
+        self.assertEqual(waveform.buckets, 20)
+
+        response = APIClient().get(f'/api/sermons/sermons/{sermon.pk}/waveform/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Waveform-Buckets'], '20')
+        self.assertEqual(pairs(response.content), [(32, 32)] * 20)
+
+    def test_unpublished_sermons_are_hidden(self, queue_audio_processing):
+        sermon = create_sermon(is_published=False)
+        SermonWaveform.objects.create(sermon=sermon, buckets=1, peaks=b'\x00\x00')
+        response = APIClient().get(f'/api/sermons/sermons/{sermon.pk}/waveform/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_requests(self, queue_audio_processing):
+        sermon = create_sermon()
+        waveform = SermonWaveform.objects.create(sermon=sermon, buckets=1, peaks=b'\x00\x00')
+        url = f'/api/sermons/sermons/{sermon.pk}/waveform/'
+        etag = APIClient().get(url)['ETag']
+
+        for header in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            with self.subTest(header=header):
+                response = APIClient().get(url, HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+        # A longer tag that merely contains it doesn't match
+        response = APIClient().get(url, HTTP_IF_NONE_MATCH=f'"x{etag[1:]}')
+        self.assertEqual(response.status_code, 200)
+
+        # New peaks get a new ETag, even within the same second
+        SermonWaveform.objects.filter(pk=waveform.pk).update(peaks=b'\x01\x01', updated_at=waveform.updated_at)
+        response = APIClient().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'\x01\x01')
@@ -1,17 +1,29 @@
+import hashlib
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.generics import get_object_or_404
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAdminUser, AllowAny
-from rest_framework.filters import SearchFilter, orderingFilter
+from rest_framework.filters import OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import IntegrityError, transaction
 from django.db.models import Count, Q
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils.cache import patch_cache_control, patch_vary_headers
 
-from .models import Sermon, SermonCategory
+from apps.file_storage.serving import conditional_response
+
+from .caching import catalog_cached
+from .models import Sermon, SermonCategory, SermonComment, SermonLike, SermonRendition, SermonWaveform
+from .renditions import build_master_playlist, get_client_bandwidth, pick_rendition
+from .scripture import BibleReferenceFilter
+from .search import SermonSearchFilter
 from .serializers import (
     SermonSerializer, 
     SermonListSerializer,
-    SermonCategorySerializer
+    SermonCategorySerializer,
+    SermonCommentSerializer
 )
 
 
@@ -23,13 +35,13 @@ class SermonViewSet(viewsets.ModelViewSet):
     serializer_class = SermonSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
-    filter_backends = [DjangoFilterBackend, SearchFilter, orderingFilter]
+    filter_backends = [DjangoFilterBackend, BibleReferenceFilter, OrderingFilter, SermonSearchFilter]
     filterset_fields = [
         'category', 'preacher', 'sermon_type', 
         'is_published', 'is_featured'
     ]
     search_fields = ['title', 'preacher', 'description', 'bible_references']
-    ordering_fields = ['-created_at', 'title', 'sermon_date', 'play_count']
+    ordering_fields = ['-created_at', 'title', 'sermon_date', 'play_count', 'like_count', 'comment_count']
     ordering = ['-sermon_date', '-created_at']
     
     def get_queryset(self):
@@ -42,14 +54,19 @@ class SermonViewSet(viewsets.ModelViewSet):
         if not self.request.user.is_staff:
             queryset = queryset.filter(is_published=True)
             
-        # Annotate with like and comment counts
-        queryset = queryset.annotate(
-            like_count=Count('likes', distinct=True),
-            comment_count=Count('comments', distinct=True)
-        )
-        
-        return queryset
+        # like_count and comment_count are columns kept up to date by
+        # apps.sermons.signals, so listing needs no joins; category_name
+        # and the rendition ladder are loaded with the page
+        return queryset.select_related('category').prefetch_related('renditions')
         
+    @catalog_cached
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @catalog_cached
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
     def get_serializer_class(self):
         """
         Use different serializers for list and detail views.
@@ -72,6 +89,118 @@ class SermonViewSet(viewsets.ModelViewSet):
         sermon.increment_download_count()
         return Response({'status': 'download count incremented'})
     
+    @action(detail=True, methods=['get'])
+    def waveform(self, request, pk=None):
+        """
+        Get the sermon's waveform peaks as raw bytes: X-Waveform-Buckets
+        interleaved int8 min/max pairs.
+        """
+        waveforms = SermonWaveform.objects.all()
+        if not request.user.is_staff:
+            waveforms = waveforms.filter(sermon__is_published=True)
+        waveform = get_object_or_404(waveforms, sermon_id=pk)
+
+        peaks = bytes(waveform.peaks)
+        # Regenerating within the same second still changes the ETag
+        etag = f'"{hashlib.sha256(peaks).hexdigest()[:40]}"'
+        response = conditional_response(request, etag)
+        if response is None:
+            response = HttpResponse(peaks, content_type='application/octet-stream')
+            response['X-Waveform-Buckets'] = str(waveform.buckets)
+        response['ETag'] = etag
+        # Staff may be looking at an unpublished sermon
+        if request.user.is_staff:
+            patch_cache_control(response, private=True, max_age=0)
+        else:
+            patch_cache_control(response, public=True, max_age=24 * 60 * 60)
+        return response
+    
+    @action(detail=True, methods=['post', 'delete'])
+    def like(self, request, pk=None):
+        """Like (POST) or unlike (DELETE) a sermon."""
+        if not request.user.is_authenticated:
+            return Response({'error': 'Authentication required.'}, status=status.HTTP_401_UNAUTHORIZED)
+        sermon = get_object_or_404(self.get_queryset(), pk=pk)
+
+        # The like row and the sermon's like_count change together
+        with transaction.atomic():
+            if request.method == 'POST':
+                try:
+                    with transaction.atomic():
+                        SermonLike.objects.create(sermon=sermon, user=request.user)
+                except IntegrityError:
+                    pass  # Already liked
+            else:
+                for like in SermonLike.objects.filter(sermon=sermon, user=request.user):
+                    like.delete()
+
+        sermon.refresh_from_db(fields=['like_count'])
+        return Response({
+            'liked': request.method == 'POST',
+            'like_count': sermon.like_count
+        })
+
+    @action(detail=True, methods=['get', 'post'])
+    def comments(self, request, pk=None):
+        """List a sermon's comments (GET) or add one (POST)."""
+        sermon = get_object_or_404(self.get_queryset(), pk=pk)
+
+        if request.method == 'GET':
+            comments = SermonComment.objects.filter(sermon=sermon).select_related('user')
+            page = self.paginate_queryset(comments)
+            if page is not None:
+                serializer = SermonCommentSerializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+            return Response(SermonCommentSerializer(comments, many=True).data)
+
+        serializer = SermonCommentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save(sermon=sermon, user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def get_renditions(self, request, pk, rendition_format):
+        """Get the renditions of a sermon the user may see."""
+        renditions = SermonRendition.objects.filter(sermon_id=pk, format=rendition_format)
+        if not request.user.is_staff:
+            renditions = renditions.filter(sermon__is_published=True)
+        return list(renditions)
+
+    @action(detail=True, methods=['get'])
+    def audio(self, request, pk=None):
+        """
+        Redirect to the rendition that fits the client's bandwidth
+        (?bandwidth= in kbps, or the Save-Data/Downlink client hints).
+        """
+        rendition = pick_rendition(
+            self.get_renditions(request, pk, 'mp3'), get_client_bandwidth(request)
+        )
+        if rendition is not None:
+            url = rendition.url
+        else:
+            # Not rendered (yet): stream the original
+            sermons = Sermon.objects.all()
+            if not request.user.is_staff:
+                sermons = sermons.filter(is_published=True)
+            url = get_object_or_404(sermons, pk=pk).get_audio_url()
+            if not url:
+                return Response({'error': 'No audio file.'}, status=status.HTTP_404_NOT_FOUND)
+
+        response = HttpResponseRedirect(url)
+        response['Accept-CH'] = 'Downlink, Save-Data'
+        patch_vary_headers(response, ['Downlink', 'Save-Data'])
+        return response
+
+    @action(detail=True, methods=['get'])
+    def hls(self, request, pk=None):
+        """Get the HLS master playlist over the sermon's HLS renditions."""
+        renditions = self.get_renditions(request, pk, 'm3u8')
+        if not renditions:
+            return Response({'error': 'HLS not available.'}, status=status.HTTP_404_NOT_FOUND)
+        response = HttpResponse(build_master_playlist(renditions), content_type='application/vnd.apple.mpegurl')
+        patch_cache_control(response, max_age=5 * 60)
+        return response
+    
     @action(detail=True, methods=['post'])
     def toggle_featured(self, request, pk=None):
         """Toggle the featured status of a sermon (admin only)."""
@@ -91,6 +220,7 @@ class SermonViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'])
+    @catalog_cached
     def recent(self, request):
         """Get recent sermons with pagination."""
         queryset = self.filter_queryset(self.get_queryset())
@@ -104,6 +234,7 @@ class SermonViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @catalog_cached
     def featured(self, request):
         """Get featured sermons."""
         queryset = self.filter_queryset(
@@ -128,24 +259,38 @@ class SermonCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
     pagination_class = None
     
+    @catalog_cached
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @catalog_cached
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
+    def get_queryset(self):
+        """
+        Count each category's published sermons in the same query.
+        """
+        return super().get_queryset().annotate(
+            published_sermon_count=Count('sermons', filter=Q(sermons__is_published=True))
+        )
+    
     @action(detail=True, methods=['get'])
     def sermons(self, request, pk=None):
         """Get all sermons in this category."""
         category = self.get_object()
-        sermons = category.sermons.all()
         
-        # Apply filtering, searching, and ordering
-        sermons = SermonViewSet.filter_queryset(
-            self.request, 
-            sermons, 
-            SermonViewSet
+        # Apply filtering, searching, and ordering the way the sermon list does
+        sermon_view = SermonViewSet(request=request, action='list', format_kwarg=None, kwargs={})
+        sermons = sermon_view.filter_queryset(
+            sermon_view.get_queryset().filter(category=category)
         )
         
         # Paginate the results
-        page = self.paginate_queryset(sermons)
+        page = sermon_view.paginate_queryset(sermons)
         if page is not None:
-            serializer = SermonListSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            serializer = SermonListSerializer(page, many=True, context={'request': request})
+            return sermon_view.get_paginated_response(serializer.data)
             
-        serializer = SermonListSerializer(sermons, many=True)
+        serializer = SermonListSerializer(sermons, many=True, context={'request': request})
         return Response(serializer.data)
\ No newline at end of file
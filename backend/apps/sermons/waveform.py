@@ -0,0 +1,161 @@
+"""
+Sermon Audio Waveforms
+
+This module reduces sermon audio to waveform peaks: a min/max pair per
+bucket over a fixed number of buckets, quantized to int8, so players can
+draw a waveform from a couple of kilobytes instead of fetching and
+decoding the whole recording.
+
+Audio is decoded in one streaming pass, by ffmpeg (any format, downmixed
+and resampled to WAVEFORM_SAMPLE_RATE) or, without ffmpeg, by the
+standard library wave module (PCM WAV only). Like apps.sermons.audio,
+nothing here touches Django so it can run in the worker processes.
+"""
+
+import shutil
+import subprocess
+import wave
+
+import numpy as np
+
+from .audio import AudioMetadataError, open_audio
+
+# Sample rate ffmpeg resamples to; peaks don't need more
+WAVEFORM_SAMPLE_RATE = 8000
+
+# Samples reduced to one min/max pair in the streaming pass; the pairs
+# are merged into the requested number of buckets at the end
+BLOCK_SIZE = 64
+
+# Bytes of PCM read from the decoder at a time
+READ_SIZE = 256 * 1024
+
+# numpy dtypes of little-endian PCM sample widths, and the shift to 16 bits
+PCM_FORMATS = {
+    1: ('u1', 8),
+    2: ('<i2', 0),
+    4: ('<i4', -16),
+}
+
+
+def decode_with_ffmpeg(location, ffmpeg):
+    """Yield mono int16 sample arrays decoded by ffmpeg."""
+    process = subprocess.Popen(
+        [
+            ffmpeg, '-nostdin', '-v', 'error', '-i', location,
+            '-f', 's16le', '-ac', '1', '-ar', str(WAVEFORM_SAMPLE_RATE), '-',
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        leftover = b''
+        while True:
+            data = process.stdout.read(READ_SIZE)
+            if not data:
+                break
+            data = leftover + data
+            usable = len(data) - len(data) % 2
+            leftover = data[usable:]
+            yield np.frombuffer(data[:usable], dtype='<i2')
+
+        _, errors = process.communicate()
+        if process.returncode:
+            raise AudioMetadataError(f"ffmpeg failed: {errors.decode(errors='replace').strip()[-500:]}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def decode_wav(location):
+    """Yield int16 sample arrays (channels interleaved) of a PCM WAV file."""
+    with open_audio(location) as fileobj:
+        try:
+            reader = wave.open(fileobj)
+        except (wave.Error, EOFError) as e:
+            raise AudioMetadataError(f"Decoding this format needs ffmpeg ({e})") from e
+
+        with reader:
+            width = reader.getsampwidth()
+            if width not in PCM_FORMATS:
+                raise AudioMetadataError(f"Unsupported WAV sample width ({width * 8} bits)")
+            dtype, shift = PCM_FORMATS[width]
+            frames_per_read = max(READ_SIZE // (width * reader.getnchannels()), 1)
+
+            while True:
+                data = reader.readframes(frames_per_read)
+                if not data:
+                    break
+                samples = np.frombuffer(data, dtype=dtype)
+                if width == 1:
+                    # 8-bit WAV is unsigned
+                    samples = samples.astype(np.int16) - 128
+                if shift > 0:
+                    samples = samples.astype(np.int16) << shift
+                elif shift < 0:
+                    samples = (samples >> -shift).astype(np.int16)
+                yield samples
+
+
+def reduce_peaks(chunks, buckets):
+    """
+    Reduce streamed int16 sample arrays to min/max peaks.
+
+    Args:
+        chunks: Iterable of int16 numpy arrays
+        buckets (int): Number of min/max pairs wanted
+
+    Returns:
+        bytes: Interleaved int8 min/max pairs (at most `buckets` pairs)
+    """
+    mins, maxs = [], []
+    pending = np.empty(0, dtype=np.int16)
+
+    for chunk in chunks:
+        if pending.size:
+            chunk = np.concatenate((pending, chunk))
+        usable = chunk.size - chunk.size % BLOCK_SIZE
+        blocks = chunk[:usable].reshape(-1, BLOCK_SIZE)
+        mins.append(blocks.min(axis=1))
+        maxs.append(blocks.max(axis=1))
+        pending = chunk[usable:]
+
+    if pending.size:
+        mins.append(pending.min(keepdims=True))
+        maxs.append(pending.max(keepdims=True))
+    if not mins:
+        raise AudioMetadataError("No audio samples decoded")
+
+    mins = np.concatenate(mins)
+    maxs = np.concatenate(maxs)
+    if mins.size > buckets:
+        starts = np.linspace(0, mins.size, buckets + 1).astype(np.intp)[:-1]
+        mins = np.minimum.reduceat(mins, starts)
+        maxs = np.maximum.reduceat(maxs, starts)
+
+    peaks = np.empty(mins.size * 2, dtype=np.int8)
+    peaks[0::2] = mins >> 8
+    peaks[1::2] = maxs >> 8
+    return peaks.tobytes()
+
+
+def compute_waveform(location, buckets, ffmpeg='ffmpeg'):
+    """
+    Compute the waveform peaks of an audio file.
+
+    Args:
+        location (str): Local path or HTTP(S) URL of the file
+        buckets (int): Number of min/max pairs
+        ffmpeg (str): ffmpeg executable (WAV is decoded without it)
+
+    Returns:
+        bytes: Interleaved int8 min/max pairs
+
+    Raises:
+        AudioMetadataError: If the file can't be decoded
+    """
+    ffmpeg_path = shutil.which(ffmpeg) if ffmpeg else None
+    if ffmpeg_path:
+        return reduce_peaks(decode_with_ffmpeg(location, ffmpeg_path), buckets)
+    return reduce_peaks(decode_wav(location), buckets)
@@ -85,12 +85,14 @@ INSTALLED_APPS = [
     'apps.giving',
     'apps.admin_dashboard',
     'apps.file_storage',
+    'apps.sermons',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'apps.file_storage.signing.SignedFileMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -196,6 +198,93 @@ CLOUDINARY_STORAGE = {
 MEDIA_URL = '/media/'
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# File storage settings
+FILE_STORAGE_MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB
+FILE_STORAGE_UPLOAD_CHUNK_SIZE = 64 * 1024  # bytes streamed to storage per write
+FILE_STORAGE_CLOUDINARY_CHUNK_SIZE = 6 * 1024 * 1024  # Cloudinary minimum is 5MB
+FILE_STORAGE_STAGING_ROOT = os.path.join(BASE_DIR, 'upload_staging')
+FILE_STORAGE_SESSION_CHUNK_SIZE = 8 * 1024 * 1024  # part size for resumable uploads
+FILE_STORAGE_MAX_SESSION_UPLOAD_SIZE = 200 * 1024 * 1024  # 200MB
+FILE_STORAGE_SESSION_TTL_HOURS = 24
+# Default per-user storage quota (StorageUsage.quota_bytes overrides it per user)
+FILE_STORAGE_USER_QUOTA = int(os.getenv('FILE_STORAGE_USER_QUOTA', str(1024 * 1024 * 1024)))  # 1GB
+# 'sync' uploads to Cloudinary during the request, 'background' stages the file
+# and returns 202 while a worker pool pushes it to Cloudinary
+FILE_STORAGE_CLOUDINARY_UPLOAD_MODE = os.getenv('FILE_STORAGE_CLOUDINARY_UPLOAD_MODE', 'sync')
+FILE_STORAGE_UPLOAD_WORKERS = int(os.getenv('FILE_STORAGE_UPLOAD_WORKERS', '4'))
+# Use 'apps.file_storage.backends.LocalCloudinaryBackend' to work offline
+FILE_STORAGE_CLOUDINARY_BACKEND = os.getenv(
+    'FILE_STORAGE_CLOUDINARY_BACKEND',
+    'apps.file_storage.backends.CloudinaryBackend'
+)
+FILE_STORAGE_STANDIN_ROOT = os.path.join(BASE_DIR, 'cloudinary_standin')
+# Cloudinary request pool, concurrency cap and retries with jittered exponential backoff
+FILE_STORAGE_CLOUDINARY_MAX_CONCURRENCY = int(os.getenv('FILE_STORAGE_CLOUDINARY_MAX_CONCURRENCY', '8'))
+FILE_STORAGE_CLOUDINARY_MAX_ATTEMPTS = 4
+FILE_STORAGE_CLOUDINARY_BACKOFF_BASE = 0.5  # seconds
+FILE_STORAGE_CLOUDINARY_BACKOFF_CAP = 10  # seconds
+# Send Cloudinary API requests elsewhere, e.g. to a fake server (python manage.py fake_cloudinary)
+FILE_STORAGE_CLOUDINARY_UPLOAD_PREFIX = os.getenv('FILE_STORAGE_CLOUDINARY_UPLOAD_PREFIX', '')
+FILE_STORAGE_STATS_CACHE_TTL = 60  # seconds
+# Hand local file transfers to the front proxy: '' (off), 'nginx' or 'sendfile'
+FILE_STORAGE_ACCEL_MODE = os.getenv('FILE_STORAGE_ACCEL_MODE', '')
+FILE_STORAGE_ACCEL_REDIRECT_PREFIX = os.getenv('FILE_STORAGE_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+# Lifetime of signed download URLs for private files (seconds)
+FILE_STORAGE_SIGNED_URL_TTL = int(os.getenv('FILE_STORAGE_SIGNED_URL_TTL', '3600'))
+# Storage drivers uploads can be routed to, and the routing rules (first match wins)
+FILE_STORAGE_DRIVERS = {
+    'local': {'BACKEND': 'apps.file_storage.drivers.LocalDriver'},
+    'cloudinary': {'BACKEND': 'apps.file_storage.drivers.CloudinaryDriver'},
+    'memory': {'BACKEND': 'apps.file_storage.drivers.MemoryDriver'},
+}
+FILE_STORAGE_ROUTES = [
+    {'mime_types': ['image/', 'video/'], 'driver': 'cloudinary'},
+    {'driver': 'local'},
+]
+# Thumbnails/previews derived from image uploads (widths in pixels)
+FILE_STORAGE_RENDITION_WIDTHS = [200, 800]
+FILE_STORAGE_RENDITION_FORMATS = ['webp', 'jpeg']
+FILE_STORAGE_RENDITION_WORKERS = int(os.getenv('FILE_STORAGE_RENDITION_WORKERS', '2'))
+# Large videos go to S3-compatible storage when a bucket is configured
+# (requires django-storages and boto3)
+FILE_STORAGE_S3_BUCKET = os.getenv('FILE_STORAGE_S3_BUCKET', '')
+if FILE_STORAGE_S3_BUCKET:
+    FILE_STORAGE_DRIVERS['s3'] = {
+        'BACKEND': 'apps.file_storage.drivers.S3Driver',
+        'OPTIONS': {
+            'bucket_name': FILE_STORAGE_S3_BUCKET,
+            'endpoint_url': os.getenv('FILE_STORAGE_S3_ENDPOINT_URL') or None,
+            'custom_domain': os.getenv('FILE_STORAGE_S3_CUSTOM_DOMAIN') or None,
+            'querystring_auth': False,
+        },
+    }
+    FILE_STORAGE_ROUTES.insert(0, {
+        'mime_types': ['video/'],
+        'min_size': int(os.getenv('FILE_STORAGE_S3_MIN_VIDEO_SIZE', str(20 * 1024 * 1024))),
+        'driver': 's3',
+    })
+
+# Sermon audio metadata extraction (process pool used when Celery isn't installed)
+SERMON_AUDIO_WORKERS = int(os.getenv('SERMON_AUDIO_WORKERS', '2'))
+SERMON_AUDIO_BATCH_SIZE = 50  # sermons per bulk update
+# Waveform peaks (min/max pairs per sermon); ffmpeg decodes formats other than WAV
+SERMON_WAVEFORM_BUCKETS = 1000
+SERMON_FFMPEG_BINARY = os.getenv('SERMON_FFMPEG_BINARY', 'ffmpeg')
+# Bitrate ladder (kbps) sermons are rendered at, optionally with audio-only HLS
+SERMON_AUDIO_BITRATES = [32, 64, 128]
+SERMON_AUDIO_HLS = os.getenv('SERMON_AUDIO_HLS', 'False') == 'True'
+# Use 'apps.sermons.renditions.LocalTranscoder' to work offline
+SERMON_AUDIO_TRANSCODER = os.getenv(
+    'SERMON_AUDIO_TRANSCODER',
+    'apps.sermons.renditions.CloudinaryTranscoder'
+)
+SERMON_RENDITIONS_ROOT = os.path.join(BASE_DIR, 'sermon_renditions')
+# Play/download counts are buffered per process and written behind in one UPDATE per interval
+SERMON_COUNTER_FLUSH_INTERVAL = int(os.getenv('SERMON_COUNTER_FLUSH_INTERVAL', '10'))  # seconds, 0 writes through
+# Anonymous catalog responses are cached until the catalog changes (needs a shared cache across processes)
+SERMON_CATALOG_CACHE_TTL = int(os.getenv('SERMON_CATALOG_CACHE_TTL', '600'))  # seconds
+SERMON_CATALOG_MAX_AGE = 60  # seconds browsers and proxies may reuse a response
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
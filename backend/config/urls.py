@@ -29,6 +29,7 @@ urlpatterns = [
     path('api/giving/', include('apps.giving.urls')),
     path('api/admin/', include('apps.admin_dashboard.urls')),
     path('api/files/', include('apps.file_storage.urls')),
+    path('api/sermons/', include('apps.sermons.urls')),
 ]
 
 # Serve media files in development